@@ -2,7 +2,7 @@
 header('Content-Type: application/json');
 header('Access-Control-Allow-Origin: *');
 header('Access-Control-Allow-Methods: POST, OPTIONS');
-header('Access-Control-Allow-Headers: Content-Type');
+header('Access-Control-Allow-Headers: Content-Type, Idempotency-Key');
 
 if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
     http_response_code(200);
@@ -10,6 +10,7 @@ if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
 }
 
 require_once __DIR__ . '/../config.php';
+require_once __DIR__ . '/../notification-outbox.php';
 
 if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
     http_response_code(405);
@@ -39,65 +40,74 @@ if (!$taskId || !$taskTitle || empty($assignedTo)) {
 
 try {
     $db = getDB();
-    $notificationsSent = 0;
     
-    foreach ($assignedTo as $userName) {
-        $stmt = $db->prepare(
-            "SELECT telegram_chat_id, email FROM users WHERE full_name = ? AND telegram_chat_id IS NOT NULL"
-        );
-        $stmt->execute([$userName]);
-        $user = $stmt->fetch();
-        
-        if ($user) {
-            $chatId = $user['telegram_chat_id'];
-            
-            $urgentEmoji = $urgent ? '🔥 ' : '';
-            $messageText = 
-                "{$urgentEmoji}<b>Новая задача для выполнения</b>\n\n" .
-                "📋 <b>Название:</b> {$taskTitle}\n" .
-                "📅 <b>Срок:</b> {$deadline}\n" .
-                "📊 <b>Статус:</b> В работе\n" .
-                "👤 <b>От кого:</b> {$createdBy}\n";
-            
-            $replyMarkup = [
-                'inline_keyboard' => [[
-                    ['text' => '✅ Отметить выполненной', 'callback_data' => "complete_{$taskId}"]
-                ]]
-            ];
-            
-            sendTelegramMessage($botToken, $chatId, $messageText, $replyMarkup);
-            $notificationsSent++;
-        }
+    // Все получатели одним запросом вместо SELECT на каждого (только по индексу idx_full_name_chat)
+    $names = array_values(array_unique($assignedTo));
+    $placeholders = implode(',', array_fill(0, count($names), '?'));
+    $stmt = $db->prepare(
+        "SELECT full_name, telegram_chat_id FROM users " .
+        "WHERE full_name IN ($placeholders) AND telegram_chat_id IS NOT NULL"
+    );
+    $stmt->execute($names);
+    $chatIds = [];
+    foreach ($stmt->fetchAll() as $user) {
+        $chatIds[$user['full_name']] = $user['telegram_chat_id'];
+    }
+    
+    $urgentEmoji = $urgent ? '🔥 ' : '';
+    $messageText = 
+        "{$urgentEmoji}<b>Новая задача для выполнения</b>\n\n" .
+        "📋 <b>Название:</b> {$taskTitle}\n" .
+        "📅 <b>Срок:</b> {$deadline}\n" .
+        "📊 <b>Статус:</b> В работе\n" .
+        "👤 <b>От кого:</b> {$createdBy}\n";
+    
+    $replyMarkup = [
+        'inline_keyboard' => [[
+            ['text' => '✅ Отметить выполненной', 'callback_data' => "complete_{$taskId}"]
+        ]]
+    ];
+    
+    // Один чат - одно сообщение, даже если имя повторяется
+    $messages = [];
+    foreach (array_unique($chatIds) as $chatId) {
+        $messages[] = ['chat_id' => $chatId, 'text' => $messageText, 'reply_markup' => $replyMarkup];
+    }
+    
+    // Сообщения сохраняются до ответа: сбой Telegram или перезапуск PHP
+    // их не теряет, доставка - с повторами (notification-outbox.php)
+    $db->beginTransaction();
+    try {
+        enqueueNotifications($db, $messages, (int)$taskId);
+        $db->commit();
+    } catch (Exception $e) {
+        $db->rollBack();
+        throw $e;
+    }
+    
+    $results = [];
+    foreach ($names as $userName) {
+        $results[] = ['user' => $userName, 'status' => isset($chatIds[$userName]) ? 'queued' : 'no_telegram'];
     }
     
     echo json_encode([
         'success' => true,
-        'notifications_sent' => $notificationsSent
+        'notifications_queued' => count($messages),
+        'results' => $results
     ]);
 } catch (Exception $e) {
     http_response_code(500);
     echo json_encode(['error' => $e->getMessage()]);
+    exit();
 }
 
-function sendTelegramMessage($token, $chatId, $text, $replyMarkup = null) {
-    $url = "https://api.telegram.org/bot{$token}/sendMessage";
-    $data = [
-        'chat_id' => $chatId,
-        'text' => $text,
-        'parse_mode' => 'HTML'
-    ];
-    
-    if ($replyMarkup) {
-        $data['reply_markup'] = json_encode($replyMarkup);
-    }
-    
-    $options = [
-        'http' => [
-            'method' => 'POST',
-            'header' => 'Content-Type: application/json',
-            'content' => json_encode($data)
-        ]
-    ];
-    
-    file_get_contents($url, false, stream_context_create($options));
+// Ответ уже отправлен (PHP-FPM) - сразу доставляем очередь; без FPM клиент
+// ждет отправки, как раньше. Недоставленное дошлет deliver-notifications.php
+if (function_exists('fastcgi_finish_request')) {
+    fastcgi_finish_request();
+}
+try {
+    deliverNotifications($db, $botToken);
+} catch (Exception $e) {
+    error_log('notify-task: delivery failed: ' . $e->getMessage());
 }
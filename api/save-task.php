@@ -2,7 +2,7 @@
 header('Content-Type: application/json');
 header('Access-Control-Allow-Origin: *');
 header('Access-Control-Allow-Methods: POST, OPTIONS');
-header('Access-Control-Allow-Headers: Content-Type');
+header('Access-Control-Allow-Headers: Content-Type, Idempotency-Key');
 
 if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
     http_response_code(200);
@@ -10,6 +10,10 @@ if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
 }
 
 require_once __DIR__ . '/../config.php';
+require_once __DIR__ . '/../task-stats.php';
+
+// Строк в одном многострочном INSERT (MySQL: не больше 65535 плейсхолдеров)
+const SAVE_TASK_CHUNK_SIZE = 500;
 
 if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
     http_response_code(405);
@@ -18,57 +22,140 @@ if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
 }
 
 $input = json_decode(file_get_contents('php://input'), true);
-$title = $input['title'] ?? null;
-$priority = $input['priority'] ?? 'medium';
-$urgent = $input['urgent'] ?? false;
-$deadline = $input['deadline'] ?? null;
-$createdBy = $input['createdBy'] ?? null;
-$assignedTo = $input['assignedTo'] ?? [];
-
-if (!$title) {
-    http_response_code(400);
-    echo json_encode(['error' => 'Title is required']);
+
+// Пакетный режим: {"tasks": [{...}, {...}]}; одиночная задача - как раньше
+$batch = isset($input['tasks']) && is_array($input['tasks']);
+$items = $batch ? $input['tasks'] : [$input];
+
+$tasks = [];
+foreach ($items as $index => $item) {
+    if (!is_array($item) || empty($item['title'])) {
+        http_response_code(400);
+        echo json_encode($batch
+            ? ['error' => 'Title is required', 'index' => $index]
+            : ['error' => 'Title is required']);
+        exit();
+    }
+    $tasks[] = [
+        'title' => $item['title'],
+        'priority' => $item['priority'] ?? 'medium',
+        'deadline' => $item['deadline'] ?? null,
+        'createdBy' => $item['createdBy'] ?? null,
+        'assignedTo' => array_values(array_unique((array)($item['assignedTo'] ?? [])))
+    ];
+}
+
+if (empty($tasks)) {
+    echo json_encode(['success' => true, 'taskIds' => [], 'count' => 0]);
     exit();
 }
 
 try {
     $db = getDB();
-    
-    $creatorId = null;
-    if ($createdBy) {
-        $stmt = $db->prepare("SELECT id FROM users WHERE full_name = ?");
-        $stmt->execute([$createdBy]);
-        $creator = $stmt->fetch();
-        if ($creator) {
-            $creatorId = $creator['id'];
+
+    // Авторы и исполнители всех задач - одним запросом по индексу idx_full_name_chat
+    $names = [];
+    foreach ($tasks as $task) {
+        if ($task['createdBy']) {
+            $names[$task['createdBy']] = true;
+        }
+        foreach ($task['assignedTo'] as $userName) {
+            $names[$userName] = true;
         }
     }
-    
-    $status = 'pending';
-    
-    $stmt = $db->prepare(
-        "INSERT INTO tasks (title, description, priority, status, deadline, created_by, is_deleted) " .
-        "VALUES (?, '', ?, ?, ?, ?, 0)"
-    );
-    $stmt->execute([$title, $priority, $status, $deadline, $creatorId]);
-    $taskId = $db->lastInsertId();
-    
-    foreach ($assignedTo as $userName) {
-        $stmt = $db->prepare("SELECT id FROM users WHERE full_name = ?");
-        $stmt->execute([$userName]);
-        $user = $stmt->fetch();
-        
-        if ($user) {
-            $stmt = $db->prepare("UPDATE tasks SET assigned_to = ? WHERE id = ?");
-            $stmt->execute([$user['id'], $taskId]);
+    $userIds = [];
+    if ($names) {
+        $names = array_keys($names);
+        $placeholders = implode(',', array_fill(0, count($names), '?'));
+        $stmt = $db->prepare("SELECT id, full_name FROM users WHERE full_name IN ($placeholders)");
+        $stmt->execute($names);
+        foreach ($stmt->fetchAll() as $user) {
+            $userIds[$user['full_name']] = (int)$user['id'];
         }
     }
-    
-    echo json_encode([
-        'success' => true,
-        'taskId' => $taskId
-    ]);
+
+    // lastInsertId() многострочного INSERT - id только первой строки, а при
+    // innodb_autoinc_lock_mode = 2 (по умолчанию в MySQL 8) остальные id могут
+    // идти не подряд. Поэтому строки запроса помечаются batch_token и их id
+    // читаются по метке: внутри запроса id растут в порядке вставки
+    $batchToken = bin2hex(random_bytes(16));
+
+    $db->beginTransaction();
+
+    foreach (array_chunk($tasks, SAVE_TASK_CHUNK_SIZE) as $chunk) {
+        $rows = [];
+        $params = [];
+        foreach ($chunk as $task) {
+            $rows[] = "(?, '', ?, 'pending', ?, ?, ?, 0, ?)";
+            // assigned_to - первый исполнитель (старые клиенты читают его вместо task_assignments)
+            $firstAssignee = null;
+            foreach ($task['assignedTo'] as $userName) {
+                if (isset($userIds[$userName])) {
+                    $firstAssignee = $userIds[$userName];
+                    break;
+                }
+            }
+            array_push(
+                $params,
+                $task['title'],
+                $task['priority'],
+                $task['deadline'],
+                $userIds[$task['createdBy']] ?? null,
+                $firstAssignee,
+                $batchToken
+            );
+        }
+        $stmt = $db->prepare(
+            "INSERT INTO tasks (title, description, priority, status, deadline, created_by, assigned_to, is_deleted, batch_token) " .
+            "VALUES " . implode(',', $rows)
+        );
+        $stmt->execute($params);
+    }
+
+    $stmt = $db->prepare("SELECT id FROM tasks WHERE batch_token = ? ORDER BY id");
+    $stmt->execute([$batchToken]);
+    $taskIds = array_map('intval', $stmt->fetchAll(PDO::FETCH_COLUMN));
+    if (count($taskIds) !== count($tasks)) {
+        throw new Exception('Inserted task ids do not match the batch');
+    }
+
+    // Все исполнители всех задач
+    $assignments = [];
+    $taskCounts = [];
+    $unresolved = [];
+    foreach ($tasks as $index => $task) {
+        foreach ($task['assignedTo'] as $userName) {
+            if (isset($userIds[$userName])) {
+                $assignments[] = [$taskIds[$index], $userIds[$userName]];
+                $taskCounts[$userIds[$userName]] = ($taskCounts[$userIds[$userName]] ?? 0) + 1;
+            } else {
+                $unresolved[$userName] = true;
+            }
+        }
+    }
+    foreach (array_chunk($assignments, SAVE_TASK_CHUNK_SIZE) as $chunk) {
+        $stmt = $db->prepare(
+            "INSERT IGNORE INTO task_assignments (task_id, user_id) VALUES " .
+            implode(',', array_fill(0, count($chunk), '(?, ?)'))
+        );
+        $stmt->execute(array_merge(...$chunk));
+    }
+    // Задачи новые, так что повторов в task_assignments нет и INSERT IGNORE ничего не пропустил
+    addAssignedTaskStats($db, $taskCounts);
+
+    $db->commit();
+
+    $response = $batch
+        ? ['success' => true, 'taskIds' => $taskIds, 'count' => count($taskIds)]
+        : ['success' => true, 'taskId' => $taskIds[0]];
+    if ($unresolved) {
+        $response['unknownUsers'] = array_keys($unresolved);
+    }
+    echo json_encode($response);
 } catch (Exception $e) {
+    if (isset($db) && $db->inTransaction()) {
+        $db->rollBack();
+    }
     http_response_code(500);
     echo json_encode(['error' => $e->getMessage()]);
 }
@@ -2,7 +2,8 @@
 header('Content-Type: application/json');
 header('Access-Control-Allow-Origin: *');
 header('Access-Control-Allow-Methods: GET, POST, OPTIONS');
-header('Access-Control-Allow-Headers: Content-Type');
+header('Access-Control-Allow-Headers: Content-Type, If-None-Match');
+header('Access-Control-Expose-Headers: ETag, X-Sync-Cursor');
 
 if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
     http_response_code(200);
@@ -10,20 +11,86 @@ if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
 }
 
 require_once __DIR__ . '/../config.php';
+require_once __DIR__ . '/../task-stats.php';
+
+// updated_at ставится при выполнении оператора, а виден после COMMIT: пачка
+// save-task или setTaskStatus, ждавший FOR UPDATE, фиксируется позже более
+// коротких транзакций. Курсор не заходит ближе этого срока к текущему времени,
+// поэтому изменение, зафиксированное позже, придет в следующей дельте.
+// Срок - с запасом больше innodb_lock_wait_timeout (50 секунд по умолчанию)
+const SYNC_MAX_TRANSACTION_SECONDS = 60;
 
 try {
     $db = getDB();
     
     if ($_SERVER['REQUEST_METHOD'] === 'GET') {
-        $stmt = $db->query("SELECT id, status FROM tasks WHERE is_deleted = 0 ORDER BY id");
-        $tasks = $stmt->fetchAll();
-        
-        $result = [];
-        foreach ($tasks as $task) {
-            $result[(string)$task['id']] = ($task['status'] === 'completed');
+        // Курсор синхронизации - время последнего изменения задач (unix time),
+        // но не позже границы SYNC_MAX_TRANSACTION_SECONDS назад.
+        // MAX(updated_at) берется из индекса idx_updated_at без чтения таблицы
+        $stmt = $db->query(
+            "SELECT UNIX_TIMESTAMP(MAX(updated_at)) AS cursor_ts, UNIX_TIMESTAMP() AS now_ts FROM tasks"
+        );
+        $row = $stmt->fetch();
+        $latest = (int)($row['cursor_ts'] ?? 0);
+        $horizon = (int)$row['now_ts'] - SYNC_MAX_TRANSACTION_SECONDS;
+        $cursor = min($latest, $horizon);
+        $since = isset($_GET['since']) && $_GET['since'] !== '' ? (int)$_GET['since'] : null;
+        // Курсор клиента от версии без границы мог уйти дальше нее
+        if ($since !== null) {
+            $since = min($since, $cursor);
         }
-        
-        echo json_encode($result);
+
+        header('X-Sync-Cursor: ' . $cursor);
+        header('Cache-Control: no-cache');
+
+        // Пока не истек срок транзакций, еще не зафиксированные изменения
+        // могут получить updated_at не позже MAX - ответ с тем же ETag был бы
+        // устаревшим. Поэтому ETag выдается только для изменений до границы
+        if ($latest < $horizon) {
+            $etag = '"' . $cursor . ($since !== null ? '-' . $since : '') . '"';
+            header('ETag: ' . $etag);
+            if (trim($_SERVER['HTTP_IF_NONE_MATCH'] ?? '') === $etag) {
+                http_response_code(304);
+                exit();
+            }
+        }
+
+        if ($since === null) {
+            $stmt = $db->query("SELECT id, status FROM tasks WHERE is_deleted = 0 ORDER BY id");
+            $tasks = $stmt->fetchAll();
+
+            $result = [];
+            foreach ($tasks as $task) {
+                $result[(string)$task['id']] = ($task['status'] === 'completed');
+            }
+
+            echo json_encode($result);
+            exit();
+        }
+
+        // Дельта: задачи, измененные начиная с секунды курсора клиента.
+        // Изменения в секунду курсора приходят повторно - применять их идемпотентно
+        $stmt = $db->prepare(
+            "SELECT id, status, is_deleted FROM tasks " .
+            "WHERE updated_at >= FROM_UNIXTIME(?) ORDER BY updated_at, id"
+        );
+        $stmt->execute([$since]);
+
+        $changed = [];
+        $deleted = [];
+        foreach ($stmt->fetchAll() as $task) {
+            if ($task['is_deleted']) {
+                $deleted[] = (int)$task['id'];
+            } else {
+                $changed[(string)$task['id']] = ($task['status'] === 'completed');
+            }
+        }
+
+        echo json_encode([
+            'cursor' => $cursor,
+            'changed' => (object)$changed,
+            'deleted' => $deleted
+        ]);
         exit();
     }
     
@@ -40,12 +107,9 @@ try {
         
         $status = $completed ? 'completed' : 'pending';
         
-        $stmt = $db->prepare("UPDATE tasks SET status = ? WHERE id = ?");
-        $stmt->execute([$status, $taskId]);
-        
-        $stmt = $db->prepare("SELECT id, title, status FROM tasks WHERE id = ?");
-        $stmt->execute([$taskId]);
-        $task = $stmt->fetch();
+        $db->beginTransaction();
+        $task = setTaskStatus($db, (int)$taskId, $status);
+        $db->commit();
         
         if ($task) {
             echo json_encode([
@@ -66,6 +130,9 @@ try {
     http_response_code(405);
     echo json_encode(['error' => 'Method not allowed']);
 } catch (Exception $e) {
+    if (isset($db) && $db->inTransaction()) {
+        $db->rollBack();
+    }
     http_response_code(500);
     echo json_encode(['error' => $e->getMessage()]);
 }
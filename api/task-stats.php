@@ -0,0 +1,54 @@
+<?php
+header('Content-Type: application/json');
+header('Access-Control-Allow-Origin: *');
+header('Access-Control-Allow-Methods: GET, OPTIONS');
+header('Access-Control-Allow-Headers: Content-Type');
+
+if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
+    http_response_code(200);
+    exit();
+}
+
+require_once __DIR__ . '/../config.php';
+
+if ($_SERVER['REQUEST_METHOD'] !== 'GET') {
+    http_response_code(405);
+    echo json_encode(['error' => 'Method not allowed']);
+    exit();
+}
+
+function statsRow(array $row) {
+    return [
+        'userId' => (int)$row['user_id'],
+        'fullName' => $row['full_name'],
+        'email' => $row['email'],
+        'pendingTasks' => (int)$row['pending_tasks'],
+        'inProgressTasks' => (int)$row['in_progress_tasks'],
+        'completedTasks' => (int)$row['completed_tasks'],
+        'totalTasks' => (int)$row['total_tasks']
+    ];
+}
+
+try {
+    $db = getDB();
+
+    // Один пользователь - строка user_task_stats по ключу, без группировки задач
+    if (!empty($_GET['email'])) {
+        $stmt = $db->prepare("SELECT * FROM task_statistics WHERE email = ?");
+        $stmt->execute([$_GET['email']]);
+        $row = $stmt->fetch();
+        if (!$row) {
+            http_response_code(404);
+            echo json_encode(['error' => 'User not found']);
+            exit();
+        }
+        echo json_encode(['stats' => statsRow($row)]);
+        exit();
+    }
+
+    $stmt = $db->query("SELECT * FROM task_statistics ORDER BY full_name");
+    echo json_encode(['stats' => array_map('statsRow', $stmt->fetchAll())]);
+} catch (Exception $e) {
+    http_response_code(500);
+    echo json_encode(['error' => $e->getMessage()]);
+}
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+TaskFlow - замер кодирования ответов handlers в JSON
+
+Сравнивает прежний путь (handler делает json.dumps в строку, gateway
+кодирует строку в bytes) с context.json: stdlib и orjson, если установлен.
+Нагрузки - самые большие ответы: полная карта sync-task {"id": completed}
+и результаты рассылки notify-task.
+
+Запуск из корня проекта:
+    python benchmarks/json_codec.py --tasks 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway.codec import JsonCodec, orjson  # noqa: E402
+
+
+def sync_payload(tasks: int) -> Dict[str, bool]:
+    return {str(task_id): task_id % 3 == 0 for task_id in range(1, tasks + 1)}
+
+
+def notify_payload(recipients: int) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "task_id": 42,
+        "results": [
+            {
+                "email": f"user{i}@company.ru",
+                "name": f"Сотрудник {i}",
+                "status": ("sent", "failed", "no_telegram")[i % 3],
+                "chat_id": 100000 + i,
+                "error": "Bad Request: chat not found" if i % 3 == 1 else None,
+            }
+            for i in range(recipients)
+        ],
+    }
+
+
+def measure(encode: Callable[[Any], bytes], payload: Any, repeat: int) -> List[float]:
+    encode(payload)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(payload)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON codec benchmark")
+    parser.add_argument("--tasks", type=int, default=100000, help="задач в карте sync-task")
+    parser.add_argument("--recipients", type=int, default=5000, help="получателей notify-task")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    encoders: Dict[str, Callable[[Any], bytes]] = {
+        # Прежний путь: строка от handler, затем str -> bytes в Response
+        "json.dumps + encode": lambda value: json.dumps(value).encode("utf-8"),
+        "context.json (json)": JsonCodec(use_orjson=False).encode_body,
+    }
+    if orjson is not None:
+        encoders["context.json (orjson)"] = JsonCodec().encode_body
+    else:
+        print("orjson не установлен - замер только stdlib (pip install orjson)")
+
+    payloads = {
+        f"sync-task, {args.tasks} задач": sync_payload(args.tasks),
+        f"notify-task, {args.recipients} получателей": notify_payload(args.recipients),
+    }
+    for title, payload in payloads.items():
+        print(f"\n{title}")
+        baseline = None
+        for name, encode in encoders.items():
+            timings = sorted(measure(encode, payload, args.repeat))
+            median = timings[len(timings) // 2]
+            baseline = baseline or median
+            size = len(encode(payload))
+            print(f"  {name:<24} {median * 1000:8.2f} ms  {size / 1024:8.1f} KB  "
+                  f"x{baseline / median:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+TaskFlow - замер поиска задач (GET /api/search-task)
+
+Заполняет tasks синтетическими названиями на русском и английском
+(--seed, задачи помечаются created_by='bench-search') и замеряет
+search_tasks() на запросах разной частоты: редкое слово, несколько слов,
+префикс при наборе, запрос с опечаткой (нечеткий поиск по триграммам).
+Нужны миграции до V0013 и DATABASE_URL.
+
+Запуск из корня проекта:
+    DATABASE_URL=postgresql://... python benchmarks/search.py --seed 1000000
+    DATABASE_URL=postgresql://... python benchmarks/search.py --cleanup
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway.db import DatabasePool  # noqa: E402
+from gateway.search import search_tasks  # noqa: E402
+
+BENCH_AUTHOR = "bench-search"
+
+# Кроме слов ниже, в названии есть случайное слово-код из --vocabulary
+# вариантов. Слова выбираются по квадрату случайного числа: первое существительное
+# списка встречается примерно в каждой пятой задаче, последнее - в одной из сорока
+VERBS = [
+    "Подготовить", "Проверить", "Обновить", "Согласовать", "Исправить",
+    "Написать", "Отправить", "Review", "Deploy", "Fix", "Update", "Migrate",
+]
+NOUNS = [
+    "отчет", "договор", "презентацию", "счет", "макет", "документацию",
+    "сервер", "бюджет", "release", "invoice", "dashboard", "backup",
+    "интеграцию", "регламент", "логистику", "certificate", "webhook",
+    "инвентаризацию", "репликацию", "kubernetes", "телеметрию", "аттестацию",
+]
+SUFFIXES = [
+    "для клиента", "по проекту", "за квартал", "for customer", "in staging",
+    "до пятницы", "после аудита", "for partners", "в филиале", "по складу",
+]
+
+SEED_SQL = """
+    INSERT INTO tasks (title, priority, urgent, completed, created_by)
+    SELECT v.verbs[1 + floor(random() ^ 2 * array_length(v.verbs, 1))::int] || ' ' ||
+           v.nouns[1 + floor(random() ^ 2 * array_length(v.nouns, 1))::int] || ' ' ||
+           v.suffixes[1 + floor(random() * array_length(v.suffixes, 1))::int] || ' ' ||
+           translate(left(md5((g %% %s)::text), 6), '0123456789', 'абвгдежзик') ||
+           ' №' || g,
+           (ARRAY['low', 'medium', 'high'])[1 + g %% 3], g %% 17 = 0, g %% 4 = 0, %s
+    FROM generate_series(1, %s) g,
+         (SELECT %s::text[] AS verbs, %s::text[] AS nouns, %s::text[] AS suffixes) v
+"""
+
+QUERIES = {
+    "слово в 20% задач": "отчет",
+    "слово в 2% задач": "аттестацию",
+    "код (20 задач)": "{code}",
+    "два слова, 0,3%": "обновить dashboard",
+    "три слова, 0,6%": "подготовить отчет квартал",
+    "английский стемминг": "deploying",
+    "недописанное слово": "инвента",
+    "опечатка": "инвентаризацыю",
+    "нет совпадений": "абракадабра",
+}
+
+
+def code_word(number: int) -> str:
+    """Слово-код из SEED_SQL для задач с номером number по модулю --vocabulary"""
+    digest = hashlib.md5(str(number).encode("ascii")).hexdigest()[:6]
+    return digest.translate(str.maketrans("0123456789", "абвгдежзик"))
+
+
+def seed(pool: DatabasePool, total: int, batch: int, vocabulary: int):
+    started = time.perf_counter()
+    done = 0
+    while done < total:
+        size = min(batch, total - done)
+        with pool.connection("bench-search") as conn:
+            conn.execute(SEED_SQL, (vocabulary, BENCH_AUTHOR, size, VERBS, NOUNS, SUFFIXES))
+        done += size
+        print(f"\r  {done}/{total}", end="", flush=True)
+    print(f"\n  заполнено за {time.perf_counter() - started:.1f} s")
+    with pool.connection("bench-search") as conn:
+        conn.execute("ANALYZE tasks", prepare=False)
+
+
+def measure(pool: DatabasePool, query: str, repeat: int) -> Tuple[List[float], Dict[str, Any]]:
+    timings = []
+    for _ in range(repeat + 1):
+        with pool.connection("bench-search") as conn:
+            started = time.perf_counter()
+            result = search_tasks(conn, query)
+            timings.append(time.perf_counter() - started)
+    # Первый запрос прогревает кэш и подготовленные запросы
+    return sorted(timings[1:]), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task search benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="добавить N задач перед замером")
+    parser.add_argument("--batch", type=int, default=100000)
+    parser.add_argument("--vocabulary", type=int, default=50000,
+                        help="случайных слов-кодов в названиях (размер словаря опечаток)")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--cleanup", action="store_true", help="удалить задачи замера и выйти")
+    args = parser.parse_args()
+
+    pool = DatabasePool.from_env()
+    if pool is None:
+        sys.exit("DATABASE_URL не задан")
+    pool.open()
+    try:
+        if args.cleanup:
+            with pool.connection("bench-search") as conn:
+                conn.execute("DELETE FROM tasks WHERE created_by = %s", (BENCH_AUTHOR,))
+            return
+        if args.seed:
+            print(f"Заполнение: {args.seed} задач")
+            seed(pool, args.seed, args.batch, args.vocabulary)
+        with pool.connection("bench-search") as conn:
+            total = conn.execute("SELECT count(*) FROM tasks").fetchone()[0]
+        print(f"\nЗадач в таблице: {total}, повторов: {args.repeat}")
+        for title, query in QUERIES.items():
+            query = query.format(code=code_word(12345 % args.vocabulary))
+            timings, result = measure(pool, query, args.repeat)
+            p50 = timings[len(timings) // 2]
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"  {title:<20} {query!r:<30} p50 {p50 * 1000:7.2f} ms  "
+                  f"p95 {p95 * 1000:7.2f} ms  {result['mode']:<8} {len(result['tasks'])}")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
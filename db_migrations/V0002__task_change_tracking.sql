@@ -0,0 +1,91 @@
+-- Отслеживание изменений задач для дельта-синхронизации (sync-task GET ?since=)
+-- Каждое изменение задачи получает новый номер из task_change_seq,
+-- удаленные задачи остаются в task_tombstones
+-- Миграция не блокирует запись в tasks на время чтения таблицы: колонка
+-- change_seq добавляется без значения по умолчанию (nextval в DEFAULT
+-- переписал бы всю таблицу под ACCESS EXCLUSIVE), заполняется пачками
+-- с COMMIT после каждой, NOT NULL - через проверку NOT VALID и VALIDATE,
+-- индекс CONCURRENTLY. Поэтому файл выполняется по одному оператору
+-- (psql -f, как в docker-entrypoint-initdb.d), не в одной транзакции
+
+CREATE SEQUENCE IF NOT EXISTS task_change_seq;
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS change_seq BIGINT;
+
+-- Новые строки получают номер сразу, существующие - при заполнении ниже
+ALTER TABLE tasks ALTER COLUMN change_seq SET DEFAULT nextval('task_change_seq');
+
+CREATE TABLE IF NOT EXISTS task_tombstones (
+    task_id INTEGER PRIMARY KEY,
+    change_seq BIGINT NOT NULL DEFAULT nextval('task_change_seq'),
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION tasks_track_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('task_change_seq');
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tasks_track_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO task_tombstones (task_id) VALUES (OLD.id)
+    ON CONFLICT (task_id) DO UPDATE
+        SET change_seq = nextval('task_change_seq'), deleted_at = CURRENT_TIMESTAMP;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_tasks_track_change
+    BEFORE UPDATE ON tasks
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION tasks_track_change();
+
+CREATE OR REPLACE TRIGGER trg_tasks_track_delete
+    AFTER DELETE ON tasks
+    FOR EACH ROW
+    EXECUTE FUNCTION tasks_track_delete();
+
+-- Номера существующих задач. Триггеры уже созданы: задача, измененная во
+-- время заполнения, получает номер сама. Номер заполненной строки выдает
+-- trg_tasks_track_change. Повторный вызов продолжает с незаполненных строк
+CREATE OR REPLACE PROCEDURE backfill_change_seq(batch_size INTEGER DEFAULT 5000) AS $$
+DECLARE
+    last_id INTEGER;
+    max_id INTEGER;
+BEGIN
+    last_id := 0;
+    SELECT COALESCE(MAX(id), 0) INTO max_id FROM tasks;
+    WHILE last_id < max_id LOOP
+        UPDATE tasks SET change_seq = nextval('task_change_seq')
+        WHERE id > last_id AND id <= last_id + batch_size AND change_seq IS NULL;
+        last_id := last_id + batch_size;
+        COMMIT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CALL backfill_change_seq();
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tasks_change_seq_not_null_check') THEN
+        ALTER TABLE tasks ADD CONSTRAINT tasks_change_seq_not_null_check
+            CHECK (change_seq IS NOT NULL) NOT VALID;
+    END IF;
+END;
+$$;
+
+-- Проверка существующих строк без блокировки записи; с ней SET NOT NULL
+-- не сканирует таблицу, а проверка больше не нужна
+ALTER TABLE tasks VALIDATE CONSTRAINT tasks_change_seq_not_null_check;
+ALTER TABLE tasks ALTER COLUMN change_seq SET NOT NULL;
+ALTER TABLE tasks DROP CONSTRAINT IF EXISTS tasks_change_seq_not_null_check;
+
+-- Дельта: SELECT ... FROM tasks WHERE change_seq > :cursor ORDER BY change_seq
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_change_seq ON tasks(change_seq);
+CREATE INDEX IF NOT EXISTS idx_task_tombstones_change_seq ON task_tombstones(change_seq);
@@ -0,0 +1,29 @@
+-- Очередь исходящих уведомлений Telegram (outbox)
+-- Handler пишет сообщения в той же транзакции, что и изменение задачи,
+-- фоновый worker gateway доставляет их с повторными попытками
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    task_id INTEGER,
+    chat_id BIGINT NOT NULL,
+    text TEXT NOT NULL,
+    reply_markup JSONB,
+    -- pending -> sending -> sent | pending (повтор) | dead
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    -- Для sending - срок аренды: после него сообщение снова берется в работу
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Выборка очередной пачки: только недоставленные сообщения
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+    ON notification_outbox(next_attempt_at, id)
+    WHERE status IN ('pending', 'sending');
+
+-- Очистка доставленных сообщений
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_sent
+    ON notification_outbox(sent_at)
+    WHERE status = 'sent';
@@ -0,0 +1,16 @@
+-- Напоминания о сроках задач ("скоро срок" и "просрочено")
+-- Планировщик gateway читает открытые задачи по индексу дедлайнов,
+-- task_reminders не дает отправить одно напоминание дважды
+
+CREATE TABLE IF NOT EXISTS task_reminders (
+    task_id INTEGER NOT NULL,
+    kind VARCHAR(16) NOT NULL,
+    deadline DATE NOT NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (task_id, kind, deadline)
+);
+
+-- Открытые задачи по сроку: окно планировщика WHERE deadline >= ... AND deadline < ...
+CREATE INDEX IF NOT EXISTS idx_tasks_open_deadline
+    ON tasks(deadline, id)
+    WHERE completed = FALSE AND deadline IS NOT NULL;
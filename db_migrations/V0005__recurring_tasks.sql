@@ -0,0 +1,30 @@
+-- Повторяющиеся задачи по правилу в формате cron
+-- Задачи создаются по одной, когда очередное срабатывание попадает
+-- в горизонт планировщика gateway, а не заранее на месяцы вперед
+
+CREATE TABLE IF NOT EXISTS task_recurrences (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    priority VARCHAR(50) DEFAULT 'medium',
+    urgent BOOLEAN DEFAULT FALSE,
+    created_by VARCHAR(255),
+    assignee_emails TEXT[] NOT NULL DEFAULT '{}',
+    rule VARCHAR(255) NOT NULL,
+    deadline_offset_days INTEGER NOT NULL DEFAULT 0,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    next_run_at TIMESTAMP NOT NULL,
+    last_run_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Очередь срабатываний: WHERE active AND next_run_at <= :horizon ORDER BY next_run_at
+CREATE INDEX IF NOT EXISTS idx_task_recurrences_next_run
+    ON task_recurrences(next_run_at)
+    WHERE active = TRUE;
+
+-- Экземпляр повторяющейся задачи; повторная вставка того же срабатывания игнорируется
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS recurrence_id INTEGER REFERENCES task_recurrences(id);
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS recurrence_at TIMESTAMP;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_recurrence
+    ON tasks(recurrence_id, recurrence_at);
@@ -0,0 +1,40 @@
+-- Push-уведомления об изменениях задач (GET /api/task-events на gateway)
+-- Каждый uvicorn worker слушает канал task_changes и рассылает события
+-- своим SSE клиентам; в уведомлении только id и номер изменения,
+-- сами задачи worker читает одним запросом на пачку уведомлений
+
+CREATE OR REPLACE FUNCTION tasks_notify_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', 'upsert', 'id', NEW.id, 'seq', NEW.change_seq
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_tombstones_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', 'delete', 'id', NEW.task_id, 'seq', NEW.change_seq
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_tasks_notify_insert
+    AFTER INSERT ON tasks
+    FOR EACH ROW
+    EXECUTE FUNCTION tasks_notify_change();
+
+-- UPDATE без изменений не получает нового change_seq (V0002) и не рассылается
+CREATE OR REPLACE TRIGGER trg_tasks_notify_update
+    AFTER UPDATE ON tasks
+    FOR EACH ROW
+    WHEN (OLD.change_seq IS DISTINCT FROM NEW.change_seq)
+    EXECUTE FUNCTION tasks_notify_change();
+
+-- Удаление видно по tombstone: у него уже есть номер изменения
+CREATE OR REPLACE TRIGGER trg_task_tombstones_notify
+    AFTER INSERT OR UPDATE ON task_tombstones
+    FOR EACH ROW
+    EXECUTE FUNCTION task_tombstones_notify();
@@ -0,0 +1,24 @@
+-- Входящие обновления Telegram (webhook /api/telegram-bot на gateway)
+-- update_id - первичный ключ: повторная доставка того же обновления
+-- отбрасывается; обработка идет фоном пачками, как в notification_outbox
+
+CREATE TABLE IF NOT EXISTS telegram_updates (
+    update_id BIGINT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+-- Очередь на обработку: pending и processing с истекшей арендой
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_due
+    ON telegram_updates(next_attempt_at, update_id)
+    WHERE status IN ('pending', 'processing');
+
+-- Очистка обработанных: Telegram хранит неподтвержденные обновления до 24 часов
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_processed
+    ON telegram_updates(processed_at)
+    WHERE status IN ('done', 'failed');
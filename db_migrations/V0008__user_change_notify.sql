@@ -0,0 +1,45 @@
+-- Сброс кэша пользователей на gateway (gateway/users.py)
+-- Каждый uvicorn worker слушает канал user_changes и удаляет из кэша
+-- записи по прежним и новым имени, email и telegram_chat_id пользователя;
+-- avatar в уведомление не входит - он может не поместиться в 8000 байт NOTIFY
+
+CREATE OR REPLACE FUNCTION users_notify_change() RETURNS trigger AS $$
+DECLARE
+    keys JSON[] := '{}';
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        keys := keys || json_build_object(
+            'name', OLD.name, 'email', OLD.email, 'chat_id', OLD.telegram_chat_id
+        );
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        keys := keys || json_build_object(
+            'name', NEW.name, 'email', NEW.email, 'chat_id', NEW.telegram_chat_id
+        );
+    END IF;
+    PERFORM pg_notify('user_changes', json_build_object(
+        'op', lower(TG_OP),
+        'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        'keys', array_to_json(keys)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_users_notify_insert
+    AFTER INSERT ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION users_notify_change();
+
+-- Смена аватара не затрагивает кэш и не рассылается
+CREATE OR REPLACE TRIGGER trg_users_notify_update
+    AFTER UPDATE ON users
+    FOR EACH ROW
+    WHEN ((OLD.name, OLD.email, OLD.role, OLD.telegram_chat_id)
+          IS DISTINCT FROM (NEW.name, NEW.email, NEW.role, NEW.telegram_chat_id))
+    EXECUTE FUNCTION users_notify_change();
+
+CREATE OR REPLACE TRIGGER trg_users_notify_delete
+    AFTER DELETE ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION users_notify_change();
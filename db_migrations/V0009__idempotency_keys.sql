@@ -0,0 +1,25 @@
+-- Ключи идемпотентности запросов к gateway (заголовок Idempotency-Key)
+-- Первый запрос с ключом занимает строку и выполняет handler, ответ
+-- сохраняется; повтор с тем же ключом получает сохраненный ответ.
+-- Строки удаляются фоном после expires_at
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    function_name VARCHAR(64) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    -- blake2b метода и тела: тот же ключ с другим запросом отклоняется
+    fingerprint BYTEA NOT NULL,
+    -- processing - handler выполняется, done - ответ сохранен
+    status VARCHAR(16) NOT NULL DEFAULT 'processing',
+    -- Пока не истекло, повтор получает 409; потом ключ можно занять снова
+    locked_until TIMESTAMP NOT NULL,
+    -- Кто занял ключ: ответ сохраняет только он, а не запрос, у которого ключ перехватили
+    owner VARCHAR(32) NOT NULL,
+    status_code INTEGER,
+    headers JSONB,
+    body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (function_name, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
@@ -0,0 +1,127 @@
+-- Счетчики задач по исполнителям вместо агрегирующего запроса
+-- Строка пользователя меняется триггерами при назначении, снятии и
+-- выполнении задачи, статистика читается одной строкой по первичному ключу.
+-- Расхождения исправляет фоновая сверка на gateway (gateway/stats.py)
+
+CREATE TABLE IF NOT EXISTS user_task_stats (
+    user_email VARCHAR(255) PRIMARY KEY,
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Триггеры уровня оператора с таблицами переходов: пакетная вставка
+-- назначений меняет строку каждого пользователя один раз, а не на каждую
+-- строку (иначе длинные цепочки версий одной строки в транзакции)
+
+-- Назначение и снятие исполнителя: total и, для выполненной задачи, completed
+CREATE OR REPLACE FUNCTION task_assignments_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_task_stats (user_email, total_tasks, completed_tasks)
+        SELECT n.user_email, COUNT(*), COUNT(*) FILTER (WHERE t.completed)
+        FROM new_rows n JOIN tasks t ON t.id = n.task_id
+        GROUP BY n.user_email
+        ORDER BY n.user_email
+        ON CONFLICT (user_email) DO UPDATE
+        SET total_tasks = user_task_stats.total_tasks + EXCLUDED.total_tasks,
+            completed_tasks = user_task_stats.completed_tasks + EXCLUDED.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE user_task_stats s
+        SET total_tasks = s.total_tasks - d.total_tasks,
+            completed_tasks = s.completed_tasks - d.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT o.user_email, COUNT(*)::INTEGER AS total_tasks,
+                   (COUNT(*) FILTER (WHERE t.completed))::INTEGER AS completed_tasks
+            FROM old_rows o JOIN tasks t ON t.id = o.task_id
+            GROUP BY o.user_email
+        ) d
+        WHERE s.user_email = d.user_email;
+    ELSE
+        -- Перенос назначения на другую задачу или другого пользователя
+        INSERT INTO user_task_stats (user_email, total_tasks, completed_tasks)
+        SELECT user_email, SUM(total_tasks), SUM(completed_tasks)
+        FROM (
+            SELECT n.user_email, 1 AS total_tasks, t.completed::INTEGER AS completed_tasks
+            FROM new_rows n JOIN tasks t ON t.id = n.task_id
+            UNION ALL
+            SELECT o.user_email, -1, -t.completed::INTEGER
+            FROM old_rows o JOIN tasks t ON t.id = o.task_id
+        ) d
+        GROUP BY user_email
+        HAVING SUM(total_tasks) <> 0 OR SUM(completed_tasks) <> 0
+        ORDER BY user_email
+        ON CONFLICT (user_email) DO UPDATE
+        SET total_tasks = user_task_stats.total_tasks + EXCLUDED.total_tasks,
+            completed_tasks = user_task_stats.completed_tasks + EXCLUDED.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Смена статуса задач: completed всех их исполнителей (повторное назначение считается дважды, как в total)
+CREATE OR REPLACE FUNCTION tasks_count_completed() RETURNS trigger AS $$
+BEGIN
+    UPDATE user_task_stats s
+    SET completed_tasks = s.completed_tasks + d.delta,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT ta.user_email,
+               SUM(CASE WHEN COALESCE(n.completed, FALSE) THEN 1 ELSE -1 END)::INTEGER AS delta
+        FROM new_tasks n
+        JOIN old_tasks o ON o.id = n.id
+        JOIN task_assignments ta ON ta.task_id = n.id
+        WHERE COALESCE(n.completed, FALSE) <> COALESCE(o.completed, FALSE)
+        GROUP BY ta.user_email
+        HAVING SUM(CASE WHEN COALESCE(n.completed, FALSE) THEN 1 ELSE -1 END) <> 0
+    ) d
+    WHERE s.user_email = d.user_email;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_assignments_count ON task_assignments;
+DROP TRIGGER IF EXISTS trg_task_assignments_count_insert ON task_assignments;
+DROP TRIGGER IF EXISTS trg_task_assignments_count_delete ON task_assignments;
+DROP TRIGGER IF EXISTS trg_task_assignments_count_update ON task_assignments;
+DROP TRIGGER IF EXISTS trg_tasks_count_completed ON tasks;
+
+CREATE TRIGGER trg_task_assignments_count_insert
+    AFTER INSERT ON task_assignments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION task_assignments_count();
+
+CREATE TRIGGER trg_task_assignments_count_delete
+    AFTER DELETE ON task_assignments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION task_assignments_count();
+
+-- Таблицы переходов несовместимы со списком колонок (UPDATE OF), поэтому
+-- триггер срабатывает на любое изменение и сам отбирает нужные строки
+CREATE TRIGGER trg_task_assignments_count_update
+    AFTER UPDATE ON task_assignments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION task_assignments_count();
+
+CREATE TRIGGER trg_tasks_count_completed
+    AFTER UPDATE ON tasks
+    REFERENCING OLD TABLE AS old_tasks NEW TABLE AS new_tasks
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION tasks_count_completed();
+
+-- Начальное заполнение (повторный запуск миграции пересчитывает заново)
+INSERT INTO user_task_stats (user_email, total_tasks, completed_tasks)
+SELECT ta.user_email, COUNT(*), COUNT(*) FILTER (WHERE t.completed)
+FROM task_assignments ta
+JOIN tasks t ON t.id = ta.task_id
+GROUP BY ta.user_email
+ON CONFLICT (user_email) DO UPDATE
+SET total_tasks = EXCLUDED.total_tasks,
+    completed_tasks = EXCLUDED.completed_tasks,
+    updated_at = CURRENT_TIMESTAMP;
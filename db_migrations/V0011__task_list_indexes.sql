@@ -0,0 +1,75 @@
+-- Индексы постраничного списка задач (GET /api/task-list)
+-- Страницы идут по ключу (created_at, id) от новых к старым: каждый индекс
+-- отдает задачи сразу в этом порядке, и LIMIT читает только одну страницу
+-- Миграция не блокирует запись в tasks на время чтения таблицы: NOT NULL
+-- через проверку NOT VALID и VALIDATE, индексы CONCURRENTLY. Поэтому файл
+-- выполняется по одному оператору (psql -f, как в docker-entrypoint-initdb.d),
+-- не в одной транзакции. Если построение индекса прервалось, удалите
+-- недостроенный (INVALID) индекс через DROP INDEX CONCURRENTLY и запустите файл снова
+
+-- Ключ страниц не может быть NULL: строка с NULL выпала бы из сравнения
+-- (created_at, id) < курсор, а частичные индексы ниже рассчитаны на TRUE/FALSE.
+-- Сначала CHECK ... NOT VALID (новые NULL больше не появятся, существующие
+-- строки не проверяются), потом заполнение старых строк
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tasks_created_at_not_null_check') THEN
+        ALTER TABLE tasks ADD CONSTRAINT tasks_created_at_not_null_check
+            CHECK (created_at IS NOT NULL) NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tasks_completed_not_null_check') THEN
+        ALTER TABLE tasks ADD CONSTRAINT tasks_completed_not_null_check
+            CHECK (completed IS NOT NULL) NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tasks_urgent_not_null_check') THEN
+        ALTER TABLE tasks ADD CONSTRAINT tasks_urgent_not_null_check
+            CHECK (urgent IS NOT NULL) NOT VALID;
+    END IF;
+END;
+$$;
+
+UPDATE tasks SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+UPDATE tasks SET completed = FALSE WHERE completed IS NULL;
+UPDATE tasks SET urgent = FALSE WHERE urgent IS NULL;
+
+-- Проверка существующих строк без блокировки записи
+ALTER TABLE tasks VALIDATE CONSTRAINT tasks_created_at_not_null_check;
+ALTER TABLE tasks VALIDATE CONSTRAINT tasks_completed_not_null_check;
+ALTER TABLE tasks VALIDATE CONSTRAINT tasks_urgent_not_null_check;
+
+-- С проверенными CHECK SET NOT NULL не сканирует таблицу, а проверки больше не нужны
+ALTER TABLE tasks
+    ALTER COLUMN created_at SET NOT NULL,
+    ALTER COLUMN completed SET NOT NULL,
+    ALTER COLUMN urgent SET NOT NULL;
+
+ALTER TABLE tasks
+    DROP CONSTRAINT IF EXISTS tasks_created_at_not_null_check,
+    DROP CONSTRAINT IF EXISTS tasks_completed_not_null_check,
+    DROP CONSTRAINT IF EXISTS tasks_urgent_not_null_check;
+
+-- Без фильтров
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_created
+    ON tasks(created_at DESC, id DESC);
+
+-- Открытые задачи (completed=false) и срочные (urgent=true)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_open_created
+    ON tasks(created_at DESC, id DESC)
+    WHERE completed = FALSE;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_urgent_created
+    ON tasks(created_at DESC, id DESC)
+    WHERE urgent = TRUE;
+
+-- Фильтр по одному приоритету
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_priority_created
+    ON tasks(priority, created_at DESC, id DESC);
+
+-- Задачи исполнителя: выборка только из индекса, без чтения task_assignments.
+-- Заменяет idx_task_assignments_user(user_email)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_assignments_user_task
+    ON task_assignments(user_email, task_id);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_task_assignments_user;
+
+-- Диапазон сроков открытых задач - idx_tasks_open_deadline (V0004)
@@ -0,0 +1,164 @@
+-- Целочисленные ключи пользователей: task_assignments.user_id и
+-- tasks.created_by_id вместо сравнения строк email и имени
+-- Миграция работает без долгих блокировок таблиц: колонки без значения по
+-- умолчанию, внешние ключи NOT VALID, заполнение пачками с COMMIT после
+-- каждой, индексы CONCURRENTLY. Поэтому файл выполняется по одному
+-- оператору (psql -f, как в docker-entrypoint-initdb.d), не в одной транзакции.
+-- user_email и created_by остаются: их пишут старые версии handlers,
+-- а триггеры ниже дополняют ключи сами
+
+ALTER TABLE task_assignments ADD COLUMN IF NOT EXISTS user_id INTEGER;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS created_by_id INTEGER;
+
+-- Проверка существующих строк откладывается до VALIDATE после заполнения.
+-- Удаление пользователя не удаляет его задачи, а только отвязывает ключ
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'task_assignments_user_id_fkey') THEN
+        ALTER TABLE task_assignments ADD CONSTRAINT task_assignments_user_id_fkey
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL NOT VALID;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tasks_created_by_id_fkey') THEN
+        ALTER TABLE tasks ADD CONSTRAINT tasks_created_by_id_fkey
+            FOREIGN KEY (created_by_id) REFERENCES users(id) ON DELETE SET NULL NOT VALID;
+    END IF;
+END;
+$$;
+
+-- Автор задачи - имя или email (как пишет frontend); для одинаковых имен -
+-- пользователь с меньшим id, как в кэше пользователей
+CREATE INDEX IF NOT EXISTS idx_users_name ON users(name);
+
+CREATE OR REPLACE FUNCTION resolve_user_id(key TEXT) RETURNS INTEGER AS $$
+    SELECT id FROM users
+    WHERE email = key OR name = key
+    ORDER BY email = key DESC, id
+    LIMIT 1
+$$ LANGUAGE sql STABLE;
+
+-- Ключи новых и измененных строк: старый код пишет только email,
+-- новый может писать только user_id
+CREATE OR REPLACE FUNCTION task_assignments_user_id() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.user_email IS DISTINCT FROM OLD.user_email
+       AND NEW.user_id IS NOT DISTINCT FROM OLD.user_id THEN
+        NEW.user_id := NULL;
+    END IF;
+    IF NEW.user_id IS NULL THEN
+        SELECT id INTO NEW.user_id FROM users WHERE email = NEW.user_email;
+    ELSIF NEW.user_email IS NULL THEN
+        SELECT email INTO NEW.user_email FROM users WHERE id = NEW.user_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tasks_created_by_id() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.created_by IS DISTINCT FROM OLD.created_by THEN
+        NEW.created_by_id := resolve_user_id(NEW.created_by);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Назначения на email, для которого пользователя еще не было
+CREATE OR REPLACE FUNCTION users_link_assignments() RETURNS trigger AS $$
+BEGIN
+    UPDATE task_assignments SET user_id = NEW.id
+    WHERE user_id IS NULL AND user_email = NEW.email;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_task_assignments_user_id
+    BEFORE INSERT OR UPDATE OF user_email, user_id ON task_assignments
+    FOR EACH ROW
+    EXECUTE FUNCTION task_assignments_user_id();
+
+CREATE OR REPLACE TRIGGER trg_tasks_created_by_id
+    BEFORE INSERT OR UPDATE OF created_by ON tasks
+    FOR EACH ROW
+    EXECUTE FUNCTION tasks_created_by_id();
+
+CREATE OR REPLACE TRIGGER trg_users_link_assignments
+    AFTER INSERT OR UPDATE OF email ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION users_link_assignments();
+
+-- Заполнение ключей не считается изменением задачи: иначе каждая задача
+-- получила бы новый change_seq и ушла бы в SSE и дельта-синхронизацию
+CREATE OR REPLACE FUNCTION tasks_track_change() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('taskflow.backfill', TRUE) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    NEW.change_seq := nextval('task_change_seq');
+    NEW.updated_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Заполнение существующих строк диапазонами id; каждая пачка - своя
+-- короткая транзакция, параллельные записи ждут не дольше одной пачки.
+-- Повторный вызов продолжает с незаполненных строк
+CREATE OR REPLACE PROCEDURE backfill_user_ids(batch_size INTEGER DEFAULT 5000) AS $$
+DECLARE
+    last_id INTEGER;
+    max_id INTEGER;
+BEGIN
+    last_id := 0;
+    SELECT COALESCE(MAX(id), 0) INTO max_id FROM task_assignments;
+    WHILE last_id < max_id LOOP
+        UPDATE task_assignments ta SET user_id = u.id
+        FROM users u
+        WHERE ta.id > last_id AND ta.id <= last_id + batch_size
+          AND ta.user_id IS NULL AND u.email = ta.user_email;
+        last_id := last_id + batch_size;
+        COMMIT;
+    END LOOP;
+
+    last_id := 0;
+    SELECT COALESCE(MAX(id), 0) INTO max_id FROM tasks;
+    WHILE last_id < max_id LOOP
+        PERFORM set_config('taskflow.backfill', 'on', TRUE);
+        -- То же, что resolve_user_id(), но одним соединением на пачку
+        UPDATE tasks t SET created_by_id = k.id
+        FROM (
+            SELECT DISTINCT ON (key) key, id
+            FROM (
+                SELECT email AS key, id, 0 AS rank FROM users
+                UNION ALL
+                SELECT name, id, 1 FROM users
+            ) u
+            ORDER BY key, rank, id
+        ) k
+        WHERE t.id > last_id AND t.id <= last_id + batch_size
+          AND t.created_by_id IS NULL AND t.created_by = k.key;
+        last_id := last_id + batch_size;
+        COMMIT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CALL backfill_user_ids();
+
+-- Проверка внешних ключей без блокировки записи
+ALTER TABLE task_assignments VALIDATE CONSTRAINT task_assignments_user_id_fkey;
+ALTER TABLE tasks VALIDATE CONSTRAINT tasks_created_by_id_fkey;
+
+-- Покрывающие индексы: "мои задачи" и "кто назначен на задачу" читаются
+-- только из индекса (index-only scan), без обращения к строкам таблицы
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_assignments_user_id
+    ON task_assignments(user_id, task_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_assignments_task_user
+    ON task_assignments(task_id) INCLUDE (user_id);
+
+-- Назначения, ждущие регистрации пользователя (users_link_assignments)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_assignments_unlinked
+    ON task_assignments(user_email) WHERE user_id IS NULL;
+
+-- Строковые индексы заменены целочисленными
+DROP INDEX CONCURRENTLY IF EXISTS idx_task_assignments_task;
+DROP INDEX CONCURRENTLY IF EXISTS idx_task_assignments_user_task;
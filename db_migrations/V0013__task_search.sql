@@ -0,0 +1,122 @@
+-- Поиск задач по названию (GET /api/search-task): полнотекстовый по
+-- tsvector и исправление опечаток по словарю слов названий с индексом
+-- триграмм pg_trgm
+-- Как и V0012, выполняется по одному оператору (psql -f): вектор
+-- заполняется пачками с COMMIT, индексы строятся CONCURRENTLY.
+-- Нужна база с локалью UTF-8 (как в образе postgres): при LC_CTYPE=C
+-- кириллица не приводится к нижнему регистру и не разбивается на триграммы
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Конфигурация russian разбирает кириллицу русским стеммером, а слова
+-- латиницей - английским (english_stem), поэтому одного вектора хватает
+-- на названия на обоих языках
+CREATE OR REPLACE FUNCTION task_search_vector(title TEXT) RETURNS tsvector AS $$
+    SELECT to_tsvector('russian'::regconfig, COALESCE(title, ''))
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Слова названия без стемминга для словаря опечаток; числа и слова
+-- короче трех букв не исправляются
+CREATE OR REPLACE FUNCTION task_title_words(title TEXT) RETURNS TEXT[] AS $$
+    SELECT COALESCE(array_agg(w), '{}')
+    FROM unnest(tsvector_to_array(to_tsvector('simple'::regconfig, COALESCE(title, '')))) w
+    WHERE w ~ '^[[:alpha:]]{3,}$'
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+-- Словарь только пополняется: слова удаленных задач остаются, на
+-- исправление опечаток это почти не влияет
+CREATE TABLE IF NOT EXISTS task_search_words (
+    word TEXT PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION tasks_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := task_search_vector(NEW.title);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_tasks_search_vector
+    BEFORE INSERT OR UPDATE OF title ON tasks
+    FOR EACH ROW
+    EXECUTE FUNCTION tasks_search_vector();
+
+-- Новые слова - один раз на оператор, как счетчики в V0010; сортировка
+-- по слову - одинаковый порядок блокировок у параллельных вставок
+CREATE OR REPLACE FUNCTION tasks_collect_words() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO task_search_words (word)
+        SELECT DISTINCT unnest(task_title_words(n.title)) AS word
+        FROM new_tasks n
+        ORDER BY word
+        ON CONFLICT (word) DO NOTHING;
+    ELSE
+        INSERT INTO task_search_words (word)
+        SELECT DISTINCT unnest(task_title_words(n.title)) AS word
+        FROM new_tasks n JOIN old_tasks o ON o.id = n.id
+        WHERE n.title IS DISTINCT FROM o.title
+        ORDER BY word
+        ON CONFLICT (word) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tasks_words_insert ON tasks;
+DROP TRIGGER IF EXISTS trg_tasks_words_update ON tasks;
+
+CREATE TRIGGER trg_tasks_words_insert
+    AFTER INSERT ON tasks
+    REFERENCING NEW TABLE AS new_tasks
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION tasks_collect_words();
+
+CREATE TRIGGER trg_tasks_words_update
+    AFTER UPDATE ON tasks
+    REFERENCING OLD TABLE AS old_tasks NEW TABLE AS new_tasks
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION tasks_collect_words();
+
+-- Векторы и словарь существующих задач; как и backfill_user_ids(), не
+-- меняет change_seq и продолжает с незаполненных строк при повторном вызове
+CREATE OR REPLACE PROCEDURE backfill_task_search(batch_size INTEGER DEFAULT 5000) AS $$
+DECLARE
+    last_id INTEGER;
+    max_id INTEGER;
+BEGIN
+    last_id := 0;
+    SELECT COALESCE(MAX(id), 0) INTO max_id FROM tasks;
+    WHILE last_id < max_id LOOP
+        PERFORM set_config('taskflow.backfill', 'on', TRUE);
+        UPDATE tasks SET search_vector = task_search_vector(title)
+        WHERE id > last_id AND id <= last_id + batch_size AND search_vector IS NULL;
+        INSERT INTO task_search_words (word)
+        SELECT DISTINCT unnest(task_title_words(title)) AS word
+        FROM tasks
+        WHERE id > last_id AND id <= last_id + batch_size
+        ORDER BY word
+        ON CONFLICT (word) DO NOTHING;
+        last_id := last_id + batch_size;
+        COMMIT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CALL backfill_task_search();
+
+-- Частоты слов для планировщика: по умолчанию в статистику попадают только
+-- самые частые слова, а остальные оцениваются в 0,5% строк, и поиск редкого
+-- слова идет обходом всей таблицы по первичному ключу вместо индекса GIN
+ALTER TABLE tasks ALTER COLUMN search_vector SET STATISTICS 1000;
+ANALYZE tasks;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_search
+    ON tasks USING gin(search_vector);
+
+-- Ближайшее по триграммам слово словаря для слова с опечаткой или
+-- недописанного (оператор <%, gateway/search.py)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_search_words_trgm
+    ON task_search_words USING gin(word gin_trgm_ops);
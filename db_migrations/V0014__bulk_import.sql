@@ -0,0 +1,32 @@
+-- Загрузка задач пачками (gateway/transfer.py): на время загрузки триггер
+-- не рассылает событие на каждую задачу - миллионы уведомлений заняли бы
+-- очередь NOTIFY и всех SSE клиентов. Загрузка ставит в своей транзакции
+-- SET LOCAL taskflow.bulk_import = 'on', а в конце отправляет одно событие
+-- {"op": "reload"}, по которому клиенты перечитывают задачи
+
+CREATE OR REPLACE FUNCTION tasks_notify_change() RETURNS trigger AS $$
+BEGIN
+    IF current_setting('taskflow.bulk_import', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('task_changes', json_build_object(
+        'op', 'upsert', 'id', NEW.id, 'seq', NEW.change_seq
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Авторов пачки загрузка находит одним запросом и пишет created_by_id
+-- сама: поиск resolve_user_id() на каждую строку занимал около 40%
+-- времени COPY
+CREATE OR REPLACE FUNCTION tasks_created_by_id() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND current_setting('taskflow.bulk_import', TRUE) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'INSERT' OR NEW.created_by IS DISTINCT FROM OLD.created_by THEN
+        NEW.created_by_id := resolve_user_id(NEW.created_by);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,49 @@
+-- Граница видимых изменений задач для чтения по change_seq
+-- Номер изменения выдается в момент записи, а становится виден при COMMIT:
+-- долгая транзакция с номером 5 фиксируется позже короткой с номером 6,
+-- и читатель, уже сдвинувший курсор на 6, пропустил бы ее навсегда.
+-- Поэтому курсоры планировщика напоминаний и id событий SSE двигаются только
+-- до task_change_horizon() - номера, ниже которого новых изменений не появится
+
+-- Транзакция, которая пишет в tasks, перед первой записью берет разделяемую
+-- advisory-блокировку с ключом last_value последовательности: все ее номера
+-- не меньше ключа. Блокировка снимается при COMMIT или ROLLBACK; форма с двумя
+-- int4 (objsubid = 2) не пересекается с блокировками лидеров hashtext(...)
+CREATE OR REPLACE FUNCTION tasks_register_change() RETURNS trigger AS $$
+DECLARE
+    lower_bound BIGINT;
+BEGIN
+    IF current_setting('taskflow.change_registered', TRUE) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    SELECT last_value INTO lower_bound FROM task_change_seq;
+    PERFORM pg_advisory_xact_lock_shared((lower_bound >> 31)::int, (lower_bound & 2147483647)::int);
+    PERFORM set_config('taskflow.change_registered', 'on', TRUE);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- На оператор, а не на строку: номер из DEFAULT при INSERT и COPY
+-- выдается уже после триггеров BEFORE STATEMENT
+CREATE OR REPLACE TRIGGER trg_tasks_register_change
+    BEFORE INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION tasks_register_change();
+
+-- Сначала читается последний выданный номер, потом блокировки незавершенных
+-- транзакций: транзакция, не успевшая взять блокировку, получит номер больше
+-- прочитанного. Последовательность task_change_seq - с CACHE 1 (V0002)
+CREATE OR REPLACE FUNCTION task_change_horizon() RETURNS BIGINT AS $$
+DECLARE
+    allocated BIGINT;
+    oldest BIGINT;
+BEGIN
+    SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END
+    INTO allocated FROM task_change_seq;
+    SELECT MIN((classid::BIGINT << 31) | objid::BIGINT) INTO oldest
+    FROM pg_locks
+    WHERE locktype = 'advisory' AND objsubid = 2
+      AND database = (SELECT oid FROM pg_database WHERE datname = current_database());
+    RETURN LEAST(allocated, oldest - 1);
+END;
+$$ LANGUAGE plpgsql VOLATILE;
@@ -0,0 +1,111 @@
+-- Счетчики user_task_stats (V0010) по целочисленному ключу пользователя
+-- task_assignments.user_id (V0012) вместо user_email: строка счетчиков
+-- ищется и обновляется по INTEGER, смена email не рвет связь со статистикой.
+-- Назначения на email без пользователя (user_id IS NULL) не считаются, пока
+-- он не зарегистрируется: users_link_assignments проставит user_id, и
+-- триггер UPDATE добавит их к его счетчикам.
+-- Выполняется после V0012 одной транзакцией: на время пересчета запись
+-- в tasks и task_assignments ждет (на 1 000 000 задач - около двух секунд),
+-- иначе приращения триггеров во время пересчета посчитались бы дважды
+
+BEGIN;
+
+LOCK TABLE tasks, task_assignments IN SHARE MODE;
+
+DROP TABLE IF EXISTS user_task_stats;
+
+CREATE TABLE user_task_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Назначение и снятие исполнителя: total и, для выполненной задачи, completed.
+-- Вставка счетчиков - только для существующих пользователей: удаление
+-- пользователя обнуляет user_id назначений (ON DELETE SET NULL), и строка
+-- с отрицательным приращением нарушила бы внешний ключ
+CREATE OR REPLACE FUNCTION task_assignments_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_task_stats (user_id, total_tasks, completed_tasks)
+        SELECT n.user_id, COUNT(*), COUNT(*) FILTER (WHERE t.completed)
+        FROM new_rows n JOIN tasks t ON t.id = n.task_id
+        WHERE n.user_id IS NOT NULL
+        GROUP BY n.user_id
+        ORDER BY n.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_tasks = user_task_stats.total_tasks + EXCLUDED.total_tasks,
+            completed_tasks = user_task_stats.completed_tasks + EXCLUDED.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE user_task_stats s
+        SET total_tasks = s.total_tasks - d.total_tasks,
+            completed_tasks = s.completed_tasks - d.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT o.user_id, COUNT(*)::INTEGER AS total_tasks,
+                   (COUNT(*) FILTER (WHERE t.completed))::INTEGER AS completed_tasks
+            FROM old_rows o JOIN tasks t ON t.id = o.task_id
+            WHERE o.user_id IS NOT NULL
+            GROUP BY o.user_id
+        ) d
+        WHERE s.user_id = d.user_id;
+    ELSE
+        -- Перенос назначения на другую задачу или другого пользователя,
+        -- привязка назначения к зарегистрировавшемуся пользователю
+        INSERT INTO user_task_stats (user_id, total_tasks, completed_tasks)
+        SELECT d.user_id, SUM(d.total_tasks), SUM(d.completed_tasks)
+        FROM (
+            SELECT n.user_id, 1 AS total_tasks, t.completed::INTEGER AS completed_tasks
+            FROM new_rows n JOIN tasks t ON t.id = n.task_id
+            WHERE n.user_id IS NOT NULL
+            UNION ALL
+            SELECT o.user_id, -1, -t.completed::INTEGER
+            FROM old_rows o JOIN tasks t ON t.id = o.task_id
+            WHERE o.user_id IS NOT NULL
+        ) d
+        JOIN users u ON u.id = d.user_id
+        GROUP BY d.user_id
+        HAVING SUM(d.total_tasks) <> 0 OR SUM(d.completed_tasks) <> 0
+        ORDER BY d.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_tasks = user_task_stats.total_tasks + EXCLUDED.total_tasks,
+            completed_tasks = user_task_stats.completed_tasks + EXCLUDED.completed_tasks,
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Смена статуса задач: completed всех их исполнителей (повторное назначение считается дважды, как в total)
+CREATE OR REPLACE FUNCTION tasks_count_completed() RETURNS trigger AS $$
+BEGIN
+    UPDATE user_task_stats s
+    SET completed_tasks = s.completed_tasks + d.delta,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT ta.user_id,
+               SUM(CASE WHEN COALESCE(n.completed, FALSE) THEN 1 ELSE -1 END)::INTEGER AS delta
+        FROM new_tasks n
+        JOIN old_tasks o ON o.id = n.id
+        JOIN task_assignments ta ON ta.task_id = n.id
+        WHERE COALESCE(n.completed, FALSE) <> COALESCE(o.completed, FALSE)
+          AND ta.user_id IS NOT NULL
+        GROUP BY ta.user_id
+        HAVING SUM(CASE WHEN COALESCE(n.completed, FALSE) THEN 1 ELSE -1 END) <> 0
+    ) d
+    WHERE s.user_id = d.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Начальное заполнение; триггеры V0010 остаются теми же
+INSERT INTO user_task_stats (user_id, total_tasks, completed_tasks)
+SELECT ta.user_id, COUNT(*), COUNT(*) FILTER (WHERE t.completed)
+FROM task_assignments ta
+JOIN tasks t ON t.id = ta.task_id
+WHERE ta.user_id IS NOT NULL
+GROUP BY ta.user_id;
+
+COMMIT;
@@ -0,0 +1,4 @@
+"""
+TaskFlow Gateway - инфраструктура API Gateway
+Вспомогательные модули для server.py
+"""
@@ -0,0 +1,77 @@
+"""
+TaskFlow Gateway - кодирование JSON
+orjson, если он установлен, иначе стандартный json; результат всегда
+bytes UTF-8, чтобы ответ не проходил через промежуточную строку
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+from collections.abc import Mapping
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Типы из базы и handlers, которые json не кодирует сам"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, Mapping):
+        # HttpEvent и другие Mapping
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    """
+    JSON для ответов и тел запросов
+
+    Handler получает его как context.json. Оба варианта дают одинаковый
+    результат: компактный JSON без экранирования кириллицы, ключи-числа
+    становятся строками, даты - ISO 8601, Decimal - числом.
+    """
+
+    def __init__(self, use_orjson: bool = True):
+        self.orjson = orjson if use_orjson else None
+        self.name = "orjson" if self.orjson is not None else "json"
+
+    def dumps(self, value: Any) -> bytes:
+        if self.orjson is not None:
+            return self.orjson.dumps(value, default=_default, option=self.orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            value, ensure_ascii=False, separators=(",", ":"), default=_default
+        ).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        if self.orjson is not None:
+            return self.orjson.loads(data)
+        return json.loads(data)
+
+    def encode_body(self, body: Any) -> bytes:
+        """
+        Тело ответа handler в байтах
+
+        Строка (как раньше, готовый JSON или текст) кодируется в UTF-8,
+        bytes отдаются как есть, остальное (dict, list) - кодируется в JSON.
+        """
+        if isinstance(body, bytes):
+            return body
+        if isinstance(body, str):
+            return body.encode("utf-8")
+        if body is None:
+            return b""
+        return self.dumps(body)
+
+
+CODEC = JsonCodec()
@@ -0,0 +1,440 @@
+"""
+TaskFlow Gateway - общий пул подключений к PostgreSQL
+Handlers получают подключения через context.db вместо открытия
+нового соединения на каждый вызов
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import psycopg2
+import psycopg2.extensions
+
+from gateway.deadline import Deadline, DeadlineExceeded
+from gateway.metrics import DB_POOL_WAIT, DB_QUERY_DURATION
+from gateway.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить подключение из пула за отведенное время"""
+
+
+def to_positional(sql: str) -> Optional[str]:
+    """
+    Переводит плейсхолдеры psycopg2 (%s) в нумерованные ($1, $2, ...)
+
+    Args:
+        sql: запрос с плейсхолдерами %s
+
+    Returns:
+        Запрос для PREPARE или None, если используются именованные параметры
+    """
+    if "%(" in sql:
+        return None
+    counter = [0]
+
+    def replace(match):
+        if match.group() == "%%":
+            return "%"
+        counter[0] += 1
+        return f"${counter[0]}"
+
+    return _PLACEHOLDER.sub(replace, sql)
+
+
+class PooledConnection:
+    """
+    Подключение из пула с кэшем подготовленных запросов
+
+    Все атрибуты psycopg2 connection (cursor, commit, rollback и т.д.)
+    доступны напрямую, execute() выполняет запрос через PREPARE/EXECUTE.
+    """
+
+    def __init__(self, raw, statement_cache_size: int):
+        self.raw = raw
+        self.statement_cache_size = statement_cache_size
+        self.last_used = time.monotonic()
+        self._statements: "OrderedDict[str, str]" = OrderedDict()
+        self._counter = 0
+        # Гистограмма времени запросов функции, взявшей подключение (задается в acquire)
+        self.query_histogram = DB_QUERY_DURATION.labels("unknown")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.raw, name)
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None,
+                prepare: bool = True):
+        """
+        Выполняет запрос, подготавливая его при первом использовании
+
+        Args:
+            sql: запрос с плейсхолдерами %s
+            params: значения параметров
+            prepare: False - выполнить без подготовки
+
+        Returns:
+            Курсор с результатом
+        """
+        started = time.perf_counter()
+        try:
+            with TRACER.span("db.query", "client", {"db.system": "postgresql", "db.statement": sql[:500]}):
+                return self._execute(sql, params, prepare)
+        finally:
+            self.query_histogram.observe(time.perf_counter() - started)
+
+    def _execute(self, sql: str, params: Optional[Sequence[Any]], prepare: bool):
+        cursor = self.raw.cursor()
+        positional = to_positional(sql) if prepare and self.statement_cache_size else None
+        if positional is None:
+            cursor.execute(sql, params)
+            return cursor
+
+        name = self._statements.get(sql)
+        if name is None:
+            self._counter += 1
+            name = f"tf_stmt_{self._counter}"
+            cursor.execute(f"PREPARE {name} AS {positional}")
+            self._statements[sql] = name
+            if len(self._statements) > self.statement_cache_size:
+                _, evicted = self._statements.popitem(last=False)
+                cursor.execute(f"DEALLOCATE {evicted}")
+        else:
+            self._statements.move_to_end(sql)
+
+        if params:
+            placeholders = ", ".join(["%s"] * len(params))
+            cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+        return cursor
+
+
+class WaitStats:
+    """Ожидание подключений одной функцией"""
+    __slots__ = ("borrows", "timeouts", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.borrows = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        avg = self.wait_total / self.borrows if self.borrows else 0.0
+        return {
+            "borrows": self.borrows,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(avg * 1000, 3),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+        }
+
+
+class DatabasePool:
+    """
+    Пул подключений ограниченного размера с проверкой соединений
+
+    Подключение, простоявшее без дела дольше check_interval, перед выдачей
+    проверяется запросом SELECT 1; разорванные подключения пересоздаются.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 timeout: float = 5.0, check_interval: float = 30.0,
+                 statement_cache_size: int = 128):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.statement_cache_size = statement_cache_size
+        self._idle: List[PooledConnection] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats: Dict[str, WaitStats] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["DatabasePool"]:
+        """
+        Создает пул из переменных окружения или None без DATABASE_URL
+
+        DB_POOL_MIN / DB_POOL_MAX - размер пула
+        DB_POOL_TIMEOUT - ожидание свободного подключения (секунды)
+        DB_POOL_CHECK_INTERVAL - простой, после которого подключение проверяется
+        DB_STATEMENT_CACHE - подготовленных запросов на подключение (0 - выкл.)
+        """
+        dsn = os.environ.get("DATABASE_URL")
+        if not dsn:
+            return None
+        return cls(
+            dsn,
+            min_size=int(os.environ.get("DB_POOL_MIN", 1)),
+            max_size=int(os.environ.get("DB_POOL_MAX", 10)),
+            timeout=float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+            check_interval=float(os.environ.get("DB_POOL_CHECK_INTERVAL", 30)),
+            statement_cache_size=int(os.environ.get("DB_STATEMENT_CACHE", 128)),
+        )
+
+    def open(self):
+        """Открывает min_size подключений заранее"""
+        for _ in range(self.min_size):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append(conn)
+        logger.info(f"Database pool opened: min={self.min_size}, max={self.max_size}")
+
+    def _connect(self) -> PooledConnection:
+        raw = psycopg2.connect(self.dsn)
+        return PooledConnection(raw, self.statement_cache_size)
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if conn.raw.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.check_interval:
+            return True
+        try:
+            with conn.raw.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.raw.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: PooledConnection):
+        try:
+            conn.raw.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def acquire(self, function_name: str = "unknown",
+                timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Берет подключение из пула, при необходимости ожидая освобождения
+
+        Args:
+            function_name: функция, для которой собираются метрики ожидания
+            timeout: ожидание вместо общего DB_POOL_TIMEOUT
+
+        Returns:
+            Подключение; его нужно вернуть через release()
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = started + timeout
+        stats = self._stats.setdefault(function_name, WaitStats())
+        while True:
+            with self._cond:
+                conn = None
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Database pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        stats.timeouts += 1
+                        raise PoolTimeout(
+                            f"No database connection available in {timeout:.3f}s"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn):
+                logger.warning("Dropping broken database connection")
+                self._discard(conn)
+                continue
+
+            waited = time.perf_counter() - started
+            with self._cond:
+                stats.borrows += 1
+                stats.wait_total += waited
+                if waited > stats.wait_max:
+                    stats.wait_max = waited
+            DB_POOL_WAIT.observe(waited, function_name)
+            conn.query_histogram = DB_QUERY_DURATION.labels(function_name)
+            return conn
+
+    def release(self, conn: PooledConnection):
+        """Возвращает подключение в пул, откатывая незавершенную транзакцию"""
+        if conn.raw.closed or self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.raw.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, function_name: str = "unknown",
+                   timeout: Optional[float] = None) -> Iterator[PooledConnection]:
+        """
+        Подключение на время блока with
+
+        При успешном выходе транзакция фиксируется, при исключении - откатывается.
+        """
+        with TRACER.span("db.acquire"):
+            conn = self.acquire(function_name, timeout)
+        try:
+            yield conn
+            if not conn.raw.closed:
+                conn.raw.commit()
+        except BaseException:
+            if not conn.raw.closed:
+                try:
+                    conn.raw.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            self.release(conn)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние пула для /health"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "functions": {
+                    name: stats.snapshot() for name, stats in sorted(self._stats.items())
+                }
+            }
+
+    def close(self):
+        """Закрывает все свободные подключения и запрещает выдачу новых"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+class AdvisoryLock:
+    """
+    Сессионная advisory-блокировка PostgreSQL на отдельном подключении
+
+    Выбирает один процесс среди uvicorn workers (и контейнеров с общей базой)
+    для фоновой работы, которую нельзя выполнять параллельно. Блокировка
+    снимается сама, когда подключение закрывается или рвется.
+    """
+
+    def __init__(self, dsn: str, name: str):
+        self.dsn = dsn
+        self.name = name
+        self._conn = None
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None
+
+    def try_acquire(self) -> bool:
+        """Пытается взять блокировку, не дожидаясь ее освобождения"""
+        if self._conn is not None:
+            return True
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (self.name,))
+                acquired = cursor.fetchone()[0]
+        except psycopg2.Error:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def check(self) -> bool:
+        """Проверяет, что подключение с блокировкой живо; иначе блокировка потеряна"""
+        if self._conn is None:
+            return False
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            logger.warning(f"Advisory lock {self.name} lost")
+            self.release()
+            return False
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+
+class FunctionDatabase:
+    """
+    Доступ к пулу от имени конкретной функции (context.db)
+
+    Пример в handler:
+        with context.db.connection() as conn:
+            cursor = conn.execute("SELECT id FROM tasks WHERE id = %s", (task_id,))
+
+    Со сроком запроса ожидание подключения не превышает оставшееся время,
+    а запросам транзакции ставится statement_timeout до срока.
+    """
+
+    def __init__(self, pool: DatabasePool, function_name: str,
+                 deadline: Optional[Deadline] = None):
+        self.pool = pool
+        self.function_name = function_name
+        self.deadline = deadline
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        if self.deadline is None:
+            with self.pool.connection(self.function_name) as conn:
+                yield conn
+            return
+        self.deadline.check()
+        try:
+            with self.pool.connection(
+                self.function_name, min(self.pool.timeout, self.deadline.remaining())
+            ) as conn:
+                # SET LOCAL действует до конца транзакции, connection() ее фиксирует
+                timeout_ms = max(int(self.deadline.remaining() * 1000), 1)
+                conn.execute(f"SET LOCAL statement_timeout = {timeout_ms}", prepare=False)
+                yield conn
+        except psycopg2.extensions.QueryCanceledError as e:
+            raise DeadlineExceeded("Request deadline exceeded during a database query") from e
+        except PoolTimeout as e:
+            if self.deadline.expired:
+                raise DeadlineExceeded("Request deadline exceeded waiting for a database connection") from e
+            raise
@@ -0,0 +1,41 @@
+"""
+TaskFlow Gateway - срок выполнения запроса
+Отсчитывается от поступления запроса; handler видит его как
+context.deadline_ms, база и Telegram ограничивают им свои ожидания
+"""
+
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Срок запроса истек - работу нужно прекратить"""
+
+
+class Deadline:
+    """
+    Момент, к которому запрос должен быть обработан
+
+    Хранится по time.monotonic(), чтобы не зависеть от перевода часов;
+    epoch_ms - тот же момент в миллисекундах Unix для context.deadline_ms.
+    """
+    __slots__ = ("at",)
+
+    def __init__(self, timeout: float):
+        self.at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """Оставшееся время в секундах (отрицательное после истечения)"""
+        return self.at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    @property
+    def epoch_ms(self) -> int:
+        return int((time.time() + self.remaining()) * 1000)
+
+    def check(self):
+        """Бросает DeadlineExceeded, если срок истек"""
+        if self.expired:
+            raise DeadlineExceeded("Request deadline exceeded")
@@ -0,0 +1,393 @@
+"""
+TaskFlow Gateway - диспетчер вызовов handler функций
+Синхронные handlers выполняются в ограниченном пуле потоков,
+асинхронные (async def) вызываются напрямую в event loop
+"""
+
+import asyncio
+import contextvars
+import inspect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from gateway.deadline import Deadline, DeadlineExceeded
+from gateway.metrics import FUNCTION_QUEUE_WAIT
+from gateway.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THREADS = 16
+
+# Срок выполнения функции по умолчанию (секунды)
+DEFAULT_TIMEOUT = 30.0
+
+# Вес последнего вызова в скользящем среднем длительности handler
+DURATION_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Очередь функции не успеет до срока запроса - запрос отклоняется сразу"""
+
+
+def parse_limits(raw: str, value_type: Callable[[str], Any] = int) -> Dict[str, Any]:
+    """
+    Разбирает лимиты вида "telegram-bot=4,notify-task=8"
+
+    Args:
+        raw: строка с лимитами через запятую
+        value_type: тип значения (int - параллельность, float - срок в секундах)
+
+    Returns:
+        Dict имя функции -> значение лимита
+    """
+    limits: Dict[str, Any] = {}
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise ValueError(f"Invalid function limit: {item!r}")
+        name, value = item.split("=", 1)
+        limit = value_type(value)
+        if limit <= 0:
+            raise ValueError(f"Function limit must be positive: {item!r}")
+        limits[name.strip()] = limit
+    return limits
+
+
+def _release_when_done(semaphore: asyncio.Semaphore):
+    """Callback: освободить слот функции, когда брошенный handler все же завершится"""
+    def callback(future: "asyncio.Future"):
+        if not future.cancelled():
+            future.exception()
+        semaphore.release()
+    return callback
+
+
+class FunctionStats:
+    """Счетчики вызовов одной функции"""
+    __slots__ = ("limit", "calls", "errors", "in_flight", "waiting",
+                 "wait_total", "wait_max", "wait_histogram",
+                 "duration_avg", "shed", "timeouts")
+
+    def __init__(self, limit: int, function_name: str = "unknown"):
+        self.limit = limit
+        self.wait_histogram = FUNCTION_QUEUE_WAIT.labels(function_name)
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.duration_avg = 0.0
+        self.shed = 0
+        self.timeouts = 0
+
+    def record_duration(self, seconds: float):
+        if self.duration_avg == 0.0:
+            self.duration_avg = seconds
+        else:
+            self.duration_avg += DURATION_SMOOTHING * (seconds - self.duration_avg)
+
+    def expected_wait(self) -> float:
+        """
+        Оценка ожидания слота для нового вызова
+
+        Пока есть свободные слоты - ноль; иначе впереди waiting вызовов,
+        которые выполняются по limit одновременно за duration_avg каждый.
+        """
+        if self.in_flight + self.waiting < self.limit:
+            return 0.0
+        return (self.waiting + 1) / self.limit * self.duration_avg
+
+    def record_wait(self, seconds: float):
+        self.wait_histogram.observe(seconds)
+        self.wait_total += seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        started = self.calls - self.waiting
+        avg = self.wait_total / started if started > 0 else 0.0
+        return {
+            "limit": self.limit,
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "wait_ms_avg": round(avg * 1000, 3),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+            "duration_ms_avg": round(self.duration_avg * 1000, 3),
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
+
+
+class Dispatcher:
+    """
+    Запускает handlers, не блокируя event loop
+
+    Каждая функция ограничена собственным семафором, синхронные
+    handlers дополнительно ограничены общим пулом потоков.
+    Время ожидания считается от поступления запроса до старта handler.
+
+    У вызова может быть срок (Deadline). Если по оценке очереди слот
+    не освободится до срока, вызов сразу отклоняется (Overloaded), не
+    занимая место в очереди. Async handler по истечении срока отменяется;
+    поток синхронного handler прервать нельзя, поэтому ответ возвращается
+    сразу, а слот функции освобождается, когда handler завершится.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_THREADS,
+                 default_limit: Optional[int] = None,
+                 limits: Optional[Dict[str, int]] = None,
+                 default_timeout: float = DEFAULT_TIMEOUT,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.max_workers = max_workers
+        self.default_limit = default_limit or max_workers
+        self.limits = dict(limits or {})
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="handler"
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, FunctionStats] = {}
+        # Задачи, отправленные в пул, но еще не получившие поток
+        self._queued = 0
+        # Счетчики меняются и в event loop, и в потоках пула
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Dispatcher":
+        """
+        Создает диспетчер из переменных окружения
+
+        GATEWAY_THREADS - размер пула потоков
+        GATEWAY_FUNCTION_CONCURRENCY - лимит по умолчанию на функцию
+        GATEWAY_FUNCTION_LIMITS - индивидуальные лимиты ("notify-task=8,...")
+        GATEWAY_FUNCTION_TIMEOUT - срок вызова функции по умолчанию (секунды)
+        GATEWAY_FUNCTION_TIMEOUTS - индивидуальные сроки ("telegram-bot=10,...")
+        """
+        max_workers = int(os.environ.get("GATEWAY_THREADS", DEFAULT_THREADS))
+        default_limit = os.environ.get("GATEWAY_FUNCTION_CONCURRENCY")
+        return cls(
+            max_workers=max_workers,
+            default_limit=int(default_limit) if default_limit else None,
+            limits=parse_limits(os.environ.get("GATEWAY_FUNCTION_LIMITS", "")),
+            default_timeout=float(os.environ.get("GATEWAY_FUNCTION_TIMEOUT", DEFAULT_TIMEOUT)),
+            timeouts=parse_limits(os.environ.get("GATEWAY_FUNCTION_TIMEOUTS", ""), float)
+        )
+
+    def deadline_for(self, function_name: str) -> Deadline:
+        """Срок вызова функции, отсчитанный от текущего момента"""
+        return Deadline(self.timeouts.get(function_name, self.default_timeout))
+
+    def _stats_for(self, function_name: str) -> FunctionStats:
+        stats = self._stats.get(function_name)
+        if stats is None:
+            limit = self.limits.get(function_name, self.default_limit)
+            stats = self._stats[function_name] = FunctionStats(limit, function_name)
+            self._semaphores[function_name] = asyncio.Semaphore(limit)
+        return stats
+
+    async def dispatch(self, function_name: str, handler: Callable,
+                       event: Dict[str, Any], context: Any,
+                       deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        Вызывает handler с учетом лимитов функции
+
+        Args:
+            function_name: имя функции (telegram-bot, notify-task и т.д.)
+            handler: handler(event, context), обычный или async
+            event: Cloud Function Event
+            context: объект контекста
+            deadline: срок вызова (None - без ограничения)
+
+        Returns:
+            Результат handler
+
+        Raises:
+            Overloaded: слот функции не освободится до срока
+            DeadlineExceeded: handler не завершился до срока
+        """
+        stats = self._stats_for(function_name)
+        semaphore = self._semaphores[function_name]
+        if deadline is not None:
+            budget = deadline.remaining()
+            with self._lock:
+                expected = stats.expected_wait()
+                if budget <= 0 or expected > budget:
+                    stats.shed += 1
+            if budget <= 0 or expected > budget:
+                raise Overloaded(
+                    f"{function_name}: expected queue wait {expected:.3f}s "
+                    f"exceeds remaining {max(budget, 0):.3f}s"
+                )
+        enqueued = time.perf_counter()
+        with self._lock:
+            stats.calls += 1
+            stats.waiting += 1
+        try:
+            acquired = await self._acquire(semaphore, deadline)
+        except BaseException:
+            acquired = None
+            raise
+        finally:
+            if not acquired:
+                with self._lock:
+                    stats.calls -= 1
+                    stats.waiting -= 1
+                    if acquired is False:
+                        stats.shed += 1
+        if not acquired:
+            raise Overloaded(f"{function_name}: no free slot before the deadline")
+
+        release = True
+        try:
+            if inspect.iscoroutinefunction(handler):
+                started = self._start(stats, enqueued)
+                try:
+                    with TRACER.span("handler", attributes={"function": function_name}):
+                        if deadline is None:
+                            return await handler(event, context)
+                        try:
+                            return await asyncio.wait_for(
+                                handler(event, context), max(deadline.remaining(), 0)
+                            )
+                        except asyncio.TimeoutError:
+                            if not deadline.expired:
+                                raise
+                            with self._lock:
+                                stats.timeouts += 1
+                            raise DeadlineExceeded(f"{function_name} did not finish before the deadline")
+                finally:
+                    self._finish(stats, started)
+
+            with self._lock:
+                self._queued += 1
+            # Контекст копируется, чтобы spans handler попали в трассу запроса
+            future = self._executor.submit(
+                contextvars.copy_context().run,
+                self._run_sync, function_name, stats, enqueued, handler, event, context
+            )
+            result = asyncio.wrap_future(future)
+            timeout = max(deadline.remaining(), 0) if deadline is not None else None
+            try:
+                done, _ = await asyncio.wait((result,), timeout=timeout)
+                if done:
+                    return result.result()
+            except asyncio.CancelledError:
+                release = self._abandon(future, result, stats, semaphore)
+                raise
+            with self._lock:
+                stats.timeouts += 1
+            release = self._abandon(future, result, stats, semaphore)
+            raise DeadlineExceeded(f"{function_name} did not finish before the deadline")
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+        finally:
+            if release:
+                semaphore.release()
+
+    @staticmethod
+    async def _acquire(semaphore: asyncio.Semaphore, deadline: Optional[Deadline]) -> bool:
+        """Занимает слот функции; False - слот не освободился до срока"""
+        if deadline is None or not semaphore.locked():
+            await semaphore.acquire()
+            return True
+
+        def release_if_acquired(waiter: "asyncio.Future"):
+            # Слот мог достаться одновременно с отменой ожидания
+            if not waiter.cancelled() and waiter.exception() is None:
+                semaphore.release()
+
+        waiter = asyncio.ensure_future(semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait((waiter,), timeout=max(deadline.remaining(), 0))
+        except BaseException:
+            waiter.cancel()
+            waiter.add_done_callback(release_if_acquired)
+            raise
+        if done:
+            return True
+        waiter.cancel()
+        waiter.add_done_callback(release_if_acquired)
+        return False
+
+    def _abandon(self, future, result: "asyncio.Future", stats: FunctionStats,
+                 semaphore: asyncio.Semaphore) -> bool:
+        """
+        Прекращает ожидание синхронного handler
+
+        Returns:
+            True, если handler еще не начал выполняться и слот можно освободить
+        """
+        if future.cancel():
+            with self._lock:
+                self._queued -= 1
+                stats.waiting -= 1
+            return True
+        # Поток не прервать: слот освободится, когда handler завершится
+        result.add_done_callback(_release_when_done(semaphore))
+        return False
+
+    def _start(self, stats: FunctionStats, enqueued: float, queued: bool = False) -> float:
+        started = time.perf_counter()
+        with self._lock:
+            if queued:
+                self._queued -= 1
+            stats.waiting -= 1
+            stats.in_flight += 1
+            stats.record_wait(started - enqueued)
+        return started
+
+    def _finish(self, stats: FunctionStats, started: float):
+        duration = time.perf_counter() - started
+        with self._lock:
+            stats.in_flight -= 1
+            stats.record_duration(duration)
+
+    def _run_sync(self, function_name: str, stats: FunctionStats, enqueued: float,
+                  handler: Callable, event: Dict[str, Any], context: Any) -> Any:
+        started = self._start(stats, enqueued, queued=True)
+        try:
+            with TRACER.span("handler", attributes={"function": function_name}):
+                return handler(event, context)
+        finally:
+            self._finish(stats, started)
+
+    @property
+    def queue_depth(self) -> int:
+        """Синхронные вызовы, ожидающие свободного потока"""
+        return self._queued
+
+    def in_flight(self):
+        """(метки, значение) выполняющихся и ожидающих вызовов для /metrics"""
+        with self._lock:
+            return [
+                ((name, state), value)
+                for name, stats in self._stats.items()
+                for state, value in (("running", stats.in_flight), ("waiting", stats.waiting))
+            ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние пула для /health"""
+        return {
+            "threads": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "functions": {
+                name: stats.snapshot() for name, stats in sorted(self._stats.items())
+            }
+        }
+
+    def shutdown(self):
+        """Дожидается завершения запущенных handlers и останавливает пул"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
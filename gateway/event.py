@@ -0,0 +1,119 @@
+"""
+TaskFlow Gateway - событие Cloud Function поверх ASGI запроса
+Поля event вычисляются при первом обращении: handler, которому нужно
+только тело, не платит за разбор заголовков и параметров запроса
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import URL
+
+from gateway.codec import CODEC
+
+_DELETED = object()
+
+
+def _headers(event: "HttpEvent") -> Dict[str, str]:
+    # Как dict(request.headers): имена в нижнем регистре, при повторе - первое значение
+    headers: Dict[str, str] = {}
+    for name, value in event.scope["headers"]:
+        headers.setdefault(name.decode("latin-1"), value.decode("latin-1"))
+    return headers
+
+
+def _query(event: "HttpEvent") -> Dict[str, str]:
+    query_string = event.scope.get("query_string", b"")
+    if not query_string:
+        return {}
+    return dict(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+
+
+def _request_context(event: "HttpEvent") -> Dict[str, Any]:
+    client = event.scope.get("client")
+    return {
+        "requestId": event.request_id,
+        "identity": {
+            "sourceIp": client[0] if client else "unknown",
+            "userAgent": event["headers"].get("user-agent", "")
+        },
+        "httpMethod": event.scope["method"],
+        "requestTime": "",
+        "requestTimeEpoch": 0
+    }
+
+
+# Поля event в порядке прежнего dict и функции, которые их вычисляют
+_FIELDS: Dict[str, Callable[["HttpEvent"], Any]] = {
+    "httpMethod": lambda event: event.scope["method"],
+    "headers": _headers,
+    "url": lambda event: str(URL(scope=event.scope)),
+    "params": lambda event: {},
+    "queryStringParameters": _query,
+    "multiValueParams": lambda event: {},
+    "multiValueHeaders": lambda event: {},
+    "multiValueQueryStringParameters": lambda event: {},
+    "pathParams": lambda event: {},
+    "body": lambda event: event.raw_body.decode("utf-8") if event.raw_body else "",
+    "isBase64Encoded": lambda event: False,
+    "requestContext": _request_context,
+}
+
+
+class HttpEvent(MutableMapping):
+    """
+    Cloud Function Event, который строится по мере обращения к полям
+
+    Ведет себя как прежний dict (event["body"], event.get("headers"),
+    изменение полей), но хранит только ASGI scope и тело запроса как есть.
+    Тело без декодирования доступно в raw_body, json() разбирает его
+    напрямую из байтов. dict(event) - обычный dict со всеми полями.
+    """
+    __slots__ = ("scope", "raw_body", "request_id", "_values")
+
+    def __init__(self, scope: Dict[str, Any], raw_body: bytes, request_id: str):
+        self.scope = scope
+        self.raw_body = raw_body
+        self.request_id = request_id
+        # Уже вычисленные, измененные и добавленные handler поля
+        self._values: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values.get(key, _DELETED)
+        if value is _DELETED:
+            if key in self._values or key not in _FIELDS:
+                raise KeyError(key)
+            value = self._values[key] = _FIELDS[key](self)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._values[key] = value
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self._values[key] = _DELETED
+
+    def __contains__(self, key: object) -> bool:
+        if self._values.get(key) is _DELETED:
+            return False
+        return key in self._values or key in _FIELDS
+
+    def __iter__(self) -> Iterator[str]:
+        for key in _FIELDS:
+            if self._values.get(key) is not _DELETED:
+                yield key
+        for key, value in self._values.items():
+            if key not in _FIELDS and value is not _DELETED:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"HttpEvent({self.scope['method']} {self.scope['path']}, {len(self.raw_body)} bytes)"
+
+    def json(self) -> Any:
+        """Тело запроса как JSON, без промежуточной строки"""
+        return CODEC.loads(self.raw_body) if self.raw_body else None
@@ -0,0 +1,236 @@
+"""
+TaskFlow Gateway - идемпотентность запросов
+Повтор запроса с тем же заголовком Idempotency-Key (ретрай frontend или
+прокси) получает сохраненный ответ, handler второй раз не выполняется
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import uuid
+from typing import Any, Dict, Optional
+
+from psycopg2.extras import Json
+
+from gateway.db import DatabasePool
+
+logger = logging.getLogger(__name__)
+
+_KEY = re.compile(r"^[\x21-\x7e]{1,255}$")
+
+# Новый ключ, истекший ключ или ключ, брошенный упавшим запросом, - занимаем.
+# Занятый другим запросом ключ не меняется, и RETURNING ничего не вернет
+CLAIM_SQL = """
+    INSERT INTO idempotency_keys AS k
+        (function_name, idempotency_key, fingerprint, owner, locked_until, expires_at)
+    VALUES (%s, %s, %s, %s,
+            CURRENT_TIMESTAMP + make_interval(secs => %s),
+            CURRENT_TIMESTAMP + make_interval(secs => %s))
+    ON CONFLICT (function_name, idempotency_key) DO UPDATE
+    SET fingerprint = EXCLUDED.fingerprint,
+        owner = EXCLUDED.owner,
+        status = 'processing',
+        locked_until = EXCLUDED.locked_until,
+        expires_at = EXCLUDED.expires_at,
+        status_code = NULL, headers = NULL, body = NULL,
+        created_at = CURRENT_TIMESTAMP
+    WHERE k.expires_at <= CURRENT_TIMESTAMP
+       OR (k.status = 'processing' AND k.locked_until <= CURRENT_TIMESTAMP
+           AND k.fingerprint = EXCLUDED.fingerprint)
+    RETURNING k.owner
+"""
+
+EXISTING_SQL = """
+    SELECT fingerprint, status, status_code, headers, body
+    FROM idempotency_keys
+    WHERE function_name = %s AND idempotency_key = %s
+"""
+
+COMPLETE_SQL = """
+    UPDATE idempotency_keys
+    SET status = 'done', status_code = %s, headers = %s, body = %s
+    WHERE function_name = %s AND idempotency_key = %s AND owner = %s
+"""
+
+RELEASE_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE function_name = %s AND idempotency_key = %s AND owner = %s AND status = 'processing'
+"""
+
+CLEANUP_SQL = """
+    DELETE FROM idempotency_keys
+    WHERE ctid IN (
+        SELECT ctid FROM idempotency_keys
+        WHERE expires_at <= CURRENT_TIMESTAMP
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+"""
+
+# Состояния Claim
+ACQUIRED = "acquired"
+REPLAY = "replay"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+
+def valid_key(key: str) -> bool:
+    """Ключ - от 1 до 255 печатных символов ASCII без пробелов"""
+    return bool(_KEY.match(key))
+
+
+def fingerprint(method: str, path: str, body: bytes) -> bytes:
+    """Отпечаток запроса: тот же ключ с другим телом - ошибка клиента"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{method} {path}\n".encode("utf-8"))
+    digest.update(body)
+    return digest.digest()
+
+
+class Claim:
+    """Результат попытки занять ключ"""
+    __slots__ = ("state", "owner", "status_code", "headers", "body")
+
+    def __init__(self, state: str, owner: Optional[str] = None, status_code: Optional[int] = None,
+                 headers: Optional[Dict[str, str]] = None, body: Optional[bytes] = None):
+        self.state = state
+        self.owner = owner
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+class IdempotencyStore:
+    """
+    Ключи идемпотентности в таблице idempotency_keys
+
+    Ключ занимается одним INSERT ... ON CONFLICT: из одновременных
+    повторов на разных uvicorn workers handler выполнит только один,
+    остальные получат 409, пока он не закончит, и сохраненный ответ после.
+    Ответ сохраняется, если handler вернул статус меньше 500; при ошибке
+    ключ освобождается, и повтор выполнит запрос заново. Если запрос
+    прервался по сроку, handler мог успеть изменить данные - ключ остается
+    занятым до locked_until и только потом может быть занят повтором.
+    """
+
+    def __init__(self, pool: DatabasePool, ttl: float = 86400.0, lease_grace: float = 30.0,
+                 cleanup_interval: float = 600.0, cleanup_batch: int = 1000):
+        self.pool = pool
+        self.ttl = ttl
+        self.lease_grace = lease_grace
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch = cleanup_batch
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"acquired": 0, "replayed": 0, "conflicts": 0, "mismatches": 0,
+                      "stored": 0, "released": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool) -> "IdempotencyStore":
+        """
+        IDEMPOTENCY_TTL_HOURS - сколько часов помнить ответ по ключу
+        IDEMPOTENCY_LEASE_GRACE - запас к сроку запроса, после которого
+            ключ прерванного запроса можно занять снова (секунды)
+        """
+        return cls(
+            pool,
+            ttl=float(os.environ.get("IDEMPOTENCY_TTL_HOURS", 24)) * 3600,
+            lease_grace=float(os.environ.get("IDEMPOTENCY_LEASE_GRACE", 30)),
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="idempotency-cleanup")
+        logger.info(f"Idempotency keys enabled: ttl={self.ttl / 3600:g}h")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def claim(self, function_name: str, key: str, request_fingerprint: bytes,
+              timeout: float) -> Claim:
+        """
+        Занимает ключ перед вызовом handler
+
+        Args:
+            function_name: функция - ключи разных функций не пересекаются
+            key: значение Idempotency-Key
+            request_fingerprint: fingerprint() запроса
+            timeout: сколько секунд осталось до срока запроса
+
+        Returns:
+            Claim: ACQUIRED - выполнять handler и затем complete()/release();
+            REPLAY - сохраненный ответ; IN_PROGRESS - ключ занят другим
+            запросом; MISMATCH - ключ уже использован с другим запросом
+        """
+        owner = uuid.uuid4().hex
+        existing = None
+        with self.pool.connection("idempotency") as conn:
+            # Строку могут удалить между запросами (release, очистка) - тогда пробуем еще раз
+            for _ in range(3):
+                row = conn.execute(CLAIM_SQL, (
+                    function_name, key, request_fingerprint, owner,
+                    max(timeout, 0) + self.lease_grace, self.ttl
+                )).fetchone()
+                if row is not None:
+                    self.stats["acquired"] += 1
+                    return Claim(ACQUIRED, owner)
+                existing = conn.execute(EXISTING_SQL, (function_name, key)).fetchone()
+                if existing is not None:
+                    break
+        if existing is None:
+            self.stats["conflicts"] += 1
+            return Claim(IN_PROGRESS)
+        stored_fingerprint, status, status_code, headers, body = existing
+        if bytes(stored_fingerprint) != request_fingerprint:
+            self.stats["mismatches"] += 1
+            return Claim(MISMATCH)
+        if status != "done":
+            self.stats["conflicts"] += 1
+            return Claim(IN_PROGRESS)
+        self.stats["replayed"] += 1
+        return Claim(REPLAY, status_code=status_code, headers=headers or {},
+                     body=bytes(body) if body is not None else b"")
+
+    def complete(self, function_name: str, key: str, owner: str, status_code: int,
+                 headers: Dict[str, str], body: bytes):
+        """Сохраняет ответ handler для повторов"""
+        with self.pool.connection("idempotency") as conn:
+            conn.execute(COMPLETE_SQL, (status_code, Json(headers), body, function_name, key, owner))
+        self.stats["stored"] += 1
+
+    def release(self, function_name: str, key: str, owner: str):
+        """Освобождает ключ: handler не выполнился, повтор выполнит запрос заново"""
+        with self.pool.connection("idempotency") as conn:
+            conn.execute(RELEASE_SQL, (function_name, key, owner))
+        self.stats["released"] += 1
+
+    def cleanup(self) -> int:
+        """Удаляет истекшие ключи пачками; возвращает число удаленных"""
+        deleted = 0
+        while True:
+            with self.pool.connection("idempotency") as conn:
+                count = conn.execute(CLEANUP_SQL, (self.cleanup_batch,)).rowcount
+            deleted += count
+            if count < self.cleanup_batch:
+                break
+        self.stats["expired"] += deleted
+        return deleted
+
+    async def _run(self):
+        while True:
+            try:
+                deleted = await asyncio.to_thread(self.cleanup)
+                if deleted:
+                    logger.info(f"Removed {deleted} expired idempotency keys")
+            except Exception as e:
+                logger.error(f"Idempotency keys cleanup failed: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ttl_hours": self.ttl / 3600, **self.stats}
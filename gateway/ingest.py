@@ -0,0 +1,412 @@
+"""
+TaskFlow Gateway - прием обновлений Telegram
+Webhook сохраняет обновление в telegram_updates и сразу отвечает Telegram,
+фоновый обработчик разбирает обновления пачками и вызывает handler telegram-bot
+"""
+
+import asyncio
+import html
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from psycopg2.extras import Json, execute_values
+
+from gateway.db import DatabasePool
+from gateway.telegram import TelegramClient, TelegramError
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SQL = """
+    WITH batch AS (
+        SELECT update_id FROM telegram_updates
+        WHERE status IN ('pending', 'processing') AND next_attempt_at <= CURRENT_TIMESTAMP
+        ORDER BY update_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE telegram_updates u
+    SET status = 'processing',
+        attempts = u.attempts + 1,
+        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+    FROM batch
+    WHERE u.update_id = batch.update_id
+    RETURNING u.update_id, u.payload, u.attempts
+"""
+
+# Одно изменение на задачу независимо от числа нажатий в пачке
+COMPLETE_SQL = """
+    WITH updated AS (
+        UPDATE tasks SET completed = TRUE
+        WHERE id = ANY(%s) AND completed = FALSE
+        RETURNING id
+    )
+    SELECT id, title FROM tasks WHERE id = ANY(%s)
+"""
+
+
+def update_event(update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Обновление Telegram в формате Cloud Function Event (как create_event в server.py)
+
+    Args:
+        update: объект Update из Bot API
+
+    Returns:
+        Event с обновлением в body, как при вызове webhook
+    """
+    return {
+        "httpMethod": "POST",
+        "headers": {"content-type": "application/json"},
+        "url": "/api/telegram-bot",
+        "params": {},
+        "queryStringParameters": {},
+        "multiValueParams": {},
+        "multiValueHeaders": {},
+        "multiValueQueryStringParameters": {},
+        "pathParams": {},
+        "body": json.dumps(update, ensure_ascii=False),
+        "isBase64Encoded": False,
+        "requestContext": {
+            "requestId": f"telegram-update-{update.get('update_id')}",
+            "identity": {
+                "sourceIp": "telegram",
+                "userAgent": ""
+            },
+            "httpMethod": "POST",
+            "requestTime": "",
+            "requestTimeEpoch": 0
+        }
+    }
+
+
+def complete_task_id(update: Dict[str, Any]) -> Optional[int]:
+    """id задачи из нажатия кнопки complete_{id} или None"""
+    data = (update.get("callback_query") or {}).get("data") or ""
+    if data.startswith("complete_") and data[9:].isdigit():
+        return int(data[9:])
+    return None
+
+
+def update_chat_id(update: Dict[str, Any]) -> Any:
+    """Чат обновления: обновления одного чата обрабатываются по порядку"""
+    message = update.get("message") or update.get("edited_message")
+    if message:
+        return message.get("chat", {}).get("id")
+    callback = update.get("callback_query")
+    if callback:
+        return (callback.get("message") or {}).get("chat", {}).get("id") or \
+            callback.get("from", {}).get("id")
+    return None
+
+
+class TelegramIngest:
+    """
+    Прием и пакетная обработка обновлений Telegram
+
+    accept() записывает обновление одним INSERT ... ON CONFLICT DO NOTHING:
+    повторная доставка того же update_id (Telegram повторяет, если ответ
+    задержался) не дойдет до handler ни на этом, ни на другом worker.
+    Недавние update_id дополнительно держатся в ограниченном кэше в памяти.
+
+    Обработчик забирает пачку через FOR UPDATE SKIP LOCKED. Нажатия
+    "Отметить выполненной" всей пачки применяются одним UPDATE; остальные
+    обновления передаются handler telegram-bot - параллельно по чатам
+    и по порядку внутри чата. Цепочка одного чата может идти дольше срока
+    аренды, поэтому аренда пачки продлевается до записи результатов:
+    другой worker заберет обновления только после падения этого.
+    """
+
+    def __init__(self, pool: DatabasePool, telegram: Optional[TelegramClient],
+                 invoke: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 batch_size: int = 100, poll_interval: float = 1.0, lease: float = 60.0,
+                 max_attempts: int = 5, retry_base: float = 2.0,
+                 retention_hours: int = 25, seen_cache_size: int = 10000):
+        self.pool = pool
+        self.telegram = telegram
+        self.invoke = invoke
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retention_hours = retention_hours
+        self.seen_cache_size = seen_cache_size
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "accepted": 0, "duplicates": 0, "batches": 0,
+            "handled": 0, "completed_tasks": 0, "retried": 0, "failed": 0
+        }
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool, telegram: Optional[TelegramClient],
+                 invoke: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> "TelegramIngest":
+        """
+        TELEGRAM_INGEST_BATCH_SIZE - обновлений за одну выборку
+        TELEGRAM_INGEST_POLL_INTERVAL - пауза между опросами пустой очереди (секунды)
+        TELEGRAM_INGEST_MAX_ATTEMPTS - попыток обработки до статуса failed
+        TELEGRAM_INGEST_RETENTION_HOURS - сколько часов помнить обработанные update_id
+        """
+        return cls(
+            pool,
+            telegram,
+            invoke,
+            batch_size=int(os.environ.get("TELEGRAM_INGEST_BATCH_SIZE", 100)),
+            poll_interval=float(os.environ.get("TELEGRAM_INGEST_POLL_INTERVAL", 1)),
+            max_attempts=int(os.environ.get("TELEGRAM_INGEST_MAX_ATTEMPTS", 5)),
+            retention_hours=int(os.environ.get("TELEGRAM_INGEST_RETENTION_HOURS", 25)),
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="telegram-ingest")
+        logger.info("Telegram update ingest started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---------- прием ----------
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = None
+        self._seen.move_to_end(update_id)
+        while len(self._seen) > self.seen_cache_size:
+            self._seen.popitem(last=False)
+
+    def _insert(self, updates: List[Tuple[int, Dict[str, Any]]]) -> int:
+        with self.pool.connection("telegram-ingest") as conn:
+            with conn.cursor() as cursor:
+                rows = execute_values(
+                    cursor,
+                    "INSERT INTO telegram_updates (update_id, payload) VALUES %s "
+                    "ON CONFLICT (update_id) DO NOTHING RETURNING update_id",
+                    [(update_id, Json(update)) for update_id, update in updates],
+                    fetch=True
+                )
+        return len(rows)
+
+    async def accept(self, updates: List[Dict[str, Any]]) -> int:
+        """
+        Сохраняет обновления для обработки
+
+        Args:
+            updates: объекты Update (из webhook - по одному, из getUpdates - пачкой)
+
+        Returns:
+            Сколько обновлений новые (остальные - повторная доставка)
+        """
+        fresh = []
+        for update in updates:
+            update_id = update.get("update_id")
+            if not isinstance(update_id, int) or update_id in self._seen:
+                self.stats["duplicates"] += 1
+                continue
+            fresh.append((update_id, update))
+        if not fresh:
+            return 0
+        inserted = await asyncio.to_thread(self._insert, fresh)
+        for update_id, _ in fresh:
+            self._remember(update_id)
+        self.stats["accepted"] += inserted
+        self.stats["duplicates"] += len(fresh) - inserted
+        if inserted:
+            self._wakeup.set()
+        return inserted
+
+    # ---------- обработка ----------
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.retry_base * (2 ** max(attempts - 1, 0)), 300.0)
+
+    def _claim(self) -> List[tuple]:
+        with self.pool.connection("telegram-ingest") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(CLAIM_SQL, (self.batch_size, self.lease))
+                return cursor.fetchall()
+
+    async def _renew_lease(self, update_ids: List[int]):
+        """Продлевает аренду пачки каждую треть срока, пока идет обработка"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self._extend, update_ids)
+            except Exception as e:
+                logger.warning(f"Telegram ingest: failed to renew lease: {e}")
+
+    def _extend(self, update_ids: List[int]):
+        with self.pool.connection("telegram-ingest") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE telegram_updates "
+                    "SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s) "
+                    "WHERE update_id = ANY(%s) AND status = 'processing'",
+                    (self.lease, update_ids)
+                )
+
+    def _complete_tasks(self, task_ids: List[int]) -> Dict[int, str]:
+        with self.pool.connection("telegram-ingest") as conn:
+            rows = conn.execute(COMPLETE_SQL, (task_ids, task_ids)).fetchall()
+        return dict(rows)
+
+    async def _answer_complete(self, callback: Dict[str, Any], title: Optional[str]):
+        if self.telegram is None:
+            return
+        message = callback.get("message") or {}
+        try:
+            if title is not None and message:
+                await self.telegram.call("editMessageText", {
+                    "chat_id": message["chat"]["id"],
+                    "message_id": message["message_id"],
+                    "text": f"✅ <s>{html.escape(title)}</s>\n\n<b>Статус:</b> Выполнено ✓",
+                    "parse_mode": "HTML"
+                })
+            await self.telegram.call("answerCallbackQuery", {
+                "callback_query_id": callback["id"],
+                "text": "Задача отмечена выполненной!" if title is not None else "Задача не найдена"
+            })
+        except (TelegramError, httpx.HTTPError, ValueError, KeyError) as e:
+            # Статус задачи уже записан - ошибка ответа не повод повторять обновление
+            logger.warning(f"Failed to answer callback {callback.get('id')}: {e}")
+
+    async def _handle_chat(self, items: List[tuple], results: Dict[int, Optional[str]]):
+        for update_id, update in items:
+            try:
+                result = await self.invoke(update_event(update))
+                status_code = (result or {}).get("statusCode", 200)
+                results[update_id] = None if status_code < 500 else f"Handler returned {status_code}"
+            except Exception as e:
+                logger.error(f"telegram-bot failed on update {update_id}: {e}", exc_info=True)
+                results[update_id] = str(e)
+
+    async def process_batch(self) -> int:
+        """
+        Забирает и обрабатывает одну пачку обновлений
+
+        Returns:
+            Количество обновлений в пачке
+        """
+        rows = await asyncio.to_thread(self._claim)
+        if not rows:
+            return 0
+        self.stats["batches"] += 1
+        results: Dict[int, Optional[str]] = {}
+        completes: List[tuple] = []
+        chats: Dict[Any, List[tuple]] = {}
+        for update_id, update, _ in rows:
+            task_id = complete_task_id(update)
+            if task_id is not None:
+                completes.append((update_id, task_id, update["callback_query"]))
+            else:
+                chats.setdefault(update_chat_id(update), []).append((update_id, update))
+
+        renewal = asyncio.create_task(self._renew_lease([row[0] for row in rows]))
+        try:
+            await self._handle(chats, completes, results)
+        finally:
+            renewal.cancel()
+            # Результаты уже обработанных обновлений записываются и при ошибке:
+            # иначе после аренды handler вызвался бы для них повторно
+            attempts = {update_id: attempts for update_id, _, attempts in rows}
+            await asyncio.to_thread(self._finish, results, attempts)
+        return len(rows)
+
+    async def _handle(self, chats: Dict[Any, List[tuple]], completes: List[tuple],
+                      results: Dict[int, Optional[str]]):
+        work = [self._handle_chat(items, results) for items in chats.values()]
+        if completes:
+            task_ids = sorted({task_id for _, task_id, _ in completes})
+            try:
+                titles = await asyncio.to_thread(self._complete_tasks, task_ids)
+            except Exception as e:
+                logger.error(f"Failed to complete tasks {task_ids}: {e}", exc_info=True)
+                for update_id, _, _ in completes:
+                    results[update_id] = str(e)
+            else:
+                self.stats["completed_tasks"] += len(task_ids)
+                for update_id, task_id, callback in completes:
+                    results[update_id] = None
+                    work.append(self._answer_complete(callback, titles.get(task_id)))
+        for outcome in await asyncio.gather(*work, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                logger.error(f"Telegram ingest: batch work failed: {outcome}", exc_info=outcome)
+
+    def _finish(self, results: Dict[int, Optional[str]], attempts: Dict[int, int]):
+        done = [update_id for update_id, error in results.items() if error is None]
+        failed = []
+        for update_id, error in results.items():
+            if error is None:
+                continue
+            if attempts[update_id] >= self.max_attempts:
+                failed.append((update_id, "failed", 0.0, error))
+                self.stats["failed"] += 1
+            else:
+                failed.append((update_id, "pending", self.retry_delay(attempts[update_id]), error))
+                self.stats["retried"] += 1
+        self.stats["handled"] += len(done)
+        with self.pool.connection("telegram-ingest") as conn:
+            with conn.cursor() as cursor:
+                if done:
+                    cursor.execute(
+                        "UPDATE telegram_updates SET status = 'done', processed_at = CURRENT_TIMESTAMP, "
+                        "last_error = NULL WHERE update_id = ANY(%s)",
+                        (done,)
+                    )
+                if failed:
+                    execute_values(
+                        cursor,
+                        "UPDATE telegram_updates u SET status = v.status, "
+                        "next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => v.delay), "
+                        "processed_at = CASE WHEN v.status = 'failed' THEN CURRENT_TIMESTAMP END, "
+                        "last_error = v.error "
+                        "FROM (VALUES %s) AS v(update_id, status, delay, error) "
+                        "WHERE u.update_id = v.update_id",
+                        failed,
+                        template="(%s::bigint, %s, %s::float8, %s)"
+                    )
+
+    def _cleanup(self):
+        with self.pool.connection("telegram-ingest") as conn:
+            cursor = conn.execute(
+                "DELETE FROM telegram_updates WHERE status IN ('done', 'failed') "
+                "AND processed_at < CURRENT_TIMESTAMP - make_interval(hours => %s)",
+                (self.retention_hours,)
+            )
+            if cursor.rowcount:
+                logger.info(f"Telegram ingest: removed {cursor.rowcount} processed updates")
+
+    async def _run(self):
+        cleanup_every = 3600.0
+        loop = asyncio.get_running_loop()
+        next_cleanup = loop.time()
+        while True:
+            try:
+                processed = await self.process_batch()
+                if loop.time() >= next_cleanup:
+                    await asyncio.to_thread(self._cleanup)
+                    next_cleanup = loop.time() + cleanup_every
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Telegram ingest error: {e}", exc_info=True)
+                processed = 0
+            if processed < self.batch_size:
+                # Новые обновления этого worker будят обработчик сразу,
+                # обновления, принятые другими workers, - не позже poll_interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -0,0 +1,146 @@
+"""
+TaskFlow Gateway - получение обновлений Telegram через getUpdates
+Замена webhook там, где нельзя открыть публичный HTTPS адрес: обновления
+передаются в тот же прием (TelegramIngest) и дальше в handler telegram-bot
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+
+from gateway.db import AdvisoryLock, DatabasePool
+from gateway.ingest import TelegramIngest
+from gateway.telegram import TelegramClient, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# getUpdates одного бота может выполнять только один процесс (иначе 409 Conflict)
+LOCK_NAME = "taskflow-telegram-polling"
+
+
+class TelegramPoller:
+    """
+    Long polling getUpdates
+
+    Опрос ведет один процесс, державший advisory lock. Смещение хранится
+    в самой базе: обновления записываются в telegram_updates до следующего
+    getUpdates, который подтверждает их Telegram, поэтому после перезапуска
+    опрос продолжается с MAX(update_id) + 1 без потерь и повторов.
+    """
+
+    def __init__(self, pool: DatabasePool, telegram: TelegramClient, ingest: TelegramIngest,
+                 limit: int = 100, timeout: int = 25,
+                 allowed_updates: Sequence[str] = ("message", "callback_query"),
+                 retry_delay: float = 5.0, leader_retry: float = 15.0):
+        self.pool = pool
+        self.telegram = telegram
+        self.ingest = ingest
+        self.limit = max(1, min(limit, 100))
+        self.timeout = timeout
+        self.allowed_updates = list(allowed_updates)
+        self.retry_delay = retry_delay
+        self.leader_retry = leader_retry
+        self.offset: Optional[int] = None
+        self._lock = AdvisoryLock(pool.dsn, LOCK_NAME)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"polls": 0, "updates": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool, telegram: TelegramClient,
+                 ingest: TelegramIngest) -> "TelegramPoller":
+        """
+        TELEGRAM_POLL_LIMIT - обновлений за один getUpdates (1-100)
+        TELEGRAM_POLL_TIMEOUT - время ожидания long polling (секунды)
+        """
+        return cls(
+            pool,
+            telegram,
+            ingest,
+            limit=int(os.environ.get("TELEGRAM_POLL_LIMIT", 100)),
+            timeout=int(os.environ.get("TELEGRAM_POLL_TIMEOUT", 25)),
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="telegram-polling")
+        logger.info("Telegram long polling started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._lock.release()
+
+    def _load_offset(self) -> Optional[int]:
+        with self.pool.connection("telegram-polling") as conn:
+            (last,) = conn.execute("SELECT MAX(update_id) FROM telegram_updates").fetchone()
+        return last + 1 if last is not None else None
+
+    async def _become_leader(self) -> bool:
+        if not await asyncio.to_thread(self._lock.try_acquire):
+            return False
+        # Webhook и getUpdates взаимоисключающие; необработанные обновления сохраняются
+        await self.telegram.call("deleteWebhook", {"drop_pending_updates": False})
+        self.offset = await asyncio.to_thread(self._load_offset)
+        logger.info(f"Telegram polling: this worker polls updates from offset {self.offset}")
+        return True
+
+    async def poll_once(self) -> int:
+        """
+        Один запрос getUpdates и передача результата в прием
+
+        Returns:
+            Количество полученных обновлений
+        """
+        payload: Dict[str, Any] = {
+            "limit": self.limit,
+            "timeout": self.timeout,
+            "allowed_updates": self.allowed_updates,
+        }
+        if self.offset is not None:
+            payload["offset"] = self.offset
+        updates = await self.telegram.call("getUpdates", payload, timeout=self.timeout + 10)
+        self.stats["polls"] += 1
+        if not updates:
+            return 0
+        await self.ingest.accept(updates)
+        self.offset = max(update["update_id"] for update in updates) + 1
+        self.stats["updates"] += len(updates)
+        return len(updates)
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._lock.held:
+                    if not await self._become_leader():
+                        await asyncio.sleep(self.leader_retry)
+                        continue
+                elif not await asyncio.to_thread(self._lock.check):
+                    continue
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except TelegramError as e:
+                self.stats["errors"] += 1
+                if e.error_code == 409:
+                    logger.error("Telegram polling conflict: webhook is set or another poller is running")
+                else:
+                    logger.error(f"Telegram polling error: {e}")
+                await asyncio.sleep(self.retry_delay)
+            except (httpx.HTTPError, ValueError) as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Telegram polling request failed: {e}")
+                await asyncio.sleep(self.retry_delay)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Telegram polling error: {e}", exc_info=True)
+                await asyncio.sleep(self.retry_delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"leader": self._lock.held, "offset": self.offset, **self.stats}
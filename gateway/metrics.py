@@ -0,0 +1,425 @@
+"""
+TaskFlow Gateway - метрики в формате Prometheus (/metrics)
+Гистограммы времени вызовов функций, запросов к базе и Telegram,
+задержка event loop; без внешних зависимостей
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин времени (секунды): от 1 мс до 10 с
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Границы корзин размера тела (байты): от 128 Б до 4 МБ
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Общая часть метрик
+
+    collect() возвращает состояние {значения меток: значение}, из которого
+    строится текстовый формат; состояния разных процессов складываются.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def collect(self) -> Dict[Labels, Any]:
+        raise NotImplementedError
+
+    def merge(self, total: Dict[Labels, Any], state: Dict[Labels, Any]):
+        for labels, value in state.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, state: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(state.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> Dict[Labels, Any]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Metric):
+    """
+    Текущее значение
+
+    Значение задается через set() или вычисляется функцией source при
+    каждом сборе - тогда на горячем пути ничего не записывается.
+    Между процессами значения складываются (aggregate="sum") или
+    берется наибольшее (aggregate="max").
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 source: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None,
+                 aggregate: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.source = source
+        self.aggregate = aggregate
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def collect(self) -> Dict[Labels, Any]:
+        if self.source is not None:
+            return {tuple(labels): value for labels, value in self.source()}
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, total: Dict[Labels, Any], state: Dict[Labels, Any]):
+        if self.aggregate != "max":
+            return super().merge(total, state)
+        for labels, value in state.items():
+            total[labels] = max(total.get(labels, value), value)
+
+
+class HistogramChild:
+    """Гистограмма с конкретными значениями меток"""
+    __slots__ = ("_buckets", "_lock", "counts", "total")
+
+    def __init__(self, buckets: Sequence[float], lock: threading.Lock):
+        self._buckets = buckets
+        self._lock = lock
+        # Последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+
+
+class Histogram(Metric):
+    """
+    Распределение значений по корзинам
+
+    Наблюдение - поиск корзины и два сложения под блокировкой метрики;
+    labels() кэширует дочерние гистограммы, их удобно держать в переменной.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Labels, HistogramChild] = {}
+
+    def labels(self, *labels: str) -> HistogramChild:
+        child = self._children.get(labels)
+        if child is None:
+            with self._lock:
+                child = self._children.get(labels)
+                if child is None:
+                    child = self._children[labels] = HistogramChild(self.buckets, self._lock)
+        return child
+
+    def observe(self, value: float, *labels: str):
+        self.labels(*labels).observe(value)
+
+    def collect(self) -> Dict[Labels, Any]:
+        with self._lock:
+            return {
+                labels: child.counts + [child.total]
+                for labels, child in self._children.items()
+            }
+
+    def merge(self, total: Dict[Labels, Any], state: Dict[Labels, Any]):
+        for labels, value in state.items():
+            current = total.get(labels)
+            total[labels] = list(value) if current is None else [
+                a + b for a, b in zip(current, value)
+            ]
+
+    def render(self, state: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, value in sorted(state.items()):
+            *counts, total = value
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            suffix = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Набор метрик gateway
+
+    Каждый uvicorn worker считает метрики в своем процессе. Если задан
+    каталог directory, состояние процесса периодически сохраняется в
+    <pid>.json, а /metrics складывает файлы всех workers - иначе запрос
+    видел бы счетчики только того worker, которому достался. Счетчики
+    завершившихся процессов сохраняются, их текущие значения (gauge) - нет.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self.directory: Optional[str] = None
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              source: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None,
+              aggregate: str = "sum") -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, source, aggregate))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = TIME_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self) -> Dict[str, Dict[Labels, Any]]:
+        states = {}
+        for name, metric in self._metrics.items():
+            try:
+                states[name] = metric.collect()
+            except Exception as e:
+                logger.warning(f"Failed to collect metric {name}: {e}")
+        return states
+
+    # ---------- несколько процессов ----------
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self):
+        """Сохраняет состояние процесса в каталог метрик"""
+        if self.directory is None:
+            return
+        data = {
+            name: [[list(labels), value] for labels, value in state.items()]
+            for name, state in self.collect().items()
+        }
+        path = self._path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _load(self) -> Iterable[Tuple[bool, Dict[str, Dict[Labels, Any]]]]:
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            pid = int(filename[:-5]) if filename[:-5].isdigit() else None
+            if pid is None or pid == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            yield _alive(pid), {
+                name: {tuple(labels): value for labels, value in series}
+                for name, series in data.items()
+            }
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        totals = self.collect()
+        if self.directory is not None:
+            for alive, states in self._load():
+                for name, state in states.items():
+                    metric = self._metrics.get(name)
+                    if metric is None or (metric.kind == "gauge" and not alive):
+                        continue
+                    metric.merge(totals.setdefault(name, {}), state)
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(totals.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = MetricsRegistry()
+
+FUNCTION_DURATION = REGISTRY.histogram(
+    "taskflow_function_duration_seconds",
+    "Time to serve /api/{function} requests, including queue wait",
+    ("function", "status"),
+)
+FUNCTION_QUEUE_WAIT = REGISTRY.histogram(
+    "taskflow_function_queue_wait_seconds",
+    "Time from request arrival to handler start",
+    ("function",),
+)
+REQUEST_SIZE = REGISTRY.histogram(
+    "taskflow_request_size_bytes",
+    "Request body size",
+    ("function",),
+    SIZE_BUCKETS,
+)
+RESPONSE_SIZE = REGISTRY.histogram(
+    "taskflow_response_size_bytes",
+    "Response body size",
+    ("function",),
+    SIZE_BUCKETS,
+)
+DB_QUERY_DURATION = REGISTRY.histogram(
+    "taskflow_db_query_duration_seconds",
+    "Time of queries run through conn.execute()",
+    ("function",),
+)
+DB_POOL_WAIT = REGISTRY.histogram(
+    "taskflow_db_pool_wait_seconds",
+    "Time waiting for a pooled database connection",
+    ("function",),
+)
+TELEGRAM_REQUEST_DURATION = REGISTRY.histogram(
+    "taskflow_telegram_request_duration_seconds",
+    "Telegram Bot API call time",
+    ("method", "status"),
+)
+USER_CACHE_LOOKUPS = REGISTRY.counter(
+    "taskflow_user_cache_lookups_total",
+    "User lookups by result: hit, miss (loaded and cached) or bypass (cache not listening)",
+    ("lookup", "result"),
+)
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "taskflow_event_loop_lag_seconds",
+    "Delay of event loop timer callbacks",
+)
+
+
+class RuntimeMonitor:
+    """
+    Фоновая часть метрик
+
+    Замеряет задержку event loop (насколько позже срабатывает таймер,
+    чем был запланирован) и сохраняет состояние процесса в каталог метрик.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY,
+                 lag_interval: float = 0.5, flush_interval: float = 5.0):
+        self.registry = registry
+        self.lag_interval = lag_interval
+        self.flush_interval = flush_interval
+        self.lag = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls) -> "RuntimeMonitor":
+        """
+        METRICS_DIR - общий каталог для сложения метрик всех workers
+        METRICS_FLUSH_INTERVAL - период сохранения в METRICS_DIR (секунды)
+        METRICS_LOOP_INTERVAL - период замера задержки event loop (секунды)
+        """
+        directory = os.environ.get("METRICS_DIR")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            REGISTRY.directory = directory
+        return cls(
+            REGISTRY,
+            lag_interval=float(os.environ.get("METRICS_LOOP_INTERVAL", 0.5)),
+            flush_interval=float(os.environ.get("METRICS_FLUSH_INTERVAL", 5)),
+        )
+
+    def start(self):
+        self._tasks.append(asyncio.create_task(self._measure_lag(), name="metrics-loop-lag"))
+        if self.registry.directory is not None:
+            self._tasks.append(asyncio.create_task(self._flush(), name="metrics-flush"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        try:
+            self.registry.flush()
+        except OSError as e:
+            logger.warning(f"Failed to save metrics: {e}")
+
+    async def _measure_lag(self):
+        loop = asyncio.get_running_loop()
+        observe = EVENT_LOOP_LAG.labels().observe
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.lag = max(0.0, loop.time() - started - self.lag_interval)
+            observe(self.lag)
+
+    async def _flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.registry.flush)
+            except OSError as e:
+                logger.warning(f"Failed to save metrics: {e}")
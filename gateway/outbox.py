@@ -0,0 +1,263 @@
+"""
+TaskFlow Gateway - outbox уведомлений Telegram
+Handlers ставят сообщения в таблицу notification_outbox в своей транзакции,
+фоновый worker доставляет их пачками с повторами и dead-letter
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from psycopg2.extras import execute_values
+
+from gateway.db import DatabasePool
+from gateway.telegram import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+# Ошибки Telegram, при которых повтор бессмысленен (бот заблокирован, чат не найден)
+PERMANENT_ERROR_CODES = {400, 403}
+
+CLAIM_SQL = """
+    WITH batch AS (
+        SELECT id FROM notification_outbox
+        WHERE status IN ('pending', 'sending') AND next_attempt_at <= CURRENT_TIMESTAMP
+        ORDER BY next_attempt_at, id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE notification_outbox o
+    SET status = 'sending',
+        attempts = o.attempts + 1,
+        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+    FROM batch
+    WHERE o.id = batch.id
+    RETURNING o.id, o.chat_id, o.text, o.reply_markup, o.attempts
+"""
+
+
+def enqueue(conn, messages: Sequence[Dict[str, Any]], task_id: Optional[int] = None) -> int:
+    """
+    Ставит сообщения в outbox в текущей транзакции подключения
+
+    Args:
+        conn: подключение handler (из context.db.connection())
+        messages: список {"chat_id", "text", "reply_markup"?}
+        task_id: задача, к которой относятся уведомления
+
+    Returns:
+        Количество поставленных сообщений
+    """
+    if not messages:
+        return 0
+    rows = [
+        (
+            task_id,
+            message["chat_id"],
+            message["text"],
+            json.dumps(message["reply_markup"]) if message.get("reply_markup") else None,
+        )
+        for message in messages
+    ]
+    with conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            "INSERT INTO notification_outbox (task_id, chat_id, text, reply_markup) VALUES %s",
+            rows
+        )
+    return len(rows)
+
+
+class OutboxWriter:
+    """Доступ к outbox для handlers (context.outbox)"""
+
+    def enqueue(self, conn, messages: Sequence[Dict[str, Any]],
+                task_id: Optional[int] = None) -> int:
+        return enqueue(conn, messages, task_id)
+
+
+class OutboxWorker:
+    """
+    Фоновая доставка сообщений из notification_outbox
+
+    Пачка забирается через FOR UPDATE SKIP LOCKED и помечается как sending
+    с арендой на OUTBOX_LEASE секунд, поэтому несколько uvicorn workers
+    (и несколько контейнеров) разбирают очередь без дублей. Пока пачка
+    отправляется, аренда продлевается: сообщения в один чат идут не чаще
+    TELEGRAM_CHAT_INTERVAL, и пачка может отправляться дольше аренды. Если
+    процесс упал во время отправки, по истечении аренды сообщение уйдет повторно.
+    """
+
+    def __init__(self, pool: DatabasePool, telegram: TelegramClient,
+                 batch_size: int = 50, poll_interval: float = 1.0,
+                 lease: float = 60.0, max_attempts: int = 8,
+                 retry_base: float = 5.0, retry_max: float = 3600.0,
+                 retention_days: int = 7):
+        self.pool = pool
+        self.telegram = telegram
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"sent": 0, "retried": 0, "dead": 0, "batches": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool, telegram: TelegramClient) -> "OutboxWorker":
+        """
+        OUTBOX_BATCH_SIZE - сообщений за одну выборку
+        OUTBOX_POLL_INTERVAL - пауза между опросами пустой очереди (секунды)
+        OUTBOX_LEASE - аренда пачки (секунды), продлевается, пока пачка отправляется
+        OUTBOX_MAX_ATTEMPTS - попыток до переноса в dead
+        OUTBOX_RETRY_BASE - первая задержка повтора, дальше удваивается (секунды)
+        OUTBOX_RETENTION_DAYS - сколько дней хранить доставленные сообщения
+        """
+        return cls(
+            pool,
+            telegram,
+            batch_size=int(os.environ.get("OUTBOX_BATCH_SIZE", 50)),
+            poll_interval=float(os.environ.get("OUTBOX_POLL_INTERVAL", 1)),
+            lease=float(os.environ.get("OUTBOX_LEASE", 60)),
+            max_attempts=int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8)),
+            retry_base=float(os.environ.get("OUTBOX_RETRY_BASE", 5)),
+            retention_days=int(os.environ.get("OUTBOX_RETENTION_DAYS", 7)),
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="outbox-worker")
+        logger.info("Outbox worker started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def retry_delay(self, attempts: int) -> float:
+        """Экспоненциальная задержка: retry_base * 2^(attempts - 1), не больше retry_max"""
+        return min(self.retry_base * (2 ** max(attempts - 1, 0)), self.retry_max)
+
+    async def _run(self):
+        cleanup_every = 3600.0
+        loop = asyncio.get_running_loop()
+        next_cleanup = loop.time()
+        while True:
+            try:
+                delivered = await self.process_batch()
+                if loop.time() >= next_cleanup:
+                    await asyncio.to_thread(self._cleanup)
+                    next_cleanup = loop.time() + cleanup_every
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker error: {e}", exc_info=True)
+                delivered = 0
+            # Полная пачка - в очереди, скорее всего, есть еще сообщения
+            if delivered < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def process_batch(self) -> int:
+        """
+        Забирает и отправляет одну пачку
+
+        Returns:
+            Количество сообщений в пачке
+        """
+        rows = await asyncio.to_thread(self._claim)
+        if not rows:
+            return 0
+        self.stats["batches"] += 1
+        renewal = asyncio.create_task(self._renew_lease([row[0] for row in rows]))
+        try:
+            results = await self.telegram.send_many([
+                {"chat_id": chat_id, "text": text, "reply_markup": reply_markup}
+                for _, chat_id, text, reply_markup, _ in rows
+            ])
+        finally:
+            renewal.cancel()
+        await asyncio.to_thread(self._complete, rows, results)
+        return len(rows)
+
+    async def _renew_lease(self, outbox_ids: List[int]):
+        """Продлевает аренду пачки каждую треть срока, пока идет отправка"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self._extend, outbox_ids)
+            except Exception as e:
+                logger.warning(f"Outbox: failed to renew lease: {e}")
+
+    def _extend(self, outbox_ids: List[int]):
+        with self.pool.connection("outbox") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE notification_outbox "
+                    "SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s) "
+                    "WHERE id = ANY(%s) AND status = 'sending'",
+                    (self.lease, outbox_ids)
+                )
+
+    def _claim(self) -> List[tuple]:
+        with self.pool.connection("outbox") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(CLAIM_SQL, (self.batch_size, self.lease))
+                return cursor.fetchall()
+
+    def _complete(self, rows: List[tuple], results: List[Dict[str, Any]]):
+        sent: List[int] = []
+        failed: List[tuple] = []
+        for (outbox_id, _, _, _, attempts), result in zip(rows, results):
+            if result["ok"]:
+                sent.append(outbox_id)
+                continue
+            permanent = result.get("error_code") in PERMANENT_ERROR_CODES
+            if permanent or attempts >= self.max_attempts:
+                failed.append((outbox_id, "dead", 0.0, result.get("error")))
+                self.stats["dead"] += 1
+            else:
+                failed.append((outbox_id, "pending", self.retry_delay(attempts), result.get("error")))
+                self.stats["retried"] += 1
+        self.stats["sent"] += len(sent)
+
+        with self.pool.connection("outbox") as conn:
+            with conn.cursor() as cursor:
+                if sent:
+                    cursor.execute(
+                        "UPDATE notification_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, "
+                        "last_error = NULL WHERE id = ANY(%s)",
+                        (sent,)
+                    )
+                if failed:
+                    execute_values(
+                        cursor,
+                        "UPDATE notification_outbox o SET status = v.status, "
+                        "next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => v.delay), "
+                        "last_error = v.error "
+                        "FROM (VALUES %s) AS v(id, status, delay, error) WHERE o.id = v.id",
+                        failed,
+                        template="(%s::bigint, %s, %s::float8, %s)"
+                    )
+        if failed:
+            logger.warning(f"Outbox: {len(failed)} messages not delivered")
+
+    def _cleanup(self):
+        with self.pool.connection("outbox") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM notification_outbox WHERE status = 'sent' "
+                    "AND sent_at < CURRENT_TIMESTAMP - make_interval(days => %s)",
+                    (self.retention_days,)
+                )
+                if cursor.rowcount:
+                    logger.info(f"Outbox: removed {cursor.rowcount} delivered messages")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats)
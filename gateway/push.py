@@ -0,0 +1,291 @@
+"""
+TaskFlow Gateway - push изменений задач клиентам (Server-Sent Events)
+Каждый uvicorn worker слушает канал PostgreSQL task_changes и рассылает
+события своим подключенным клиентам вместо опроса sync-task
+"""
+
+import asyncio
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from gateway.db import DatabasePool
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "task_changes"
+
+TASK_SELECT = """
+    SELECT t.id, t.title, t.completed, t.priority, t.urgent, t.deadline,
+           t.created_by, t.created_at, t.change_seq,
+           COALESCE(array_agg(u.name ORDER BY ta.id) FILTER (WHERE u.name IS NOT NULL), '{}')
+    FROM tasks t
+    LEFT JOIN task_assignments ta ON ta.task_id = t.id
+    LEFT JOIN users u ON u.id = ta.user_id
+"""
+
+TASKS_BY_ID_SQL = TASK_SELECT + " WHERE t.id = ANY(%s) GROUP BY t.id"
+
+REPLAY_TASKS_SQL = TASK_SELECT + """
+    WHERE t.change_seq > %s
+    GROUP BY t.id
+    ORDER BY t.change_seq
+    LIMIT %s
+"""
+
+REPLAY_DELETED_SQL = """
+    SELECT task_id, change_seq FROM task_tombstones
+    WHERE change_seq > %s
+    ORDER BY change_seq
+    LIMIT %s
+"""
+
+# Номер, ниже которого новых изменений уже не появится (V0015). id событий
+# не превышает его: изменение долгой транзакции фиксируется позже изменений
+# с большими номерами, и Last-Event-ID = номер события пропустил бы его
+HORIZON_SQL = "SELECT task_change_horizon()"
+
+
+def task_to_dict(row: tuple) -> Dict[str, Any]:
+    """Задача в формате frontend (interface Task в src/pages/Index.tsx)"""
+    (task_id, title, completed, priority, urgent, deadline,
+     created_by, created_at, _, assigned_to) = row
+    return {
+        "id": task_id,
+        "title": title,
+        "completed": bool(completed),
+        "assignedTo": list(assigned_to),
+        "priority": priority,
+        "urgent": bool(urgent),
+        "deadline": deadline.isoformat() if isinstance(deadline, date) else deadline,
+        "createdBy": created_by,
+        "createdAt": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+    }
+
+
+def format_sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Одно событие в формате text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscriber:
+    """Очередь событий одного SSE клиента"""
+
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+
+class TaskEventHub:
+    """
+    Рассылка изменений задач подключенным клиентам worker
+
+    Одно подключение LISTEN на worker независимо от числа клиентов.
+    Уведомления, пришедшие вместе, обрабатываются пачкой: задачи читаются
+    одним запросом и раздаются всем подписчикам. Клиент, не успевающий
+    читать события, отключается - браузер переподключится с Last-Event-ID
+    и получит пропущенное из replay().
+    """
+
+    def __init__(self, pool: DatabasePool, queue_size: int = 1000,
+                 replay_limit: int = 1000, reconnect_delay: float = 5.0):
+        self.pool = pool
+        self.queue_size = queue_size
+        self.replay_limit = replay_limit
+        self.reconnect_delay = reconnect_delay
+        self._subscribers: Set[Subscriber] = set()
+        self._conn = None
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"notifications": 0, "events": 0, "dropped_clients": 0, "reconnects": 0}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="task-event-hub")
+        logger.info("Task event hub started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self._subscribers):
+            self._close(subscriber)
+
+    # ---------- подписчики ----------
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def _close(self, subscriber: Subscriber, last: Optional[Dict[str, Any]] = None):
+        self._subscribers.discard(subscriber)
+        # None в очереди - сигнал завершить поток; last - событие перед ним
+        # вместо недоставленных
+        if last is not None:
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(last)
+        while True:
+            try:
+                subscriber.queue.put_nowait(None)
+                return
+            except asyncio.QueueFull:
+                subscriber.queue.get_nowait()
+
+    def broadcast(self, event: Dict[str, Any]):
+        self.stats["events"] += 1
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.stats["dropped_clients"] += 1
+                self._close(subscriber)
+
+    # ---------- LISTEN ----------
+
+    def _listen(self):
+        conn = psycopg2.connect(self.pool.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _on_readable(self, fileno: int):
+        try:
+            self._conn.poll()
+        except psycopg2.Error as e:
+            logger.warning(f"Task event listener connection lost: {e}")
+            # Сокет оборванного подключения остается читаемым - без снятия
+            # обработчика он вызывался бы снова до переподключения
+            asyncio.get_running_loop().remove_reader(fileno)
+            self._pending.append({"op": "reset"})
+            self._wakeup.set()
+            return
+        received = 0
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            received += 1
+            try:
+                self._pending.append(json.loads(notify.payload))
+            except ValueError:
+                continue
+        self.stats["notifications"] += received
+        if self._pending:
+            self._wakeup.set()
+
+    def _load(self, task_ids: List[int]) -> Tuple[Dict[int, Dict[str, Any]], int]:
+        """Задачи по id и граница видимых изменений"""
+        with self.pool.connection("task-events") as conn:
+            horizon = conn.execute(HORIZON_SQL).fetchone()[0]
+            rows = conn.execute(TASKS_BY_ID_SQL, (task_ids,)).fetchall() if task_ids else []
+        return {row[0]: task_to_dict(row) for row in rows}, horizon
+
+    async def _dispatch(self, batch: List[Dict[str, Any]]):
+        if any(item.get("op") == "reload" for item in batch):
+            # Загрузка задач пачкой (V0014) не рассылает события по задачам:
+            # клиенты получают "reset" и загружают задачи заново
+            _, horizon = await asyncio.to_thread(self._load, [])
+            for subscriber in list(self._subscribers):
+                self._close(subscriber, {"op": "reset", "cursor": horizon})
+            return
+        upserts = sorted({item["id"] for item in batch if item.get("op") == "upsert"})
+        tasks, horizon = await asyncio.to_thread(self._load, upserts)
+        # Несколько изменений одной задачи в пачке - одно событие с последним состоянием
+        latest: Dict[Any, Dict[str, Any]] = {}
+        for item in batch:
+            latest.pop(item.get("id"), None)
+            latest[item.get("id")] = item
+        for item in latest.values():
+            cursor = min(item.get("seq", horizon), horizon)
+            if item.get("op") == "delete":
+                self.broadcast({"op": "delete", "id": item["id"], "seq": item["seq"], "cursor": cursor})
+            elif item.get("op") == "upsert" and item["id"] in tasks:
+                self.broadcast({
+                    "op": "upsert", "task": tasks[item["id"]], "seq": item["seq"], "cursor": cursor
+                })
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._conn = await asyncio.to_thread(self._listen)
+            except Exception as e:
+                logger.error(f"Task event listener failed to connect: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            # После обрыва psycopg2 закрывает подключение и fileno() недоступен
+            fileno = self._conn.fileno()
+            loop.add_reader(fileno, self._on_readable, fileno)
+            try:
+                while True:
+                    await self._wakeup.wait()
+                    self._wakeup.clear()
+                    batch, self._pending = self._pending, []
+                    if any(item.get("op") == "reset" for item in batch):
+                        break
+                    try:
+                        await self._dispatch(batch)
+                    except Exception as e:
+                        logger.error(f"Task event dispatch failed: {e}", exc_info=True)
+            finally:
+                loop.remove_reader(fileno)
+                self._conn.close()
+                self._conn = None
+            # Пока подключения не было, события могли потеряться - клиенты
+            # переподключатся с Last-Event-ID и догрузят их из replay()
+            self.stats["reconnects"] += 1
+            for subscriber in list(self._subscribers):
+                self._close(subscriber)
+            await asyncio.sleep(self.reconnect_delay)
+
+    # ---------- догрузка ----------
+
+    def replay(self, since: int) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """
+        События после номера изменения since (заголовок Last-Event-ID)
+
+        Returns:
+            События по возрастанию seq или None, если пропущено больше
+            replay_limit изменений и клиенту нужно загрузить задачи заново,
+            и граница видимых изменений - следующий Last-Event-ID клиента
+        """
+        with self.pool.connection("task-events") as conn:
+            # Граница читается до изменений: все номера до нее уже видны.
+            # Last-Event-ID выше границы (от версии без V0015) - догрузка с границы
+            horizon = conn.execute(HORIZON_SQL).fetchone()[0]
+            since = min(since, horizon)
+            rows = conn.execute(REPLAY_TASKS_SQL, (since, self.replay_limit)).fetchall()
+            deleted = conn.execute(REPLAY_DELETED_SQL, (since, self.replay_limit)).fetchall()
+        if len(rows) >= self.replay_limit or len(deleted) >= self.replay_limit:
+            return None, horizon
+        events = [{"op": "upsert", "task": task_to_dict(row), "seq": row[8]} for row in rows]
+        events += [{"op": "delete", "id": task_id, "seq": seq} for task_id, seq in deleted]
+        events.sort(key=lambda event: event["seq"])
+        for event in events:
+            event["cursor"] = min(event["seq"], horizon)
+        return events, horizon
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "listening": self._conn is not None,
+            "clients": len(self._subscribers),
+            **self.stats,
+        }
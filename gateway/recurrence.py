@@ -0,0 +1,341 @@
+"""
+TaskFlow Gateway - повторяющиеся задачи
+Правила в формате cron хранятся в task_recurrences; фоновый worker создает
+очередную задачу, когда ее срабатывание попадает в горизонт планирования
+"""
+
+import asyncio
+import bisect
+import html
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from gateway.db import DatabasePool
+from gateway.outbox import enqueue
+from gateway.users import UserCache
+
+logger = logging.getLogger(__name__)
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 1",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+
+# (минимум, максимум) полей: минута, час, день месяца, месяц, день недели
+FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+# Дальше этого горизонта правило вида "30 февраля" считается несрабатывающим
+MAX_YEARS_AHEAD = 8
+
+
+def parse_field(expr: str, low: int, high: int) -> List[int]:
+    """
+    Разбирает одно поле cron: *, 5, 1-5, */15, 1-10/2, 1,15,30
+
+    Returns:
+        Отсортированный список допустимых значений
+    """
+    values = set()
+    for part in expr.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Invalid step in cron field: {expr}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field out of range {low}-{high}: {expr}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronRule:
+    """
+    Правило "минута час день_месяца месяц день_недели" (или @daily, @weekly, ...)
+
+    Следующее срабатывание ищется прыжками по полям (месяц, день, час, минута)
+    с bisect по допустимым значениям, а не перебором минут. Если ограничены
+    и день месяца, и день недели, подходит любой из них - как в cron.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron rule must have 5 fields: {expression}")
+        parsed = [parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 0 и 7 - воскресенье; в Python воскресенье - 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day: date) -> bool:
+        in_month = day.day in self.days
+        in_week = day.weekday() in self.weekdays
+        if self.any_day:
+            return in_week
+        if self.any_weekday:
+            return in_month
+        return in_month or in_week
+
+    def next_after(self, moment: datetime) -> Optional[datetime]:
+        """
+        Ближайшее срабатывание строго после moment
+
+        Returns:
+            Время срабатывания или None, если правило никогда не срабатывает
+        """
+        current = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment.year + MAX_YEARS_AHEAD
+        while current.year <= limit:
+            if current.month not in self.months:
+                index = bisect.bisect_left(self.months, current.month)
+                if index < len(self.months):
+                    current = datetime(current.year, self.months[index], 1)
+                else:
+                    current = datetime(current.year + 1, self.months[0], 1)
+                continue
+            if not self._day_matches(current.date()):
+                current = datetime.combine(current.date() + timedelta(days=1), datetime.min.time())
+                continue
+            index = bisect.bisect_left(self.hours, current.hour)
+            if index == len(self.hours):
+                current = datetime.combine(current.date() + timedelta(days=1), datetime.min.time())
+                continue
+            if self.hours[index] != current.hour:
+                current = current.replace(hour=self.hours[index], minute=0)
+            index = bisect.bisect_left(self.minutes, current.minute)
+            if index == len(self.minutes):
+                current = current.replace(minute=0) + timedelta(hours=1)
+                continue
+            return current.replace(minute=self.minutes[index])
+        return None
+
+
+CLAIM_SQL = """
+    SELECT id, title, priority, urgent, created_by, assignee_emails,
+           rule, deadline_offset_days, next_run_at
+    FROM task_recurrences
+    WHERE active = TRUE AND next_run_at <= %s
+    ORDER BY next_run_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+RECIPIENTS_SQL = """
+    SELECT email, telegram_chat_id FROM users
+    WHERE email = ANY(%s) AND telegram_chat_id IS NOT NULL
+"""
+
+
+def format_instance(title: str, deadline: date, urgent: bool, created_by: Optional[str]) -> str:
+    """Текст уведомления о новом экземпляре - как у notify-task"""
+    urgent_emoji = "🔥 " if urgent else ""
+    return (
+        f"{urgent_emoji}<b>Новая задача для выполнения</b> 🔁\n\n"
+        f"📋 <b>Название:</b> {html.escape(title)}\n"
+        f"📅 <b>Срок:</b> {deadline.isoformat()}\n"
+        f"📊 <b>Статус:</b> В работе\n"
+        f"👤 <b>От кого:</b> {html.escape(created_by or '')}\n"
+    )
+
+
+class RecurrenceWorker:
+    """
+    Создание экземпляров повторяющихся задач
+
+    Очередь срабатываний - частичный индекс по next_run_at, поэтому выборка
+    ближайших правил стоит O(log n) независимо от их числа. Правила забираются
+    через FOR UPDATE SKIP LOCKED, и задача, ее исполнители, уведомления
+    в outbox и новый next_run_at записываются одной транзакцией - несколько
+    uvicorn workers не создадут дубль. Экземпляр создается за horizon до
+    срабатывания; пропущенные за время простоя срабатывания сворачиваются
+    в одну задачу.
+    """
+
+    def __init__(self, pool: DatabasePool, horizon: timedelta = timedelta(hours=24),
+                 batch_size: int = 100, poll_interval: float = 30.0,
+                 timezone: Optional[str] = None, users: Optional[UserCache] = None):
+        self.pool = pool
+        self.users = users
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.tz = None
+        if timezone:
+            from zoneinfo import ZoneInfo
+            self.tz = ZoneInfo(timezone)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"created": 0, "messages": 0, "disabled": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool, users: Optional[UserCache] = None) -> "RecurrenceWorker":
+        """
+        RECURRENCE_HORIZON_HOURS - за сколько часов до срабатывания создавать задачу
+        RECURRENCE_BATCH_SIZE - правил за одну выборку
+        RECURRENCE_POLL_INTERVAL - наибольшая пауза между проверками (секунды)
+        REMINDER_TIMEZONE - часовой пояс правил (общий с напоминаниями о сроках)
+        """
+        return cls(
+            pool,
+            horizon=timedelta(hours=float(os.environ.get("RECURRENCE_HORIZON_HOURS", 24))),
+            batch_size=int(os.environ.get("RECURRENCE_BATCH_SIZE", 100)),
+            poll_interval=float(os.environ.get("RECURRENCE_POLL_INTERVAL", 30)),
+            timezone=os.environ.get("REMINDER_TIMEZONE") or None,
+            users=users,
+        )
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz).replace(tzinfo=None)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="recurring-tasks")
+        logger.info("Recurring tasks worker started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def create_rule(self, conn, title: str, rule: str, assignee_emails: Sequence[str],
+                    priority: str = "medium", urgent: bool = False,
+                    created_by: Optional[str] = None, deadline_offset_days: int = 0) -> Dict[str, Any]:
+        """
+        Сохраняет правило в текущей транзакции подключения
+
+        Raises:
+            ValueError: правило не разбирается или никогда не срабатывает
+        """
+        next_run_at = CronRule(rule).next_after(self.now())
+        if next_run_at is None:
+            raise ValueError(f"Cron rule never fires: {rule}")
+        cursor = conn.execute(
+            "INSERT INTO task_recurrences (title, priority, urgent, created_by, assignee_emails, "
+            "rule, deadline_offset_days, next_run_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+            "RETURNING id",
+            (title, priority, urgent, created_by, list(assignee_emails), rule,
+             deadline_offset_days, next_run_at)
+        )
+        return {"id": cursor.fetchone()[0], "next_run_at": next_run_at.isoformat()}
+
+    def process_due(self) -> int:
+        """
+        Создает задачи для правил, срабатывающих в пределах горизонта
+
+        Returns:
+            Количество обработанных правил
+        """
+        now = self.now()
+        with self.pool.connection("recurrence") as conn:
+            rows = conn.execute(CLAIM_SQL, (now + self.horizon, self.batch_size)).fetchall()
+            if not rows:
+                return 0
+            emails = sorted({email for row in rows for email in row[5]})
+            chat_ids: Dict[str, Any] = {}
+            if emails and self.users is not None:
+                chat_ids = {
+                    email: user["telegram_chat_id"]
+                    for email, user in self.users.get_many("email", emails, conn).items()
+                    if user["telegram_chat_id"] is not None
+                }
+            elif emails:
+                chat_ids = dict(conn.execute(RECIPIENTS_SQL, (emails,)).fetchall())
+
+            updates: List[Tuple[Optional[datetime], bool, int]] = []
+            for (rule_id, title, priority, urgent, created_by, assignees,
+                 rule, offset, run_at) in rows:
+                self._materialize(conn, rule_id, title, priority, urgent, created_by,
+                                  assignees, offset, run_at, chat_ids)
+                # Пропущенные за время простоя срабатывания не создаются задним числом
+                try:
+                    next_run_at = CronRule(rule).next_after(max(run_at, now))
+                except ValueError:
+                    next_run_at = None
+                if next_run_at is None:
+                    self.stats["disabled"] += 1
+                updates.append((next_run_at, next_run_at is not None, rule_id))
+
+            with conn.cursor() as cursor:
+                cursor.executemany(
+                    "UPDATE task_recurrences SET next_run_at = COALESCE(%s, next_run_at), "
+                    "active = %s, last_run_at = CURRENT_TIMESTAMP WHERE id = %s",
+                    updates
+                )
+        return len(rows)
+
+    def _materialize(self, conn, rule_id: int, title: str, priority: str, urgent: bool,
+                     created_by: Optional[str], assignees: List[str], offset: int,
+                     run_at: datetime, chat_ids: Dict[str, Any]):
+        deadline = run_at.date() + timedelta(days=offset)
+        row = conn.execute(
+            "INSERT INTO tasks (title, priority, urgent, deadline, created_by, "
+            "recurrence_id, recurrence_at) VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (recurrence_id, recurrence_at) DO NOTHING RETURNING id",
+            (title, priority, urgent, deadline, created_by, rule_id, run_at)
+        ).fetchone()
+        if row is None:
+            return
+        task_id = row[0]
+        self.stats["created"] += 1
+        if not assignees:
+            return
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO task_assignments (task_id, user_email) "
+                "SELECT %s, email FROM unnest(%s::text[]) AS email",
+                (task_id, assignees)
+            )
+        text = format_instance(title, deadline, urgent, created_by)
+        markup = {"inline_keyboard": [[
+            {"text": "✅ Отметить выполненной", "callback_data": f"complete_{task_id}"}
+        ]]}
+        messages = [
+            {"chat_id": chat_id, "text": text, "reply_markup": markup}
+            for chat_id in dict.fromkeys(chat_ids[email] for email in assignees if email in chat_ids)
+        ]
+        self.stats["messages"] += enqueue(conn, messages, task_id)
+
+    def _seconds_until_next(self) -> float:
+        with self.pool.connection("recurrence") as conn:
+            (next_run_at,) = conn.execute(
+                "SELECT MIN(next_run_at) FROM task_recurrences WHERE active = TRUE"
+            ).fetchone()
+        if next_run_at is None:
+            return self.poll_interval
+        wait = (next_run_at - self.horizon - self.now()).total_seconds()
+        # Новые правила появляются в любой момент - спим не дольше poll_interval
+        return max(0.0, min(self.poll_interval, wait))
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await asyncio.to_thread(self.process_due)
+                # Пока находятся правила в горизонте, выбираем их без паузы
+                delay = 0.0 if processed else await asyncio.to_thread(self._seconds_until_next)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Recurring tasks worker error: {e}", exc_info=True)
+                delay = self.poll_interval
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats)
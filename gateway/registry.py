@@ -0,0 +1,130 @@
+"""
+TaskFlow Gateway - реестр backend функций
+Находит функции в папке backend и загружает их модули по первому вызову
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Пакет-префикс для модулей функций в sys.modules
+MODULE_PREFIX = "taskflow_functions"
+
+
+def module_name_for(function_name: str) -> str:
+    """
+    Имя модуля функции в sys.modules
+
+    Args:
+        function_name: имя функции (telegram-bot, notify-task и т.д.)
+
+    Returns:
+        Уникальное имя модуля, например taskflow_functions.telegram_bot
+    """
+    return f"{MODULE_PREFIX}.{function_name.replace('-', '_')}"
+
+
+class FunctionRegistry:
+    """
+    Реестр функций вида <root>/<function>/index.py
+
+    Список функций строится по содержимому папки, модуль функции
+    импортируется только при первом обращении к handler. Неизвестное имя
+    пересканирует папку не чаще rescan_interval секунд: запросы к
+    несуществующим функциям не превращаются в сканирование на каждый запрос.
+    """
+
+    def __init__(self, root: str, rescan_interval: float = 5.0):
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self._scanned_at = float("-inf")
+        self._paths: Dict[str, str] = {}
+        self._handlers: Dict[str, Callable] = {}
+        self._lock = threading.Lock()
+
+    def discover(self) -> List[str]:
+        """
+        Пересканирует папку с функциями
+
+        Returns:
+            Отсортированный список имен функций
+        """
+        self._scanned_at = time.monotonic()
+        paths: Dict[str, str] = {}
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            logger.error(f"Functions directory not found: {self.root}")
+            entries = []
+        for entry in entries:
+            module_path = os.path.join(self.root, entry, "index.py")
+            if not entry.startswith((".", "_")) and os.path.isfile(module_path):
+                paths[entry] = module_path
+        self._paths = paths
+        return self.names
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self._paths)
+
+    def __contains__(self, function_name: str) -> bool:
+        return function_name in self._paths
+
+    async def find(self, function_name: str) -> bool:
+        """
+        Есть ли функция; неизвестное имя пересканирует папку вне event loop
+
+        Функция могла появиться после старта (volume с backend), но
+        не раньше чем через rescan_interval после прошлого сканирования.
+        """
+        if function_name in self._paths:
+            return True
+        if time.monotonic() - self._scanned_at < self.rescan_interval:
+            return False
+        await asyncio.to_thread(self.discover)
+        return function_name in self._paths
+
+    def loaded_handler(self, function_name: str) -> Optional[Callable]:
+        """Возвращает handler, если модуль уже загружен"""
+        return self._handlers.get(function_name)
+
+    def load(self, function_name: str) -> Callable:
+        """
+        Загружает handler функцию из backend модуля
+
+        Args:
+            function_name: имя функции (telegram-bot, notify-task и т.д.)
+
+        Returns:
+            Функция handler из модуля
+        """
+        with self._lock:
+            handler = self._handlers.get(function_name)
+            if handler is not None:
+                return handler
+
+            module_path = self._paths.get(function_name)
+            if module_path is None:
+                logger.error(f"Module not found: {function_name}")
+                raise FileNotFoundError(f"Module {function_name} not found")
+
+            module_name = module_name_for(function_name)
+            spec = importlib.util.spec_from_file_location(module_name, module_path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[module_name]
+                raise
+
+            handler = self._handlers[function_name] = module.handler
+            logger.info(f"Loaded function handler: {function_name} ({module_name})")
+            return handler
@@ -0,0 +1,364 @@
+"""
+TaskFlow Gateway - напоминания о сроках задач
+Планировщик держит в памяти кучу ближайших напоминаний "скоро срок"
+и "просрочено" и ставит их в notification_outbox в момент срабатывания
+"""
+
+import asyncio
+import heapq
+import html
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from gateway.db import AdvisoryLock, DatabasePool
+from gateway.outbox import enqueue
+
+logger = logging.getLogger(__name__)
+
+DUE_SOON = "due_soon"
+OVERDUE = "overdue"
+
+# Один лидер на все uvicorn workers и контейнеры с общей базой
+LOCK_NAME = "taskflow-deadline-reminders"
+
+WINDOW_SQL = """
+    SELECT id, deadline FROM tasks
+    WHERE completed = FALSE AND deadline IS NOT NULL
+      AND deadline < %s AND (deadline, id) > (%s, %s)
+    ORDER BY deadline, id
+    LIMIT %s
+"""
+
+# Только до границы видимых изменений (V0015): номер выдается при записи,
+# и долгая транзакция с меньшим номером может зафиксироваться после курсора
+CHANGES_SQL = """
+    SELECT id, deadline, completed, change_seq FROM tasks
+    WHERE change_seq > %s AND change_seq <= %s
+    ORDER BY change_seq
+    LIMIT %s
+"""
+
+HORIZON_SQL = "SELECT task_change_horizon()"
+
+FIRE_SQL = """
+    INSERT INTO task_reminders (task_id, kind, deadline)
+    SELECT t.id, v.kind, t.deadline
+    FROM (VALUES %s) AS v(task_id, kind, deadline)
+    JOIN tasks t ON t.id = v.task_id AND t.deadline = v.deadline AND t.completed = FALSE
+    ON CONFLICT DO NOTHING
+    RETURNING task_id, kind
+"""
+
+RECIPIENTS_SQL = """
+    SELECT t.id, t.title, t.deadline, t.urgent, u.telegram_chat_id
+    FROM tasks t
+    JOIN task_assignments ta ON ta.task_id = t.id
+    JOIN users u ON u.id = ta.user_id
+    WHERE t.id = ANY(%s) AND u.telegram_chat_id IS NOT NULL
+"""
+
+HEADERS = {
+    DUE_SOON: "⏰ <b>Скоро срок задачи</b>",
+    OVERDUE: "⚠️ <b>Задача просрочена</b>",
+}
+
+
+def format_reminder(kind: str, title: str, deadline: date, urgent: bool) -> str:
+    """Текст напоминания в формате уведомлений notify-task"""
+    urgent_emoji = "🔥 " if urgent else ""
+    return (
+        f"{urgent_emoji}{HEADERS[kind]}\n\n"
+        f"📋 <b>Название:</b> {html.escape(title)}\n"
+        f"📅 <b>Срок:</b> {deadline.isoformat()}\n"
+    )
+
+
+class ReminderScheduler:
+    """
+    Планировщик напоминаний о дедлайнах
+
+    Срок задачи - конец дня deadline. "Скоро срок" срабатывает за due_soon
+    до него, "просрочено" - в момент окончания. В память загружается только
+    окно ближайших horizon_days дней по индексу idx_tasks_open_deadline,
+    окно сдвигается по мере хода времени. Изменения задач читаются по
+    change_seq (V0002) до границы видимых изменений (V0015), поэтому правка срока или выполнение задачи не требует
+    пересканировать таблицу: устаревшие записи кучи отбрасываются при извлечении,
+    а при срабатывании условие еще раз проверяется в базе.
+
+    Напоминания рассылает только лидер, державший pg_try_advisory_lock;
+    таблица task_reminders защищает от повторной отправки при смене лидера.
+    """
+
+    def __init__(self, pool: DatabasePool, due_soon: timedelta = timedelta(hours=24),
+                 horizon_days: int = 2, catchup_days: int = 1,
+                 poll_interval: float = 5.0, leader_retry: float = 15.0,
+                 page_size: int = 1000, timezone: Optional[str] = None):
+        self.pool = pool
+        self.due_soon = due_soon
+        self.horizon_days = horizon_days
+        self.catchup_days = catchup_days
+        self.poll_interval = poll_interval
+        self.leader_retry = leader_retry
+        self.page_size = page_size
+        self.tz = None
+        if timezone:
+            from zoneinfo import ZoneInfo
+            self.tz = ZoneInfo(timezone)
+        self._task: Optional[asyncio.Task] = None
+        self._lock = AdvisoryLock(pool.dsn, LOCK_NAME)
+        self._reset()
+        self.stats = {"fired": 0, "skipped": 0, "messages": 0, "changes": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool) -> "ReminderScheduler":
+        """
+        REMINDER_DUE_SOON_HOURS - за сколько часов до конца дня срока напоминать
+        REMINDER_HORIZON_DAYS - на сколько дней вперед держать напоминания в памяти
+        REMINDER_CATCHUP_DAYS - за сколько прошедших дней досылать пропущенные
+        REMINDER_POLL_INTERVAL - период чтения изменений задач (секунды)
+        REMINDER_TIMEZONE - часовой пояс сроков (по умолчанию часовой пояс сервера)
+        """
+        return cls(
+            pool,
+            due_soon=timedelta(hours=float(os.environ.get("REMINDER_DUE_SOON_HOURS", 24))),
+            horizon_days=int(os.environ.get("REMINDER_HORIZON_DAYS", 2)),
+            catchup_days=int(os.environ.get("REMINDER_CATCHUP_DAYS", 1)),
+            poll_interval=float(os.environ.get("REMINDER_POLL_INTERVAL", 5)),
+            timezone=os.environ.get("REMINDER_TIMEZONE") or None,
+        )
+
+    def _reset(self):
+        self._heap: List[Tuple[datetime, int, str, date]] = []
+        # (task_id, kind) -> актуальный срок; запись кучи с другим сроком устарела
+        self._scheduled: Dict[Tuple[int, str], date] = {}
+        self._loaded_until: Optional[date] = None
+        self._last_seq = 0
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz).replace(tzinfo=None)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.held
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="deadline-reminders")
+        logger.info("Deadline reminder scheduler started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._release_leadership()
+
+    # ---------- лидерство ----------
+
+    def _check_leadership(self) -> bool:
+        if self._lock.check():
+            return True
+        self._reset()
+        return False
+
+    def _release_leadership(self):
+        self._lock.release()
+        self._reset()
+
+    # ---------- расписание ----------
+
+    def fire_times(self, deadline: date, now: datetime) -> List[Tuple[datetime, str]]:
+        """Моменты напоминаний для срока; "скоро срок" не шлется уже просроченным задачам"""
+        end = datetime.combine(deadline + timedelta(days=1), time.min)
+        times = [(end, OVERDUE)]
+        if now < end:
+            times.insert(0, (end - self.due_soon, DUE_SOON))
+        return times
+
+    def schedule(self, task_id: int, deadline: Optional[date], completed: bool = False,
+                 now: Optional[datetime] = None):
+        """Добавляет или заменяет напоминания задачи"""
+        now = now or self.now()
+        for kind in (DUE_SOON, OVERDUE):
+            self._scheduled.pop((task_id, kind), None)
+        if completed or deadline is None or self._loaded_until is None:
+            return
+        if deadline >= self._loaded_until:
+            # Задача попадет в кучу при сдвиге окна
+            return
+        if deadline < now.date() - timedelta(days=self.catchup_days):
+            return
+        for fire_at, kind in self.fire_times(deadline, now):
+            self._scheduled[(task_id, kind)] = deadline
+            heapq.heappush(self._heap, (fire_at, task_id, kind, deadline))
+        # Устаревших записей стало много - пересобираем кучу
+        if len(self._heap) > 2 * len(self._scheduled) + 1024:
+            self._heap = [
+                entry for entry in self._heap
+                if self._scheduled.get((entry[1], entry[2])) == entry[3]
+            ]
+            heapq.heapify(self._heap)
+
+    def _load_window(self, until: date, now: datetime):
+        """Загружает открытые задачи со сроком до until страницами по (deadline, id)"""
+        start = now.date() - timedelta(days=self.catchup_days)
+        previous = self._loaded_until
+        if previous is not None:
+            start = max(start, previous)
+        self._loaded_until = until
+        last = (start, 0)
+        loaded = 0
+        try:
+            while True:
+                with self.pool.connection("scheduler") as conn:
+                    rows = conn.execute(
+                        WINDOW_SQL, (until, last[0], last[1], self.page_size)
+                    ).fetchall()
+                for task_id, deadline in rows:
+                    self.schedule(task_id, deadline, now=now)
+                loaded += len(rows)
+                if len(rows) < self.page_size:
+                    break
+                last = (rows[-1][1], rows[-1][0])
+        except Exception:
+            # Окно догрузится на следующем шаге; повторные записи безвредны
+            self._loaded_until = previous
+            raise
+        logger.info(f"Deadline reminders: loaded {loaded} tasks due before {until}")
+
+    def _read_changes(self, now: datetime) -> int:
+        """Применяет изменения задач после последнего прочитанного change_seq"""
+        total = 0
+        with self.pool.connection("scheduler") as conn:
+            horizon = conn.execute(HORIZON_SQL).fetchone()[0]
+        while True:
+            with self.pool.connection("scheduler") as conn:
+                rows = conn.execute(
+                    CHANGES_SQL, (self._last_seq, horizon, self.page_size)
+                ).fetchall()
+            for task_id, deadline, completed, change_seq in rows:
+                self.schedule(task_id, deadline, completed, now=now)
+                self._last_seq = change_seq
+            total += len(rows)
+            if len(rows) < self.page_size:
+                break
+        # Номера до границы без строк - удаленные задачи и откаченные транзакции
+        self._last_seq = max(self._last_seq, horizon)
+        # Удаленные задачи не читаем: при срабатывании их уже нет в tasks
+        self.stats["changes"] += total
+        return total
+
+    def _due(self, now: datetime) -> List[Tuple[int, str, date]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, kind, deadline = heapq.heappop(self._heap)
+            if self._scheduled.get((task_id, kind)) == deadline:
+                del self._scheduled[(task_id, kind)]
+                due.append((task_id, kind, deadline))
+        return due
+
+    def _restore(self, due: List[Tuple[int, str, date]], now: datetime):
+        """Возвращает в кучу напоминания, которые не удалось поставить в outbox"""
+        for task_id, kind, deadline in due:
+            # Срок, измененный после извлечения, уже запланирован заново
+            if (task_id, kind) in self._scheduled:
+                continue
+            self._scheduled[(task_id, kind)] = deadline
+            heapq.heappush(self._heap, (now, task_id, kind, deadline))
+
+    def _fire(self, due: List[Tuple[int, str, date]]):
+        """Отмечает напоминания в task_reminders и ставит сообщения в outbox одной транзакцией"""
+        with self.pool.connection("scheduler") as conn:
+            with conn.cursor() as cursor:
+                fired = execute_values(
+                    cursor, FIRE_SQL, due,
+                    template="(%s::int, %s, %s::date)", fetch=True
+                )
+                self.stats["fired"] += len(fired)
+                self.stats["skipped"] += len(due) - len(fired)
+                if not fired:
+                    return
+                cursor.execute(RECIPIENTS_SQL, (list({task_id for task_id, _ in fired}),))
+                recipients: Dict[int, List[tuple]] = {}
+                for task_id, title, deadline, urgent, chat_id in cursor.fetchall():
+                    recipients.setdefault(task_id, []).append((title, deadline, urgent, chat_id))
+
+            for task_id, kind in fired:
+                messages: Dict[Any, Dict[str, Any]] = {}
+                for title, deadline, urgent, chat_id in recipients.get(task_id, []):
+                    messages[chat_id] = {
+                        "chat_id": chat_id,
+                        "text": format_reminder(kind, title, deadline, urgent),
+                        "reply_markup": {"inline_keyboard": [[
+                            {"text": "✅ Отметить выполненной", "callback_data": f"complete_{task_id}"}
+                        ]]},
+                    }
+                self.stats["messages"] += enqueue(conn, list(messages.values()), task_id)
+
+    def _become_leader(self) -> bool:
+        if not self._lock.try_acquire():
+            return False
+        now = self.now()
+        with self.pool.connection("scheduler") as conn:
+            # Курсор берется до загрузки окна: изменения во время загрузки прочитаются повторно
+            self._last_seq = conn.execute(HORIZON_SQL).fetchone()[0]
+        self._load_window(now.date() + timedelta(days=self.horizon_days + 1), now)
+        logger.info("Deadline reminders: this worker is the leader")
+        return True
+
+    def tick(self) -> float:
+        """
+        Один шаг лидера: сдвиг окна, изменения задач, срабатывания
+
+        Returns:
+            Сколько секунд можно спать до следующего шага
+        """
+        now = self.now()
+        until = now.date() + timedelta(days=self.horizon_days + 1)
+        if self._loaded_until is None or until > self._loaded_until:
+            self._load_window(until, now)
+        self._read_changes(now)
+        due = self._due(now)
+        if due:
+            try:
+                self._fire(due)
+            except Exception:
+                # Транзакция _fire откатилась целиком - напоминания сработают
+                # на следующем шаге, окно ниже _loaded_until их не перечитает
+                self._restore(due, now)
+                raise
+        if not self._heap:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, (self._heap[0][0] - self.now()).total_seconds()))
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.is_leader:
+                    if not await asyncio.to_thread(self._become_leader):
+                        await asyncio.sleep(self.leader_retry)
+                        continue
+                if not await asyncio.to_thread(self._check_leadership):
+                    continue
+                delay = await asyncio.to_thread(self.tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Deadline reminder scheduler error: {e}", exc_info=True)
+                delay = self.poll_interval
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "leader": self.is_leader,
+            "scheduled": len(self._scheduled),
+            "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            "change_seq": self._last_seq,
+            **self.stats,
+        }
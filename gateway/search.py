@@ -0,0 +1,223 @@
+"""
+TaskFlow Gateway - поиск задач по названию
+Полнотекстовый поиск по tasks.search_vector (миграция V0013) с ранжированием;
+если слова запроса не нашлись (опечатка), они исправляются на ближайшие
+по триграммам слова из словаря названий, и поиск повторяется
+"""
+
+import base64
+import html
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from gateway.push import task_to_dict
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_LENGTH = 200
+
+# Как в task_title_words() миграции V0013
+MIN_WORD_LENGTH = 3
+
+# По умолчанию ранжируются только самые новые совпадения (10 страниц): для
+# частого слова (десятки тысяч задач) ранг всех совпадений считается сотни
+# миллисекунд, а последние MAX_RANKED находятся обратным обходом первичного ключа.
+# Если совпадений больше, ответ приходит с "truncated": true; None - ранжировать все
+MAX_RANKED = 200
+
+FULLTEXT = "fulltext"
+FUZZY = "fuzzy"
+
+# Границы совпадений в ts_headline - chr(1) и chr(2), которых нет в названиях:
+# название экранируется целиком, и только потом они заменяются на <mark>
+_START, _STOP = "\x01", "\x02"
+
+_WORD = re.compile(r"\w+")
+
+# Исполнители и подсветка считаются только для задач страницы. Лишняя строка
+# hits показывает, что совпадений больше ranked; строка h есть и при пустой
+# странице (тогда столбцы задачи - NULL)
+PAGE_SQL = """
+    WITH hits AS (
+        SELECT t.id, t.title, t.completed, t.priority, t.urgent, t.deadline,
+               t.created_by, t.created_at, t.change_seq, t.search_vector
+        FROM tasks t
+        WHERE t.search_vector @@ to_tsquery('russian', %(query)s)
+        ORDER BY t.id DESC
+        LIMIT %(ranked)s + 1
+    ),
+    matches AS (
+        SELECT * FROM hits ORDER BY id DESC LIMIT %(ranked)s
+    ),
+    page AS (
+        SELECT * FROM (
+            SELECT m.*, ts_rank_cd(m.search_vector, to_tsquery('russian', %(query)s))::float8 AS rank
+            FROM matches m
+        ) r
+        WHERE {after}
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s
+    )
+    SELECT p.id, p.title, p.completed, p.priority, p.urgent, p.deadline,
+           p.created_by, p.created_at, p.change_seq, COALESCE(a.names, '{{}}'),
+           p.rank,
+           ts_headline('russian', p.title, to_tsquery('russian', %(query)s),
+                       'HighlightAll=true, StartSel=' || chr(1) || ', StopSel=' || chr(2)),
+           h.truncated
+    FROM (SELECT count(*) > %(ranked)s AS truncated FROM hits) h
+    LEFT JOIN page p ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT array_agg(u.name ORDER BY ta.id) AS names
+        FROM task_assignments ta
+        JOIN users u ON u.id = ta.user_id
+        WHERE ta.task_id = p.id
+    ) a ON TRUE
+    ORDER BY p.rank DESC, p.id DESC
+"""
+
+# Ближайшее по триграммам слово словаря (V0013) для каждого слова запроса:
+# word_similarity находит и слово с опечаткой, и начало слова, при равенстве
+# выбирается слово ближе по длине. Слово без опечатки находится само
+CORRECT_SQL = """
+    SELECT q.word, c.word
+    FROM unnest(%s::text[]) AS q(word)
+    LEFT JOIN LATERAL (
+        SELECT w.word
+        FROM task_search_words w
+        WHERE q.word <%% w.word
+        ORDER BY word_similarity(q.word, w.word) DESC, similarity(q.word, w.word) DESC, w.word
+        LIMIT 1
+    ) c ON TRUE
+"""
+
+
+def build_tsquery(text: str) -> Optional[str]:
+    """
+    Запрос to_tsquery из строки пользователя: все слова обязательны
+
+    Без префиксов (:*): для целых слов планировщик знает частоту из
+    статистики столбца и выбирает между индексом GIN и первичным ключом,
+    а недописанное слово дополняется по словарю, как опечатка
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    return " & ".join(words)
+
+
+def highlight(headline: str) -> str:
+    """Название с совпадениями в <mark>, безопасное для вставки в HTML"""
+    return html.escape(headline).replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+def encode_cursor(rank: float, task_id: int, corrected: Optional[str]) -> str:
+    raw = json.dumps([rank, task_id, corrected], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int, Optional[str]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, task_id, corrected = json.loads(raw)
+        if corrected is not None and not isinstance(corrected, str):
+            raise ValueError(corrected)
+        return float(rank), int(task_id), corrected
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def correct_words(conn, text: str) -> Optional[str]:
+    """
+    Запрос с исправленными опечатками или None, если исправлять нечего
+    или для какого-то слова нет похожего. Слова короче трех букв (в словаре
+    их нет) остаются как есть
+    """
+    words = _WORD.findall(text.lower())
+    long_words = [word for word in words if len(word) >= MIN_WORD_LENGTH]
+    if not long_words:
+        return None
+    found = dict(conn.execute(CORRECT_SQL, (long_words,)).fetchall())
+    if any(found.get(word) is None for word in long_words):
+        return None
+    corrected = " ".join(found.get(word, word) for word in words)
+    return corrected if corrected != " ".join(words) else None
+
+
+def _page(conn, tsquery: str, after: Optional[Tuple[float, int]], limit: int,
+          max_ranked: Optional[int]) -> Tuple[List[tuple], bool]:
+    """Строки страницы и признак, что ранжированы не все совпадения"""
+    # LIMIT NULL - без ограничения, count(*) > NULL - NULL
+    params: Dict[str, Any] = {"query": tsquery, "ranked": max_ranked, "limit": limit + 1}
+    after_sql = "TRUE"
+    if after is not None:
+        after_sql = "(rank, id) < (%(rank)s, %(id)s)"
+        params["rank"], params["id"] = after
+    # Без подготовки: план зависит от частоты слов (обход первичного ключа
+    # для частых, индекс GIN для редких), а общий план подготовленного
+    # запроса этого не учитывает
+    rows = conn.execute(PAGE_SQL.format(after=after_sql), params, prepare=False).fetchall()
+    truncated = bool(rows[0][12])
+    return [row for row in rows if row[0] is not None], truncated
+
+
+def search_tasks(conn, query: str, cursor: Optional[str] = None,
+                 limit: int = PAGE_SIZE, max_ranked: Optional[int] = MAX_RANKED) -> Dict[str, Any]:
+    """
+    Страница результатов поиска, от лучших совпадений к худшим
+
+    Ранжируются max_ranked самых новых задач с совпадением (None - все);
+    если слова запроса не нашлись, они исправляются по словарю слов названий
+
+    Args:
+        conn: подключение из пула
+        query: строка поиска
+        cursor: nextCursor предыдущей страницы
+        limit: результатов на странице (не больше MAX_PAGE_SIZE)
+        max_ranked: сколько самых новых совпадений ранжировать
+
+    Returns:
+        {"mode": "fulltext" или "fuzzy", "query": исправленный запрос или None,
+         "tasks": [...], "nextCursor": ..., "truncated": совпадений больше
+         max_ranked и более старые не вошли в результат}; у задачи - rank
+        и snippet (название с <mark> вокруг совпадений)
+    """
+    query = query.strip()[:MAX_QUERY_LENGTH]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    tsquery = build_tsquery(query)
+    corrected = None
+    if tsquery is None:
+        return {"mode": FULLTEXT, "query": None, "tasks": [], "nextCursor": None, "truncated": False}
+
+    if cursor:
+        rank, task_id, corrected = decode_cursor(cursor)
+        if corrected is not None:
+            tsquery = build_tsquery(corrected)
+            if tsquery is None:
+                raise ValueError("Invalid cursor")
+        rows, truncated = _page(conn, tsquery, (rank, task_id), limit, max_ranked)
+    else:
+        rows, truncated = _page(conn, tsquery, None, limit, max_ranked)
+        if not rows:
+            # Ни одного совпадения - вероятно, опечатка
+            corrected = correct_words(conn, query)
+            if corrected is not None:
+                rows, truncated = _page(conn, build_tsquery(corrected), None, limit, max_ranked)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][10], rows[-1][0], corrected)
+    tasks = []
+    for row in rows:
+        task = task_to_dict(row[:10])
+        task["rank"] = round(row[10], 4)
+        task["snippet"] = highlight(row[11])
+        tasks.append(task)
+    return {
+        "mode": FUZZY if corrected is not None else FULLTEXT,
+        "query": corrected,
+        "tasks": tasks,
+        "nextCursor": next_cursor,
+        "truncated": truncated,
+    }
@@ -0,0 +1,158 @@
+"""
+TaskFlow Gateway - статистика задач по исполнителям
+Счетчики в user_task_stats ведут триггеры базы (миграции V0010, V0016), здесь -
+их чтение и периодическая сверка с задачами
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from gateway.db import DatabasePool
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "taskflow-stats-reconcile"
+
+STATS_COLUMNS = "s.user_id, u.email, s.total_tasks, s.completed_tasks, s.updated_at"
+
+USER_STATS_SQL = f"""
+    SELECT {STATS_COLUMNS}
+    FROM users u JOIN user_task_stats s ON s.user_id = u.id
+    WHERE u.email = %s
+"""
+
+ALL_STATS_SQL = f"""
+    SELECT {STATS_COLUMNS}
+    FROM user_task_stats s JOIN users u ON u.id = s.user_id
+    ORDER BY s.user_id
+"""
+
+# Пересчет счетчиков, которые разошлись с задачами; возвращает id исправленных.
+# Назначения без пользователя (user_id IS NULL) не считаются, как в триггерах V0016
+RECONCILE_SQL = """
+    WITH actual AS (
+        SELECT ta.user_id,
+               COUNT(*)::INTEGER AS total_tasks,
+               (COUNT(*) FILTER (WHERE t.completed))::INTEGER AS completed_tasks
+        FROM task_assignments ta
+        JOIN tasks t ON t.id = ta.task_id
+        WHERE ta.user_id IS NOT NULL
+        GROUP BY ta.user_id
+    ),
+    expected AS (
+        SELECT COALESCE(a.user_id, s.user_id) AS user_id,
+               COALESCE(a.total_tasks, 0) AS total_tasks,
+               COALESCE(a.completed_tasks, 0) AS completed_tasks
+        FROM actual a
+        FULL JOIN user_task_stats s ON s.user_id = a.user_id
+        WHERE s.user_id IS NULL
+           OR (s.total_tasks, s.completed_tasks)
+              IS DISTINCT FROM (COALESCE(a.total_tasks, 0), COALESCE(a.completed_tasks, 0))
+    )
+    INSERT INTO user_task_stats (user_id, total_tasks, completed_tasks)
+    SELECT user_id, total_tasks, completed_tasks FROM expected
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_tasks = EXCLUDED.total_tasks,
+        completed_tasks = EXCLUDED.completed_tasks,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING user_id
+"""
+
+
+def stats_to_dict(row: tuple) -> Dict[str, Any]:
+    user_id, email, total, completed, updated_at = row
+    return {
+        "userId": user_id,
+        "email": email,
+        "totalTasks": total,
+        "completedTasks": completed,
+        "openTasks": total - completed,
+        "updatedAt": updated_at.isoformat(),
+    }
+
+
+def user_stats(conn, email: str) -> Dict[str, Any]:
+    """Статистика одного пользователя - чтение одной строки по ключу"""
+    row = conn.execute(USER_STATS_SQL, (email,)).fetchone()
+    if row is None:
+        return {"userId": None, "email": email, "totalTasks": 0, "completedTasks": 0, "openTasks": 0, "updatedAt": None}
+    return stats_to_dict(row)
+
+
+def all_stats(conn) -> List[Dict[str, Any]]:
+    return [stats_to_dict(row) for row in conn.execute(ALL_STATS_SQL).fetchall()]
+
+
+class StatsReconciler:
+    """
+    Периодическая сверка user_task_stats с задачами
+
+    Триггеры держат счетчики точными, сверка страхует от правок в обход
+    них (ручной SQL, восстановление из бэкапа). Пересчет идет под
+    транзакционной advisory-блокировкой - из uvicorn workers сверку
+    выполняет один, остальные пропускают. На время пересчета таблица
+    счетчиков блокируется для записи: изменения задач, начатые раньше,
+    успевают зафиксироваться, начатые позже ждут конца сверки - иначе
+    сверка могла бы затереть их приращения.
+    """
+
+    def __init__(self, pool: DatabasePool, interval: float = 3600.0):
+        self.pool = pool
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"runs": 0, "skipped": 0, "repaired": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool) -> "StatsReconciler":
+        """STATS_RECONCILE_INTERVAL - пауза между сверками (секунды)"""
+        return cls(pool, interval=float(os.environ.get("STATS_RECONCILE_INTERVAL", 3600)))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="stats-reconcile")
+        logger.info(f"Task stats reconciliation every {self.interval:g}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reconcile(self) -> Optional[List[int]]:
+        """
+        Исправляет расхождения счетчиков
+
+        Returns:
+            id пользователей с исправленными счетчиками или None,
+            если сверку сейчас выполняет другой worker
+        """
+        with self.pool.connection("stats-reconcile") as conn:
+            locked = conn.execute(
+                "SELECT pg_try_advisory_xact_lock(hashtext(%s))", (LOCK_NAME,)
+            ).fetchone()[0]
+            if not locked:
+                self.stats["skipped"] += 1
+                return None
+            conn.execute("LOCK TABLE user_task_stats IN SHARE ROW EXCLUSIVE MODE", prepare=False)
+            repaired = [row[0] for row in conn.execute(RECONCILE_SQL).fetchall()]
+        self.stats["runs"] += 1
+        self.stats["repaired"] += len(repaired)
+        return repaired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                repaired = await asyncio.to_thread(self.reconcile)
+                if repaired:
+                    logger.warning(f"Repaired task stats drift for {len(repaired)} users: "
+                                   f"{', '.join(map(str, repaired[:10]))}")
+            except Exception as e:
+                logger.error(f"Task stats reconciliation failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"interval": self.interval, **self.stats}
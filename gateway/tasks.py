@@ -0,0 +1,176 @@
+"""
+TaskFlow Gateway - постраничный список задач
+Страницы по ключу (created_at, id): следующая страница начинается сразу
+после последней задачи предыдущей, без OFFSET - время ответа не зависит
+от номера страницы и размера таблицы
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from gateway.push import task_to_dict
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+PRIORITIES = ("low", "medium", "high")
+
+# Страница выбирается по индексам tasks без соединений, исполнители
+# дописываются только к задачам страницы
+PAGE_SQL = """
+    WITH page AS (
+        SELECT t.id, t.title, t.completed, t.priority, t.urgent, t.deadline,
+               t.created_by, t.created_at, t.change_seq
+        FROM tasks t
+        WHERE {where}
+        ORDER BY t.created_at DESC, t.id DESC
+        LIMIT %s
+    )
+    SELECT p.*, COALESCE(a.names, '{{}}')
+    FROM page p
+    LEFT JOIN LATERAL (
+        SELECT array_agg(u.name ORDER BY ta.id) AS names
+        FROM task_assignments ta
+        JOIN users u ON u.id = ta.user_id
+        WHERE ta.task_id = p.id
+    ) a ON TRUE
+    ORDER BY p.created_at DESC, p.id DESC
+"""
+
+
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), task_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, task_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def parse_bool(value: Optional[str], name: str) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if value in ("true", "1"):
+        return True
+    if value in ("false", "0"):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def parse_date(value: Optional[str], name: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError as e:
+        raise ValueError(f"{name} must be YYYY-MM-DD") from e
+
+
+class TaskFilter:
+    """
+    Условия выборки списка задач
+
+    Каждое условие опирается на свой индекс из миграции V0011: открытые и
+    срочные задачи - частичные индексы по (created_at, id), приоритет -
+    составной, исполнитель - (user_id, task_id) в task_assignments (V0012).
+    С фильтром по исполнителю время страницы растет с числом его задач
+    """
+
+    def __init__(self, assignee_ids: Optional[List[int]] = None,
+                 completed: Optional[bool] = None, priorities: Optional[List[str]] = None,
+                 urgent: Optional[bool] = None, deadline_from: Optional[date] = None,
+                 deadline_to: Optional[date] = None):
+        self.assignee_ids = assignee_ids
+        self.completed = completed
+        self.priorities = priorities
+        self.urgent = urgent
+        self.deadline_from = deadline_from
+        self.deadline_to = deadline_to
+
+    @classmethod
+    def from_query(cls, params: Dict[str, str]) -> "TaskFilter":
+        """
+        Фильтр из параметров запроса: completed, urgent (true/false),
+        priority (через запятую), deadlineFrom, deadlineTo (YYYY-MM-DD, включительно).
+        Исполнитель (assignee) разрешается в id пользователя отдельно
+        """
+        priorities = None
+        if params.get("priority"):
+            priorities = [p for p in params["priority"].split(",") if p]
+            unknown = [p for p in priorities if p not in PRIORITIES]
+            if unknown:
+                raise ValueError(f"Unknown priority: {', '.join(unknown)}")
+        return cls(
+            completed=parse_bool(params.get("completed"), "completed"),
+            priorities=priorities,
+            urgent=parse_bool(params.get("urgent"), "urgent"),
+            deadline_from=parse_date(params.get("deadlineFrom"), "deadlineFrom"),
+            deadline_to=parse_date(params.get("deadlineTo"), "deadlineTo"),
+        )
+
+    def where(self) -> Tuple[List[str], List[Any]]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        if self.assignee_ids is not None:
+            # Задачи исполнителя выбираются по первичному ключу и сортируются:
+            # время зависит от числа его задач, а не от размера таблицы, как
+            # при обходе всего индекса (created_at, id) с проверкой каждой строки
+            conditions.append(
+                "t.id = ANY(ARRAY(SELECT task_id FROM task_assignments WHERE user_id = ANY(%s)))"
+            )
+            params.append(self.assignee_ids)
+        # Сравнение с константой, а не с параметром: иначе планировщик не
+        # сможет выбрать частичный индекс для подготовленного запроса
+        if self.completed is not None:
+            conditions.append("t.completed = TRUE" if self.completed else "t.completed = FALSE")
+        if self.urgent is not None:
+            conditions.append("t.urgent = TRUE" if self.urgent else "t.urgent = FALSE")
+        if self.priorities:
+            conditions.append("t.priority = ANY(%s)")
+            params.append(self.priorities)
+        if self.deadline_from is not None:
+            conditions.append("t.deadline >= %s")
+            params.append(self.deadline_from)
+        if self.deadline_to is not None:
+            conditions.append("t.deadline <= %s")
+            params.append(self.deadline_to)
+        return conditions, params
+
+
+def list_tasks(conn, task_filter: TaskFilter, cursor: Optional[str] = None,
+               limit: int = PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Страница задач от новых к старым
+
+    Args:
+        conn: подключение из пула
+        task_filter: условия выборки
+        cursor: nextCursor предыдущей страницы
+        limit: задач на странице (не больше MAX_PAGE_SIZE)
+
+    Returns:
+        {"tasks": [...], "nextCursor": str или None на последней странице}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    conditions, params = task_filter.where()
+    if task_filter.assignee_ids == []:
+        return {"tasks": [], "nextCursor": None}
+    if cursor:
+        conditions.append("(t.created_at, t.id) < (%s, %s)")
+        params.extend(decode_cursor(cursor))
+    sql = PAGE_SQL.format(where=" AND ".join(conditions) or "TRUE")
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = conn.execute(sql, (*params, limit + 1)).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[7], last[0])
+    return {"tasks": [task_to_dict(row) for row in rows], "nextCursor": next_cursor}
@@ -0,0 +1,255 @@
+"""
+TaskFlow Gateway - клиент Telegram Bot API
+Общий keep-alive пул соединений, лимиты Telegram (глобальный и на чат)
+и параллельная рассылка; handlers получают его как context.telegram
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from gateway.deadline import Deadline, DeadlineExceeded
+from gateway.metrics import TELEGRAM_REQUEST_DURATION
+from gateway.tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+
+class TelegramError(Exception):
+    """Ошибка, которую вернул Telegram Bot API"""
+
+    def __init__(self, description: str, error_code: Optional[int] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(description)
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты (GCRA): rate событий в секунду, пачка до burst
+
+    Каждый вызов acquire() резервирует слот и спит до его наступления,
+    поэтому порядок ожидающих сохраняется без отдельной очереди.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self._tat = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Резервирует слот и возвращает, сколько секунд до него ждать"""
+        tat = max(self._tat, now)
+        self._tat = tat + self.interval
+        return max(0.0, tat - self.tolerance - now)
+
+    @property
+    def idle_since(self) -> float:
+        return self._tat
+
+    async def acquire(self):
+        delay = self.reserve(asyncio.get_running_loop().time())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class TelegramClient:
+    """
+    Асинхронный клиент Bot API на общем httpx.AsyncClient
+
+    Глобальный лимит - TELEGRAM_GLOBAL_RATE сообщений в секунду на бота,
+    в один чат - не чаще раза в TELEGRAM_CHAT_INTERVAL секунд.
+    """
+
+    def __init__(self, token: str, api_url: str = TELEGRAM_API_URL,
+                 global_rate: float = 30, chat_interval: float = 1.0,
+                 max_connections: int = 20, timeout: float = 10.0):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.chat_interval = chat_interval
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._global = RateLimiter(global_rate, burst=int(global_rate))
+        self._chats: Dict[Any, RateLimiter] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["TelegramClient"]:
+        """Создает клиент из TELEGRAM_BOT_TOKEN или None, если токен не задан"""
+        token = os.environ.get("TELEGRAM_BOT_TOKEN")
+        if not token:
+            return None
+        return cls(
+            token,
+            api_url=os.environ.get("TELEGRAM_API_URL", TELEGRAM_API_URL),
+            global_rate=float(os.environ.get("TELEGRAM_GLOBAL_RATE", 30)),
+            chat_interval=float(os.environ.get("TELEGRAM_CHAT_INTERVAL", 1)),
+            max_connections=int(os.environ.get("TELEGRAM_MAX_CONNECTIONS", 20)),
+        )
+
+    async def start(self):
+        """Открывает пул соединений; вызывается в lifespan gateway"""
+        self.loop = asyncio.get_running_loop()
+        self._http = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+        )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _chat_limiter(self, chat_id: Any) -> RateLimiter:
+        limiter = self._chats.get(chat_id)
+        if limiter is None:
+            if len(self._chats) > 10000:
+                # Чаты, в которые давно не писали, лимитер больше не нужен
+                now = asyncio.get_running_loop().time()
+                self._chats = {
+                    key: value for key, value in self._chats.items()
+                    if value.idle_since > now
+                }
+            limiter = self._chats[chat_id] = RateLimiter(1.0 / self.chat_interval)
+        return limiter
+
+    async def call(self, method: str, payload: Dict[str, Any],
+                   timeout: Optional[float] = None) -> Any:
+        """
+        Вызывает метод Bot API
+
+        Args:
+            method: имя метода (sendMessage, editMessageText и т.д.)
+            payload: параметры метода
+            timeout: таймаут запроса вместо общего (для long polling getUpdates)
+
+        Returns:
+            Поле result ответа Telegram
+        """
+        if self._http is None:
+            raise RuntimeError("TelegramClient is not started")
+        for attempt in range(2):
+            started = time.perf_counter()
+            status = "error"
+            # URL содержит токен бота, в атрибуты span попадает только метод
+            span = TRACER.span(f"telegram.{method}", "client", {"telegram.method": method})
+            try:
+                with span:
+                    response = await self._http.post(
+                        f"{self.api_url}/bot{self.token}/{method}", json=payload,
+                        timeout=timeout if timeout is not None else self.timeout
+                    )
+                    data = response.json()
+                    status = "ok" if data.get("ok") else str(data.get("error_code", response.status_code))
+                    span.set_attribute("telegram.status", status)
+            finally:
+                TELEGRAM_REQUEST_DURATION.observe(time.perf_counter() - started, method, status)
+            if data.get("ok"):
+                return data.get("result")
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if data.get("error_code") == 429 and retry_after and attempt == 0:
+                logger.warning(f"Telegram rate limit hit, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            raise TelegramError(
+                data.get("description", "Telegram request failed"),
+                data.get("error_code"),
+                retry_after
+            )
+
+    async def send_message(self, chat_id: Any, text: str,
+                           reply_markup: Optional[Dict[str, Any]] = None,
+                           parse_mode: str = "HTML") -> Any:
+        """Отправляет сообщение с учетом лимитов на бота и на чат"""
+        await self._chat_limiter(chat_id).acquire()
+        await self._global.acquire()
+        payload: Dict[str, Any] = {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}
+        if reply_markup:
+            payload["reply_markup"] = json.dumps(reply_markup)
+        return await self.call("sendMessage", payload)
+
+    async def send_many(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Отправляет сообщения параллельно
+
+        Args:
+            messages: список {"chat_id", "text", "reply_markup"?}
+
+        Returns:
+            Результаты в том же порядке: {"chat_id", "ok", "error"?, "error_code"?}
+        """
+        async def send(message: Dict[str, Any]) -> Dict[str, Any]:
+            chat_id = message["chat_id"]
+            try:
+                await self.send_message(chat_id, message["text"], message.get("reply_markup"))
+                return {"chat_id": chat_id, "ok": True}
+            except TelegramError as e:
+                logger.warning(f"Failed to send Telegram message to {chat_id}: {e}")
+                return {"chat_id": chat_id, "ok": False, "error": str(e), "error_code": e.error_code}
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Failed to send Telegram message to {chat_id}: {e}")
+                return {"chat_id": chat_id, "ok": False, "error": str(e)}
+
+        return list(await asyncio.gather(*(send(message) for message in messages)))
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class TelegramFacade:
+    """
+    Синхронный доступ к TelegramClient для handlers (context.telegram)
+
+    Handler работает в потоке пула, а запросы выполняются в event loop
+    gateway на общем пуле соединений. Со сроком запроса вызов, не
+    уложившийся в оставшееся время, отменяется (DeadlineExceeded) -
+    зависший Telegram не держит поток handler.
+    """
+
+    def __init__(self, client: TelegramClient, deadline: Optional[Deadline] = None):
+        self.client = client
+        self.deadline = deadline
+
+    def _run(self, coro):
+        if self.client.loop is _running_loop():
+            coro.close()
+            raise RuntimeError("Use context.telegram.client from async handlers")
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline.remaining()
+            if timeout <= 0:
+                coro.close()
+                raise DeadlineExceeded("Request deadline exceeded before Telegram call")
+        future = asyncio.run_coroutine_threadsafe(coro, self.client.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded("Request deadline exceeded during Telegram call") from None
+
+    def call(self, method: str, payload: Dict[str, Any]) -> Any:
+        return self._run(self.client.call(method, payload))
+
+    def send_message(self, chat_id: Any, text: str,
+                     reply_markup: Optional[Dict[str, Any]] = None) -> Any:
+        return self._run(self.client.send_message(chat_id, text, reply_markup))
+
+    def send_many(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._run(self.client.send_many(messages))
@@ -0,0 +1,355 @@
+"""
+TaskFlow Gateway - трассировка запросов
+Идентификатор запроса передается handler в context.request_id, этапы
+запроса (построение event, handler, SQL, вызовы Telegram) записываются
+как spans и выгружаются в формате OTLP JSON или в лог
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Коды OTLP: SpanKind и Status.code
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_ERROR = 2
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar(
+    "taskflow_span", default=None
+)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def request_id_from(headers: Mapping[str, str]) -> str:
+    """
+    Идентификатор запроса: X-Request-Id от прокси или новый
+
+    Чужое значение принимается, только если оно похоже на идентификатор,
+    чтобы в логи и трассы не попадал произвольный текст.
+    """
+    value = headers.get("x-request-id")
+    if value and _REQUEST_ID.match(value):
+        return value
+    return new_request_id()
+
+
+class Span:
+    """Этап запроса: имя, время начала и конца, атрибуты"""
+    __slots__ = ("tracer", "name", "kind", "trace_id", "span_id", "parent_id",
+                 "start", "end", "attributes", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, kind: str, trace_id: str,
+                 parent_id: Optional[str], attributes: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.start = 0
+        self.end = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end - self.start) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def __enter__(self) -> "Span":
+        self.start = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        if exc is not None and not isinstance(exc, asyncio.CancelledError):
+            self.record_error(exc)
+        _current.reset(self._token)
+        self.tracer._finish(self)
+
+
+class NoopSpan:
+    """Span, который ничего не записывает: трассировка выключена или запрос не попал в выборку"""
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    """
+    Запись spans текущего запроса
+
+    Текущий span хранится в contextvars, поэтому вложенность сохраняется
+    и в async коде, и в потоках Dispatcher (контекст копируется при
+    отправке handler в пул). Вне трассируемого запроса span() возвращает
+    NOOP_SPAN - фоновые задачи и запросы вне выборки почти ничего не стоят.
+    Завершенные spans копятся в очереди и выгружаются фоном (SpanExporter).
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_queue: int = 10000):
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self._finished: "deque[Span]" = deque()
+        self.dropped = 0
+
+    def start_trace(self, name: str, request_id: str, traceparent: Optional[str] = None,
+                    attributes: Optional[Dict[str, Any]] = None, kind: str = "server"):
+        """
+        Корневой span запроса
+
+        Args:
+            name: имя, например "POST /api/save-task"
+            request_id: идентификатор запроса (атрибут request.id)
+            traceparent: заголовок W3C traceparent - продолжить чужую трассу
+            attributes: атрибуты span
+            kind: server для входящих запросов, internal для фоновой обработки
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent_id = None
+        match = _TRACEPARENT.match(traceparent or "")
+        if match:
+            trace_id, parent_id, flags = match.groups()
+            sampled = int(flags, 16) & 1
+        else:
+            trace_id = uuid.uuid4().hex
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        span = Span(self, name, kind, trace_id, parent_id, attributes)
+        span.attributes["request.id"] = request_id
+        return span
+
+    def span(self, name: str, kind: str = "internal",
+             attributes: Optional[Dict[str, Any]] = None):
+        """Вложенный span в текущем запросе или NOOP_SPAN вне запроса"""
+        parent = _current.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, kind, parent.trace_id, parent.span_id, attributes)
+
+    def _finish(self, span: Span):
+        if len(self._finished) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._finished.append(span)
+
+    def drain(self) -> List[Span]:
+        spans = []
+        while self._finished:
+            spans.append(self._finished.popleft())
+        return spans
+
+
+TRACER = Tracer()
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """Spans в виде ExportTraceServiceRequest (OTLP/JSON)"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": service_name}}
+        ]},
+        "scopeSpans": [{
+            "scope": {"name": "taskflow.gateway"},
+            "spans": [
+                {
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                    "name": span.name,
+                    "kind": SPAN_KINDS.get(span.kind, 1),
+                    "startTimeUnixNano": str(span.start),
+                    "endTimeUnixNano": str(span.end),
+                    "attributes": [
+                        {"key": key, "value": _attribute_value(value)}
+                        for key, value in span.attributes.items()
+                    ],
+                    **({"status": {"code": STATUS_ERROR, "message": span.error}}
+                       if span.error else {}),
+                }
+                for span in spans
+            ],
+        }],
+    }]}
+
+
+class OTLPFileExporter:
+    """
+    Запись в файл JSON Lines: строка - один ExportTraceServiceRequest
+
+    Формат читает receiver otlpjsonfile из OpenTelemetry Collector,
+    дальше трассы можно отправить в Jaeger, Tempo и т.д.
+    """
+
+    def __init__(self, path: str, service_name: str):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]):
+        line = json.dumps(to_otlp(spans, self.service_name), ensure_ascii=False)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class ConsoleExporter:
+    """Дерево spans каждого запроса в лог - для разработки"""
+
+    def __init__(self, service_name: str):
+        self.service_name = service_name
+
+    def export(self, spans: List[Span]):
+        traces: Dict[str, List[Span]] = {}
+        for span in spans:
+            traces.setdefault(span.trace_id, []).append(span)
+        for trace_id, items in traces.items():
+            ids = {span.span_id for span in items}
+            children: Dict[Optional[str], List[Span]] = {}
+            for span in sorted(items, key=lambda span: span.start):
+                parent = span.parent_id if span.parent_id in ids else None
+                children.setdefault(parent, []).append(span)
+            lines = [f"trace {trace_id}"]
+            stack = [(span, 1) for span in reversed(children.get(None, []))]
+            while stack:
+                span, depth = stack.pop()
+                parts = [f"{'  ' * depth}{span.name} {span.duration_ms:.2f}ms"]
+                parts += [f"{key}={value}" for key, value in span.attributes.items()]
+                if span.error:
+                    parts.append(f"ERROR {span.error}")
+                lines.append(" ".join(parts))
+                stack.extend((child, depth + 1) for child in reversed(children.get(span.span_id, [])))
+            logger.info("\n".join(lines))
+
+
+class SpanExporter:
+    """
+    Фоновая выгрузка завершенных spans
+
+    Запись в файл идет в отдельном потоке пачками раз в interval секунд,
+    на обработку запросов она не влияет.
+    """
+
+    def __init__(self, exporter: Any, tracer: Tracer = TRACER, interval: float = 1.0):
+        self.exporter = exporter
+        self.tracer = tracer
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"exported": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["SpanExporter"]:
+        """
+        Создает выгрузку или None, если трассировка выключена
+
+        TRACING_EXPORTER - otlp-file (файл OTLP JSON) или console (лог)
+        TRACING_FILE - путь для otlp-file
+        TRACING_SAMPLE_RATE - доля трассируемых запросов (0-1)
+        TRACING_SERVICE_NAME - service.name в выгрузке
+        """
+        kind = os.environ.get("TRACING_EXPORTER", "").lower()
+        if not kind or kind == "none":
+            return None
+        service_name = os.environ.get("TRACING_SERVICE_NAME", "taskflow-gateway")
+        if kind == "otlp-file":
+            exporter: Any = OTLPFileExporter(
+                os.environ.get("TRACING_FILE", "traces.jsonl"), service_name
+            )
+        elif kind == "console":
+            exporter = ConsoleExporter(service_name)
+        else:
+            raise ValueError(f"Unknown TRACING_EXPORTER: {kind!r}")
+        TRACER.sample_rate = float(os.environ.get("TRACING_SAMPLE_RATE", 1))
+        return cls(exporter)
+
+    def start(self):
+        self.tracer.enabled = True
+        self._task = asyncio.create_task(self._run(), name="span-exporter")
+        logger.info(f"Tracing enabled: {type(self.exporter).__name__}, "
+                    f"sample_rate={self.tracer.sample_rate}")
+
+    async def stop(self):
+        self.tracer.enabled = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        with self._lock:
+            spans = self.tracer.drain()
+            if not spans:
+                return
+            try:
+                self.exporter.export(spans)
+                self.stats["exported"] += len(spans)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.flush)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "exporter": type(self.exporter).__name__,
+            "sample_rate": self.tracer.sample_rate,
+            "queued": len(self.tracer._finished),
+            "dropped": self.tracer.dropped,
+            **self.stats,
+        }
@@ -0,0 +1,451 @@
+"""
+TaskFlow Gateway - выгрузка и загрузка задач целиком
+Перенос задач между установками: NDJSON или CSV через COPY PostgreSQL.
+Данные идут потоком, память не зависит от числа задач: выгрузка читает
+COPY TO STDOUT кусками через ограниченную очередь, загрузка разбирает
+поток построчно, проверяет и пишет задачи пачками по CHUNK_SIZE (COPY FROM
+STDIN, COMMIT после каждой пачки).
+
+Формат записи: {"id", "title", "completed", "priority", "urgent", "deadline",
+"createdBy", "createdAt", "assignees": [email, ...]}; в CSV те же колонки,
+исполнители через ";". При загрузке id из файла не сохраняется - задачи
+получают новые номера; исполнитель - email или имя пользователя.
+"""
+
+import csv
+import io
+import itertools
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import psycopg2
+
+from gateway.tasks import PRIORITIES, parse_bool, parse_date
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+CHUNK_SIZE = 5000
+MAX_ERRORS = 100
+# Выгрузка: размер куска ответа и сколько кусков ждут медленного клиента
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_QUEUE_SIZE = 16
+
+# Сообщение для gateway/push.py: подключенные клиенты перечитывают задачи
+# целиком, а не получают событие на каждую загруженную задачу
+RELOAD_NOTIFY_SQL = "SELECT pg_notify('task_changes', '{\"op\": \"reload\"}')"
+
+EXPORT_SQL = """
+    SELECT {columns}
+    FROM (
+        SELECT t.id, t.title, t.completed, t.priority, t.urgent, t.deadline,
+               t.created_by AS "createdBy", t.created_at AS "createdAt",
+               COALESCE(a.emails, '{{}}') AS assignees
+        FROM tasks t
+        LEFT JOIN LATERAL (
+            SELECT array_agg(ta.user_email ORDER BY ta.id) AS emails
+            FROM task_assignments ta
+            WHERE ta.task_id = t.id
+        ) a ON TRUE
+    ) r
+    ORDER BY r.id
+"""
+
+EXPORT_COLUMNS = {
+    "csv": """
+        r.id, r.title, r.completed::text AS completed, r.priority,
+        r.urgent::text AS urgent, r.deadline, r."createdBy", r."createdAt",
+        array_to_string(r.assignees, ';') AS assignees
+    """,
+    "ndjson": "row_to_json(r)",
+}
+
+# NDJSON - одна колонка JSON в CSV с разделителем и кавычкой, которых в JSON
+# не бывает (управляющие символы row_to_json экранирует): строки
+# выходят без кавычек и без экранирования обратной косой черты, как в FORMAT text
+EXPORT_OPTIONS = {
+    "csv": "FORMAT csv, HEADER",
+    "ndjson": "FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01'",
+}
+
+# Исполнители пачки одним запросом: сначала совпадение email, затем имени
+# (для одинаковых имен - меньший id), как resolve_user_id() из V0012
+RESOLVE_SQL = """
+    SELECT DISTINCT ON (key) key, id, email
+    FROM (
+        SELECT email AS key, id, email, 0 AS rank FROM users WHERE email = ANY(%s)
+        UNION ALL
+        SELECT name, id, email, 1 FROM users WHERE name = ANY(%s)
+    ) u
+    ORDER BY key, rank, id
+"""
+
+ALLOCATE_IDS_SQL = """
+    SELECT nextval(pg_get_serial_sequence('tasks', 'id'))
+    FROM generate_series(1, %s)
+"""
+
+# Формат text, а не csv: в csv строка "\." без кавычек означает конец данных
+COPY_TASKS_SQL = """
+    COPY tasks (id, title, completed, priority, urgent, deadline, created_by, created_at,
+                created_by_id)
+    FROM STDIN
+"""
+
+COPY_ASSIGNMENTS_SQL = """
+    COPY task_assignments (task_id, user_email, user_id)
+    FROM STDIN
+"""
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+
+class ExportCancelled(Exception):
+    """Получатель выгрузки отключился"""
+
+
+class _QueueWriter:
+    """Файл для copy_expert: куски ответа COPY в ограниченную очередь"""
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self._buffer: List[bytes] = []
+        self._size = 0
+
+    def write(self, data: bytes):
+        self._buffer.append(data)
+        self._size += len(data)
+        if self._size >= EXPORT_CHUNK_BYTES:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.put(b"".join(self._buffer))
+            self._buffer, self._size = [], 0
+
+    def put(self, item: Any):
+        # Очередь полна, пока клиент не прочитал предыдущие куски: COPY
+        # ждет его, а не накапливает ответ в памяти
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+_DONE = object()
+
+
+def export_tasks(dsn: str, fmt: str) -> Iterator[bytes]:
+    """
+    Все задачи в формате fmt ("ndjson" или "csv") кусками по ~64 КБ
+
+    COPY выполняется в отдельном потоке на своем подключении (выгрузка
+    длится минуты и не должна занимать пул) в одном снимке REPEATABLE READ.
+    Если получатель перестал читать, генератор закрывается и COPY прерывается.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    sql = (
+        f"COPY ({EXPORT_SQL.format(columns=EXPORT_COLUMNS[fmt])}) "
+        f"TO STDOUT WITH ({EXPORT_OPTIONS[fmt]})"
+    )
+    chunks: "queue.Queue" = queue.Queue(EXPORT_QUEUE_SIZE)
+    cancelled = threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+
+    def run():
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            with conn.cursor() as cursor:
+                cursor.copy_expert(sql, writer)
+            writer.flush()
+            writer.put(_DONE)
+        except ExportCancelled:
+            logger.info("Task export cancelled by client")
+        except Exception as e:
+            try:
+                writer.put(e)
+            except ExportCancelled:
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
+
+    thread = threading.Thread(target=run, name="task-export", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
+
+
+# ---------- загрузка ----------
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Строки потока байтов с произвольными границами кусков (с \\n в конце)"""
+    rest = b""
+    for chunk in chunks:
+        rest += chunk
+        lines = rest.split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if rest:
+        yield rest
+
+
+def read_records(chunks: Iterable[bytes], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Записи потока: (номер строки, dict) или (номер строки, ValueError)
+    для строки, которую не удалось разобрать
+    """
+    if fmt == "ndjson":
+        for number, line in enumerate(iter_lines(chunks), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield number, ValueError("record must be a JSON object")
+                continue
+            yield number, record
+    elif fmt == "csv":
+        lines = (line.decode("utf-8-sig") for line in iter_lines(chunks))
+        reader = csv.DictReader(lines)
+        if reader.fieldnames is None:
+            return
+        if "title" not in reader.fieldnames:
+            raise ValueError("CSV header has no title column")
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+
+
+def _bool(value: Any, name: str) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    parsed = parse_bool(str(value).strip().lower(), name)
+    return bool(parsed)
+
+
+def _text(value: Any, name: str) -> Optional[str]:
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string")
+    return value.strip() or None
+
+
+def parse_task(record: Dict[str, Any]) -> Tuple[tuple, List[str]]:
+    """
+    Проверенная задача: (title, completed, priority, urgent, deadline,
+    created_by, created_at) и исполнители - email или имена
+
+    Raises:
+        ValueError: запись нельзя загрузить
+    """
+    title = _text(record.get("title"), "title")
+    if not title:
+        raise ValueError("title is required")
+    priority = _text(record.get("priority"), "priority") or "medium"
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    deadline = parse_date(_text(record.get("deadline"), "deadline"), "deadline")
+    created_at = _text(record.get("createdAt"), "createdAt")
+    if created_at is not None:
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError as e:
+            raise ValueError("createdAt must be an ISO 8601 date and time") from e
+
+    assignees = record.get("assignees") or []
+    if isinstance(assignees, str):
+        assignees = assignees.split(";")
+    if not isinstance(assignees, list) or not all(isinstance(a, str) for a in assignees):
+        raise ValueError("assignees must be a list of strings")
+    assignees = list(dict.fromkeys(a.strip() for a in assignees if a.strip()))
+
+    task = (
+        title,
+        _bool(record.get("completed"), "completed"),
+        priority,
+        _bool(record.get("urgent"), "urgent"),
+        deadline,
+        _text(record.get("createdBy"), "createdBy"),
+        created_at or datetime.now(),
+    )
+    return task, assignees
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    return str(value)
+
+
+def _copy_rows(rows: Iterable[tuple]) -> io.StringIO:
+    """Строки пачки в формате COPY text"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+class ImportResult:
+    """Итог загрузки: счетчики и первые MAX_ERRORS ошибок с номерами строк"""
+
+    def __init__(self):
+        self.imported = 0
+        self.assignments = 0
+        self.unlinked = 0
+        self.skipped = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def error(self, line: int, message: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "imported": self.imported,
+            "assignments": self.assignments,
+            "unlinkedAssignees": self.unlinked,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+
+class TaskImporter:
+    """
+    Загрузка задач пачками по chunk_size записей
+
+    Пачка проверяется целиком, исполнители всей пачки ищутся одним запросом,
+    id задач выделяются из последовательности заранее, после чего задачи и
+    назначения пишутся двумя COPY и фиксируются. Ошибочные записи
+    пропускаются и попадают в отчет. Назначение на email без пользователя
+    сохраняется и привяжется при его регистрации (V0012); неизвестное имя -
+    ошибка записи.
+    """
+
+    def __init__(self, dsn: str, chunk_size: int = CHUNK_SIZE, dry_run: bool = False):
+        self.dsn = dsn
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+
+    def run(self, records: Iterable[Tuple[int, Any]]) -> ImportResult:
+        result = ImportResult()
+        conn = psycopg2.connect(self.dsn)
+        try:
+            iterator = iter(records)
+            while True:
+                chunk = list(itertools.islice(iterator, self.chunk_size))
+                if not chunk:
+                    break
+                self._load_chunk(conn, chunk, result)
+                logger.info(f"Task import: {result.imported} imported, {result.skipped} skipped")
+        finally:
+            if result.imported and not self.dry_run:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(RELOAD_NOTIFY_SQL)
+                    conn.commit()
+                except psycopg2.Error as e:
+                    logger.warning(f"Task import: reload notification failed: {e}")
+            conn.close()
+        return result
+
+    def _load_chunk(self, conn, chunk: List[Tuple[int, Any]], result: ImportResult):
+        parsed: List[Tuple[int, tuple, List[str]]] = []
+        errors: List[Tuple[int, str]] = []
+        for line, record in chunk:
+            if isinstance(record, ValueError):
+                errors.append((line, str(record)))
+                continue
+            try:
+                task, assignees = parse_task(record)
+            except ValueError as e:
+                errors.append((line, str(e)))
+                continue
+            parsed.append((line, task, assignees))
+
+        try:
+            with conn.cursor() as cursor:
+                # Исполнители и авторы пачки одним запросом; created_by_id
+                # пишется сразу, триггер V0012 не ищет автора на каждую строку (V0014)
+                keys = sorted({key for _, _, assignees in parsed for key in assignees}
+                              | {task[5] for _, task, _ in parsed if task[5]})
+                users: Dict[str, Tuple[int, str]] = {}
+                if keys:
+                    cursor.execute(RESOLVE_SQL, (keys, keys))
+                    users = {key: (user_id, email) for key, user_id, email in cursor.fetchall()}
+
+                tasks: List[tuple] = []
+                assignments: List[Tuple[int, str, Optional[int]]] = []
+                for line, task, assignees in parsed:
+                    unknown = [key for key in assignees if key not in users and "@" not in key]
+                    if unknown:
+                        errors.append((line, f"Unknown assignee: {', '.join(unknown)}"))
+                        continue
+                    tasks.append((*task, users.get(task[5], (None,))[0]))
+                    for key in assignees:
+                        user_id, email = users.get(key, (None, key))
+                        assignments.append((len(tasks) - 1, email, user_id))
+                for line, message in sorted(errors):
+                    result.error(line, message)
+
+                if self.dry_run or not tasks:
+                    conn.rollback()
+                    result.imported += len(tasks)
+                    result.assignments += len(assignments)
+                    result.unlinked += sum(1 for _, _, user_id in assignments if user_id is None)
+                    return
+
+                # Событие на каждую задачу не рассылается (V0014) - в конце
+                # загрузки клиенты получат одно "reload"
+                cursor.execute("SET LOCAL taskflow.bulk_import = 'on'")
+                cursor.execute(ALLOCATE_IDS_SQL, (len(tasks),))
+                ids = [row[0] for row in cursor.fetchall()]
+                cursor.copy_expert(COPY_TASKS_SQL, _copy_rows(
+                    (task_id, *task) for task_id, task in zip(ids, tasks)
+                ))
+                if assignments:
+                    cursor.copy_expert(COPY_ASSIGNMENTS_SQL, _copy_rows(
+                        (ids[index], email, user_id) for index, email, user_id in assignments
+                    ))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        result.imported += len(tasks)
+        result.assignments += len(assignments)
+        result.unlinked += sum(1 for _, _, user_id in assignments if user_id is None)
@@ -0,0 +1,261 @@
+"""
+TaskFlow Gateway - кэш пользователей
+Поиск пользователя по имени, email и telegram_chat_id без запроса к базе
+на каждый вызов; изменения users приходят через канал PostgreSQL user_changes
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from gateway.db import DatabasePool
+from gateway.metrics import USER_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "user_changes"
+
+# Вид поиска -> колонка users
+LOOKUPS = {"name": "name", "email": "email", "chat_id": "telegram_chat_id"}
+
+USERS_SQL = """
+    SELECT id, name, email, role, telegram_chat_id FROM users
+    WHERE {column} = ANY(%s)
+    ORDER BY id
+"""
+
+Key = Tuple[str, Any]
+
+
+def _normalize(lookup: str, value: Any) -> Any:
+    if lookup not in LOOKUPS:
+        raise ValueError(f"Unknown user lookup: {lookup!r}")
+    # chat id приходит и числом из Telegram, и строкой из запросов
+    return int(value) if lookup == "chat_id" else value
+
+
+class UserCache:
+    """
+    Кэш пользователей в памяти worker с TTL и вытеснением LRU
+
+    Чтение сквозное: чего нет в кэше, читается одним запросом на пачку
+    значений, отсутствующие пользователи тоже запоминаются. Каждый worker
+    слушает user_changes (миграция V0008) и удаляет записи по прежним и
+    новым ключам измененного пользователя - например, после привязки чата
+    через /start. Пока подключение LISTEN не установлено, кэш не
+    заполняется и все запросы идут в базу. Уведомление приходит после
+    COMMIT, поэтому сразу после своего изменения handler может ненадолго
+    увидеть прежнюю запись; TTL ограничивает устаревание в любом случае.
+    """
+
+    def __init__(self, pool: DatabasePool, ttl: float = 300.0, max_size: int = 10000,
+                 reconnect_delay: float = 5.0):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reconnect_delay = reconnect_delay
+        # (вид поиска, значение) -> (истекает, пользователь или None)
+        self._entries: "OrderedDict[Key, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Растет при каждом сбросе: загрузка, начатая до сброса, не попадет в кэш
+        self._generation = 0
+        self._listening = False
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0,
+                      "evictions": 0, "reconnects": 0}
+
+    @classmethod
+    def from_env(cls, pool: DatabasePool) -> "UserCache":
+        """
+        USER_CACHE_TTL - сколько секунд хранить запись
+        USER_CACHE_SIZE - наибольшее число записей на worker
+        """
+        return cls(
+            pool,
+            ttl=float(os.environ.get("USER_CACHE_TTL", 300)),
+            max_size=int(os.environ.get("USER_CACHE_SIZE", 10000)),
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="user-cache")
+        logger.info(f"User cache started: ttl={self.ttl}s, size={self.max_size}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._listening = False
+        self.clear()
+
+    # ---------- поиск ----------
+
+    def get(self, lookup: str, value: Any, conn=None) -> Optional[Dict[str, Any]]:
+        """
+        Пользователь по имени, email или chat id
+
+        Args:
+            lookup: name, email или chat_id
+            value: искомое значение
+            conn: подключение из context.db - читать в своей транзакции
+
+        Returns:
+            {"id", "name", "email", "role", "telegram_chat_id"} или None
+        """
+        return self.get_many(lookup, [value], conn).get(_normalize(lookup, value))
+
+    def get_many(self, lookup: str, values: Iterable[Any], conn=None) -> Dict[Any, Dict[str, Any]]:
+        """
+        Пользователи по списку значений одного вида поиска
+
+        Returns:
+            Значение -> пользователь; ненайденных значений в результате нет.
+            Для одинаковых имен - пользователь с меньшим id, как в save-task.
+        """
+        wanted = list(dict.fromkeys(_normalize(lookup, value) for value in values))
+        found: Dict[Any, Dict[str, Any]] = {}
+        missing: List[Any] = []
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            for value in wanted:
+                entry = self._entries.get((lookup, value))
+                if entry is None or entry[0] <= now:
+                    missing.append(value)
+                    continue
+                self._entries.move_to_end((lookup, value))
+                if entry[1] is not None:
+                    found[value] = dict(entry[1])
+            self.stats["hits"] += len(wanted) - len(missing)
+        if len(wanted) > len(missing):
+            USER_CACHE_LOOKUPS.inc(lookup, "hit", amount=len(wanted) - len(missing))
+        if not missing:
+            return found
+
+        loaded = self._load(lookup, missing, conn)
+        result = "miss" if self._listening else "bypass"
+        USER_CACHE_LOOKUPS.inc(lookup, result, amount=len(missing))
+        with self._lock:
+            self.stats["misses" if result == "miss" else "bypassed"] += len(missing)
+            if result == "miss" and generation == self._generation:
+                expires = time.monotonic() + self.ttl
+                for value in missing:
+                    self._entries[(lookup, value)] = (expires, loaded.get(value))
+                    self._entries.move_to_end((lookup, value))
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+        for value, user in loaded.items():
+            found[value] = dict(user)
+        return found
+
+    def _load(self, lookup: str, values: List[Any], conn=None) -> Dict[Any, Dict[str, Any]]:
+        sql = USERS_SQL.format(column=LOOKUPS[lookup])
+        if conn is not None:
+            rows = conn.execute(sql, (values,)).fetchall()
+        else:
+            with self.pool.connection("user-cache") as pooled:
+                rows = pooled.execute(sql, (values,)).fetchall()
+        users: Dict[Any, Dict[str, Any]] = {}
+        for user_id, name, email, role, chat_id in rows:
+            user = {"id": user_id, "name": name, "email": email,
+                    "role": role, "telegram_chat_id": chat_id}
+            users.setdefault(user[LOOKUPS[lookup]], user)
+        return users
+
+    # ---------- сброс ----------
+
+    def invalidate(self, keys: Iterable[Key]):
+        """Удаляет записи по ключам (вид поиска, значение)"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _invalidate_notify(self, payload: Dict[str, Any]):
+        keys = []
+        for user in payload.get("keys") or []:
+            for lookup in LOOKUPS:
+                if user.get(lookup) is not None:
+                    keys.append((lookup, _normalize(lookup, user[lookup])))
+        self.invalidate(keys)
+        self.stats["invalidations"] += 1
+
+    # ---------- LISTEN ----------
+
+    def _listen(self):
+        conn = psycopg2.connect(self.pool.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _on_readable(self, lost: asyncio.Event):
+        try:
+            self._conn.poll()
+        except psycopg2.Error as e:
+            logger.warning(f"User cache listener connection lost: {e}")
+            # Изменения больше не приходят - кэшу нельзя доверять
+            self._listening = False
+            self.clear()
+            lost.set()
+            return
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                self._invalidate_notify(json.loads(notify.payload))
+            except (ValueError, TypeError, AttributeError):
+                # Непонятное уведомление - сбрасываем все
+                self.clear()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._conn = await asyncio.to_thread(self._listen)
+            except Exception as e:
+                logger.error(f"User cache listener failed to connect: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            lost = asyncio.Event()
+            # После обрыва psycopg2 закрывает подключение и fileno() недоступен
+            fileno = self._conn.fileno()
+            loop.add_reader(fileno, self._on_readable, lost)
+            # Записи, сделанные без подписки, могли пропустить изменения
+            self.clear()
+            self._listening = True
+            try:
+                await lost.wait()
+            finally:
+                self._listening = False
+                loop.remove_reader(fileno)
+                self._conn.close()
+                self._conn = None
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(self.reconnect_delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["bypassed"]
+        return {
+            "listening": self._listening,
+            "entries": len(self._entries),
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            **self.stats,
+        }
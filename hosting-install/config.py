@@ -32,6 +32,16 @@ LOG_LEVEL = "info"
 REQUEST_TIMEOUT = 30
 DATABASE_TIMEOUT = 10
 
+# Постоянный worker (taskflow_worker.py)
+# Путь к unix socket - должен совпадать с WORKER_SOCKET в cgi-bin/*.py
+WORKER_SOCKET = "/home/username/tmp/taskflow-worker.sock"
+# Количество процессов, обслуживающих запросы параллельно
+WORKER_PROCESSES = 2
+# Процесс перезапускается после этого числа запросов
+WORKER_MAX_REQUESTS = 1000
+# Подключений к базе, которые каждый процесс worker держит открытыми
+DB_POOL_SIZE = 2
+
 # ========================================
 # ИНСТРУКЦИИ ПО НАСТРОЙКЕ
 # ========================================
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TaskFlow - постоянный worker для shared hosting
+Держит загруженные handlers в памяти и обслуживает CGI скрипты
+через локальный unix socket (модель pre-fork)
+
+Запуск (например, из cron каждую минуту - второй экземпляр не стартует):
+    python3 /home/username/taskflow_worker.py
+
+Протокол: запрос и ответ - JSON с 4-байтовым префиксом длины (big-endian).
+    Запрос:  {"function": "sync-task", "event": {...}}
+    Ответ:   {"result": {...}} или {"error": "...", "type": "..."}
+"""
+
+import fcntl
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+
+# ========================================
+# НАСТРОЙКИ - берутся из config.py рядом с этим файлом
+# ========================================
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config  # noqa: E402
+
+BACKEND_PATH = config.BACKEND_PATH
+WORKER_SOCKET = getattr(config, 'WORKER_SOCKET', '/home/username/tmp/taskflow-worker.sock')
+WORKER_PROCESSES = getattr(config, 'WORKER_PROCESSES', 2)
+# Процесс перезапускается после N запросов, чтобы не копить утечки памяти
+WORKER_MAX_REQUESTS = getattr(config, 'WORKER_MAX_REQUESTS', 1000)
+# Подключений к базе на один процесс worker
+DB_POOL_SIZE = getattr(config, 'DB_POOL_SIZE', 2)
+
+os.environ['TELEGRAM_BOT_TOKEN'] = config.TELEGRAM_BOT_TOKEN
+os.environ['DATABASE_URL'] = config.DATABASE_URL
+sys.path.insert(0, BACKEND_PATH)
+
+logging.basicConfig(
+    level=getattr(logging, str(getattr(config, 'LOG_LEVEL', 'info')).upper(), logging.INFO),
+    format='%(asctime)s - taskflow-worker[%(process)d] - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('taskflow-worker')
+
+# Общий пул подключений из папки gateway/ проекта (загрузите ее рядом с этим файлом)
+try:
+    from gateway.db import DatabasePool, FunctionDatabase
+except ImportError:
+    DatabasePool = None
+    logger.warning('gateway/db.py not found, handlers will not get context.db')
+
+try:
+    from gateway.codec import CODEC
+except ImportError:
+    CODEC = None
+
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+# ========================================
+# ПРОТОКОЛ
+# ========================================
+def recv_exact(conn, size):
+    """Читает ровно size байт из сокета"""
+    chunks = []
+    while size > 0:
+        chunk = conn.recv(min(size, 65536))
+        if not chunk:
+            raise ConnectionError('Connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(conn):
+    """Читает одно JSON сообщение"""
+    (size,) = HEADER.unpack(recv_exact(conn, HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f'Message too large: {size} bytes')
+    return json.loads(recv_exact(conn, size).decode('utf-8'))
+
+
+def send_message(conn, payload):
+    """Отправляет одно JSON сообщение"""
+    data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+    conn.sendall(HEADER.pack(len(data)) + data)
+
+
+# ========================================
+# ЗАГРУЗКА HANDLERS
+# ========================================
+def load_handlers():
+    """Загружает handler функции всех модулей из BACKEND_PATH"""
+    import importlib.util
+
+    handlers = {}
+    for name in sorted(os.listdir(BACKEND_PATH)):
+        module_path = os.path.join(BACKEND_PATH, name, 'index.py')
+        if name.startswith(('.', '_')) or not os.path.isfile(module_path):
+            continue
+        module_name = 'taskflow_functions.' + name.replace('-', '_')
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        handlers[name] = module.handler
+        logger.info(f'Loaded function handler: {name}')
+    return handlers
+
+
+class WorkerContext:
+    """Контекст Cloud Function для вызова из worker"""
+    def __init__(self, function_name, event, db_pool=None):
+        request_context = event.get('requestContext') or {}
+        self.request_id = request_context.get('requestId', 'cgi-request')
+        self.function_name = function_name
+        self.function_version = '1.0.0'
+        self.memory_limit_in_mb = 256
+        self.function_folder_id = 'local'
+        self.deadline_ms = None
+        self.token = None
+        self.db = FunctionDatabase(db_pool, function_name) if db_pool else None
+        self.json = CODEC
+
+
+# ========================================
+# PRE-FORK СЕРВЕР
+# ========================================
+def handle_connection(conn, handlers, db_pool=None):
+    """Обрабатывает один запрос от CGI скрипта"""
+    try:
+        request = recv_message(conn)
+        function_name = request.get('function')
+        handler = handlers.get(function_name)
+        if handler is None:
+            send_message(conn, {'error': f'Function {function_name} not found', 'type': 'LookupError'})
+            return
+        event = request.get('event') or {}
+        result = handler(event, WorkerContext(function_name, event, db_pool))
+        body = result.get('body') if isinstance(result, dict) else None
+        if CODEC is not None and body is not None and not isinstance(body, str):
+            # body dict/list или bytes - в строку, которую CGI отдаст как есть
+            result['body'] = CODEC.encode_body(body).decode('utf-8')
+        send_message(conn, {'result': result})
+    except Exception as e:
+        logger.error(f'Request failed: {e}', exc_info=True)
+        try:
+            send_message(conn, {'error': str(e), 'type': type(e).__name__})
+        except OSError:
+            pass
+    finally:
+        conn.close()
+
+
+class StopWorker(Exception):
+    """Сигнал остановки родительского процесса"""
+
+
+def child_loop(listener, handlers):
+    """Цикл дочернего процесса: принимает соединения до лимита запросов"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Подключения создаются после fork: сокеты нельзя делить между процессами
+    db_pool = None
+    if DatabasePool is not None:
+        db_pool = DatabasePool(config.DATABASE_URL, min_size=0, max_size=DB_POOL_SIZE)
+    try:
+        for _ in range(WORKER_MAX_REQUESTS):
+            conn, _ = listener.accept()
+            handle_connection(conn, handlers, db_pool)
+    finally:
+        if db_pool is not None:
+            db_pool.close()
+    os._exit(0)
+
+
+def spawn_child(listener, handlers):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            child_loop(listener, handlers)
+        except BaseException as e:
+            logger.error(f'Worker process crashed: {e}', exc_info=True)
+        os._exit(1)
+    return pid
+
+
+def acquire_lock(path):
+    """Не дает запустить второй экземпляр worker на тот же socket"""
+    lock_file = open(path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def main():
+    lock = acquire_lock(WORKER_SOCKET + '.lock')
+    if lock is None:
+        logger.info('Worker already running')
+        return 0
+
+    # Handlers загружаются один раз в родителе и наследуются при fork
+    handlers = load_handlers()
+
+    if os.path.exists(WORKER_SOCKET):
+        os.unlink(WORKER_SOCKET)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(WORKER_SOCKET)
+    os.chmod(WORKER_SOCKET, 0o660)
+    listener.listen(64)
+    logger.info(f'Listening on {WORKER_SOCKET} with {WORKER_PROCESSES} processes')
+
+    children = set()
+
+    def stop(signum, frame):
+        raise StopWorker()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        while True:
+            while len(children) < WORKER_PROCESSES:
+                children.add(spawn_child(listener, handlers))
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                continue
+            children.discard(pid)
+            if status != 0:
+                logger.warning(f'Worker process {pid} exited with status {status}')
+                # Не перезапускаем упавший процесс в плотном цикле
+                time.sleep(1)
+    except StopWorker:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        listener.close()
+        if os.path.exists(WORKER_SOCKET):
+            os.unlink(WORKER_SOCKET)
+        logger.info('Worker stopped')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -60,6 +60,10 @@ copy /Y config.php ready-to-upload\ >nul
 copy /Y .htaccess ready-to-upload\ >nul
 copy /Y database.sql ready-to-upload\ >nul
 copy /Y setup-telegram.php ready-to-upload\ >nul
+copy /Y task-stats.php ready-to-upload\ >nul
+copy /Y reconcile-task-stats.php ready-to-upload\ >nul
+copy /Y notification-outbox.php ready-to-upload\ >nul
+copy /Y deliver-notifications.php ready-to-upload\ >nul
 
 REM Создание README
 (
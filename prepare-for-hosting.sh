@@ -58,6 +58,7 @@ cp config.php ready-to-upload/
 cp .htaccess ready-to-upload/
 cp database.sql ready-to-upload/
 cp setup-telegram.php ready-to-upload/
+cp task-stats.php reconcile-task-stats.php notification-outbox.php deliver-notifications.php ready-to-upload/
 
 # Создание README
 cat > ready-to-upload/README.txt << 'EOF'
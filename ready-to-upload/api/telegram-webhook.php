@@ -10,6 +10,7 @@ if ($_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
 }
 
 require_once __DIR__ . '/../config.php';
+require_once __DIR__ . '/../task-stats.php';
 
 if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
     http_response_code(405);
@@ -80,12 +81,9 @@ try {
         if (strpos($data, 'complete_') === 0) {
             $taskId = (int)substr($data, 9);
             
-            $stmt = $db->prepare("UPDATE tasks SET status = 'completed' WHERE id = ?");
-            $stmt->execute([$taskId]);
-            
-            $stmt = $db->prepare("SELECT title FROM tasks WHERE id = ?");
-            $stmt->execute([$taskId]);
-            $task = $stmt->fetch();
+            $db->beginTransaction();
+            $task = setTaskStatus($db, $taskId, 'completed');
+            $db->commit();
             
             if ($task) {
                 editTelegramMessage(
@@ -102,6 +100,9 @@ try {
     
     echo json_encode(['ok' => true]);
 } catch (Exception $e) {
+    if (isset($db) && $db->inTransaction()) {
+        $db->rollBack();
+    }
     http_response_code(500);
     echo json_encode(['error' => $e->getMessage()]);
 }
@@ -18,7 +18,9 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_email (email),
-    INDEX idx_telegram (telegram_chat_id)
+    INDEX idx_telegram (telegram_chat_id),
+    -- Поиск по именам в save-task и notify-task только по индексу (id входит в него как первичный ключ)
+    INDEX idx_full_name_chat (full_name, telegram_chat_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Таблица задач
@@ -32,6 +34,8 @@ CREATE TABLE IF NOT EXISTS tasks (
     created_by INT DEFAULT NULL,
     assigned_to INT DEFAULT NULL,
     is_deleted TINYINT(1) DEFAULT 0,
+    -- Метка запроса save-task, по которой читаются id вставленных задач
+    batch_token CHAR(32) DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
@@ -39,7 +43,55 @@ CREATE TABLE IF NOT EXISTS tasks (
     INDEX idx_status (status),
     INDEX idx_created_by (created_by),
     INDEX idx_assigned_to (assigned_to),
-    INDEX idx_deadline (deadline)
+    INDEX idx_deadline (deadline),
+    INDEX idx_updated_at (updated_at),
+    INDEX idx_batch_token (batch_token)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Исполнители задач (у задачи может быть несколько исполнителей)
+CREATE TABLE IF NOT EXISTS task_assignments (
+    task_id INT NOT NULL,
+    user_id INT NOT NULL,
+    assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (task_id, user_id),
+    FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user (user_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Счетчики задач по исполнителям (ведет API в транзакциях задач, см. task-stats.php)
+CREATE TABLE IF NOT EXISTS user_task_stats (
+    user_id INT PRIMARY KEY,
+    pending_tasks INT NOT NULL DEFAULT 0,
+    in_progress_tasks INT NOT NULL DEFAULT 0,
+    completed_tasks INT NOT NULL DEFAULT 0,
+    cancelled_tasks INT NOT NULL DEFAULT 0,
+    total_tasks INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Очередь уведомлений Telegram: notify-task ставит сообщения в своей транзакции,
+-- доставка - сразу после ответа и по cron (deliver-notifications.php) с повторами
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    task_id INT DEFAULT NULL,
+    chat_id BIGINT NOT NULL,
+    text TEXT NOT NULL,
+    reply_markup TEXT DEFAULT NULL,
+    -- pending -> sending -> sent | pending (повтор) | dead
+    status ENUM('pending', 'sending', 'sent', 'dead') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    -- Для sending - срок аренды: после него сообщение снова берется в работу
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Метка запуска, который забрал сообщение (claimNotifications)
+    claim_token CHAR(32) DEFAULT NULL,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL DEFAULT NULL,
+    INDEX idx_due (status, next_attempt_at),
+    INDEX idx_claim (claim_token),
+    INDEX idx_sent (status, sent_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Таблица заметок
@@ -75,6 +127,22 @@ INSERT INTO tasks (title, description, priority, status, deadline, created_by, a
 ('Написать юнит-тесты', 'Покрыть новый функционал тестами', 'medium', 'pending', '2025-01-23', 1, 2),
 ('Обновить зависимости проекта', 'Проверить и обновить все npm пакеты', 'low', 'completed', '2025-01-15', 1, 5);
 
+INSERT INTO task_assignments (task_id, user_id)
+SELECT id, assigned_to FROM tasks WHERE assigned_to IS NOT NULL;
+
+INSERT INTO user_task_stats (user_id, pending_tasks, in_progress_tasks, completed_tasks, cancelled_tasks, total_tasks)
+SELECT
+    u.id,
+    COUNT(CASE WHEN t.status = 'pending' THEN 1 END),
+    COUNT(CASE WHEN t.status = 'in_progress' THEN 1 END),
+    COUNT(CASE WHEN t.status = 'completed' THEN 1 END),
+    COUNT(CASE WHEN t.status = 'cancelled' THEN 1 END),
+    COUNT(t.id)
+FROM users u
+LEFT JOIN task_assignments ta ON ta.user_id = u.id
+LEFT JOIN tasks t ON t.id = ta.task_id AND t.is_deleted = 0
+GROUP BY u.id;
+
 -- Вставка тестовых заметок
 INSERT INTO notes (user_id, text, completed) VALUES
 (1, 'Не забыть купить подарок коллеге', 0),
@@ -83,19 +151,18 @@ INSERT INTO notes (user_id, text, completed) VALUES
 (2, 'Подготовить отчет для менеджера', 0),
 (3, 'Обновить профиль на GitHub', 1);
 
--- Создание представления для статистики
+-- Представление для статистики: готовые счетчики из user_task_stats вместо группировки задач
 CREATE OR REPLACE VIEW task_statistics AS
 SELECT 
     u.id AS user_id,
     u.full_name,
     u.email,
-    COUNT(CASE WHEN t.status = 'completed' THEN 1 END) AS completed_tasks,
-    COUNT(CASE WHEN t.status = 'pending' THEN 1 END) AS pending_tasks,
-    COUNT(CASE WHEN t.status = 'in_progress' THEN 1 END) AS in_progress_tasks,
-    COUNT(t.id) AS total_tasks
+    COALESCE(s.completed_tasks, 0) AS completed_tasks,
+    COALESCE(s.pending_tasks, 0) AS pending_tasks,
+    COALESCE(s.in_progress_tasks, 0) AS in_progress_tasks,
+    COALESCE(s.total_tasks, 0) AS total_tasks
 FROM users u
-LEFT JOIN tasks t ON u.id = t.assigned_to AND t.is_deleted = 0
-GROUP BY u.id, u.full_name, u.email;
+LEFT JOIN user_task_stats s ON s.user_id = u.id;
 
 -- Сообщение об успешном создании
 SELECT 'База данных TaskFlow успешно создана и заполнена тестовыми данными!' AS status;
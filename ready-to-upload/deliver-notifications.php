@@ -0,0 +1,37 @@
+<?php
+// Доставка уведомлений из notification_outbox: повторы после сбоев Telegram
+// и сообщения, которые не успел отправить notify-task. Запуск по cron:
+// * * * * * php /path/to/deliver-notifications.php
+if (PHP_SAPI !== 'cli') {
+    http_response_code(404);
+    exit();
+}
+
+require_once __DIR__ . '/config.php';
+require_once __DIR__ . '/notification-outbox.php';
+
+if (empty(TELEGRAM_BOT_TOKEN)) {
+    echo "Бот не настроен\n";
+    exit(0);
+}
+
+$db = getDB();
+
+// Пачки, пока очередь не опустеет, но не дольше запуска cron - дальше
+// продолжит следующий; параллельные запуски разбирают разные пачки
+$started = time();
+$total = ['sent' => 0, 'retried' => 0, 'dead' => 0];
+do {
+    $stats = deliverNotifications($db, TELEGRAM_BOT_TOKEN);
+    foreach ($total as $key => $value) {
+        $total[$key] = $value + $stats[$key];
+    }
+} while ($stats['claimed'] === OUTBOX_BATCH_SIZE && time() - $started < 50);
+
+$stmt = $db->prepare(
+    "DELETE FROM notification_outbox WHERE status = 'sent' " .
+    "AND sent_at < CURRENT_TIMESTAMP - INTERVAL ? DAY"
+);
+$stmt->execute([OUTBOX_RETENTION_DAYS]);
+
+echo "Отправлено: {$total['sent']}, повтор позже: {$total['retried']}, dead: {$total['dead']}\n";
@@ -0,0 +1,245 @@
+<?php
+// Очередь уведомлений Telegram в таблице notification_outbox.
+// API ставит сообщения в своей транзакции и сразу отвечает, а доставляет
+// deliverNotifications(): сразу после ответа и по cron
+// (deliver-notifications.php) - с повторами и переводом в dead.
+// Если PHP упал во время отправки, после срока аренды сообщение уйдет снова
+
+// Лимит Telegram: не больше 30 сообщений в секунду от одного бота
+const TELEGRAM_MESSAGES_PER_SECOND = 30;
+const TELEGRAM_REQUEST_TIMEOUT = 10;
+
+const OUTBOX_BATCH_SIZE = 50;
+const OUTBOX_MAX_ATTEMPTS = 8;
+// Первая задержка повтора (секунды), дальше удваивается
+const OUTBOX_RETRY_BASE = 5;
+const OUTBOX_RETRY_MAX = 3600;
+const OUTBOX_RETENTION_DAYS = 7;
+
+// Ошибки Telegram, при которых повтор бессмысленен (бот заблокирован, чат не найден)
+const OUTBOX_PERMANENT_ERROR_CODES = [400, 403];
+
+// Сообщения ['chat_id', 'text', 'reply_markup'?] в очередь; вызывать внутри транзакции
+function enqueueNotifications(PDO $db, array $messages, $taskId = null) {
+    if (empty($messages)) {
+        return 0;
+    }
+    $params = [];
+    foreach ($messages as $message) {
+        array_push(
+            $params,
+            $taskId,
+            $message['chat_id'],
+            $message['text'],
+            empty($message['reply_markup']) ? null : json_encode($message['reply_markup'])
+        );
+    }
+    $stmt = $db->prepare(
+        "INSERT INTO notification_outbox (task_id, chat_id, text, reply_markup) VALUES " .
+        implode(',', array_fill(0, count($messages), '(?, ?, ?, ?)'))
+    );
+    $stmt->execute($params);
+    return count($messages);
+}
+
+// Забирает пачку в работу одним UPDATE с меткой claim_token (SKIP LOCKED нет
+// в MySQL 5.7): параллельный запуск получит другие строки. Аренда - на всю
+// отправку пачки: по TELEGRAM_MESSAGES_PER_SECOND в секунду, каждая часть
+// ждет ответа не дольше TELEGRAM_REQUEST_TIMEOUT
+function claimNotifications(PDO $db, int $limit) {
+    $token = bin2hex(random_bytes(16));
+    $lease = (int)ceil($limit / TELEGRAM_MESSAGES_PER_SECOND) * (TELEGRAM_REQUEST_TIMEOUT + 1) + 60;
+    $stmt = $db->prepare(
+        "UPDATE notification_outbox " .
+        "SET status = 'sending', claim_token = ?, attempts = attempts + 1, " .
+        "next_attempt_at = CURRENT_TIMESTAMP + INTERVAL ? SECOND " .
+        "WHERE status IN ('pending', 'sending') AND next_attempt_at <= CURRENT_TIMESTAMP " .
+        "ORDER BY next_attempt_at, id LIMIT " . (int)$limit
+    );
+    $stmt->execute([$token, $lease]);
+    if ($stmt->rowCount() === 0) {
+        return [$token, []];
+    }
+    $stmt = $db->prepare(
+        "SELECT id, chat_id, text, reply_markup, attempts FROM notification_outbox " .
+        "WHERE claim_token = ? AND status = 'sending' ORDER BY id"
+    );
+    $stmt->execute([$token]);
+    return [$token, $stmt->fetchAll()];
+}
+
+// Экспоненциальная задержка: OUTBOX_RETRY_BASE * 2^(attempts - 1), не больше OUTBOX_RETRY_MAX
+function notificationRetryDelay(int $attempts) {
+    return (int)min(OUTBOX_RETRY_BASE * (2 ** max($attempts - 1, 0)), OUTBOX_RETRY_MAX);
+}
+
+/**
+ * Отправляет одну пачку из очереди.
+ *
+ * @return array ['claimed', 'sent', 'retried', 'dead']
+ */
+function deliverNotifications(PDO $db, string $token, int $limit = OUTBOX_BATCH_SIZE) {
+    $stats = ['claimed' => 0, 'sent' => 0, 'retried' => 0, 'dead' => 0];
+    [$claimToken, $rows] = claimNotifications($db, $limit);
+    if (empty($rows)) {
+        return $stats;
+    }
+    $stats['claimed'] = count($rows);
+
+    $messages = [];
+    foreach ($rows as $row) {
+        $messages[$row['id']] = [
+            'chat_id' => $row['chat_id'],
+            'text' => $row['text'],
+            'reply_markup' => $row['reply_markup'] ? json_decode($row['reply_markup'], true) : null,
+        ];
+    }
+    $results = sendTelegramMessages($token, $messages);
+
+    // Строки, которые после истечения аренды забрал другой запуск, не трогаем
+    $sent = [];
+    $failed = $db->prepare(
+        "UPDATE notification_outbox SET status = ?, " .
+        "next_attempt_at = CURRENT_TIMESTAMP + INTERVAL ? SECOND, last_error = ?, claim_token = NULL " .
+        "WHERE id = ? AND claim_token = ?"
+    );
+    foreach ($rows as $row) {
+        $result = $results[$row['id']];
+        if ($result['ok']) {
+            $sent[] = $row['id'];
+            continue;
+        }
+        $permanent = in_array($result['error_code'], OUTBOX_PERMANENT_ERROR_CODES, true);
+        if ($permanent || $row['attempts'] >= OUTBOX_MAX_ATTEMPTS) {
+            $failed->execute(['dead', 0, $result['error'], $row['id'], $claimToken]);
+            $stats['dead']++;
+        } else {
+            $delay = notificationRetryDelay((int)$row['attempts']);
+            $failed->execute(['pending', $delay, $result['error'], $row['id'], $claimToken]);
+            $stats['retried']++;
+        }
+    }
+    if ($sent) {
+        $stmt = $db->prepare(
+            "UPDATE notification_outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, " .
+            "last_error = NULL, claim_token = NULL " .
+            "WHERE claim_token = ? AND id IN (" . implode(',', array_fill(0, count($sent), '?')) . ")"
+        );
+        $stmt->execute(array_merge([$claimToken], $sent));
+    }
+    $stats['sent'] = count($sent);
+    return $stats;
+}
+
+/**
+ * Отправляет сообщения параллельно через curl_multi.
+ * Все запросы идут через общее keep-alive соединение (HTTP/2, если доступен),
+ * пачками не больше TELEGRAM_MESSAGES_PER_SECOND в секунду.
+ *
+ * @param string $token    токен бота
+ * @param array  $messages ключ => ['chat_id', 'text', 'reply_markup']
+ * @return array ключ => ['ok' => bool, 'error' => string|null, 'error_code' => int|null]
+ */
+function sendTelegramMessages($token, $messages) {
+    $url = "https://api.telegram.org/bot{$token}/sendMessage";
+    $results = [];
+
+    if (!function_exists('curl_multi_init')) {
+        foreach ($messages as $key => $message) {
+            $results[$key] = sendTelegramMessage($token, $message['chat_id'], $message['text'], $message['reply_markup']);
+        }
+        return $results;
+    }
+
+    $multi = curl_multi_init();
+    if (defined('CURLMOPT_PIPELINING') && defined('CURLPIPE_MULTIPLEX')) {
+        curl_multi_setopt($multi, CURLMOPT_PIPELINING, CURLPIPE_MULTIPLEX);
+    }
+
+    foreach (array_chunk($messages, TELEGRAM_MESSAGES_PER_SECOND, true) as $batchIndex => $batch) {
+        $batchStarted = microtime(true);
+        $handles = [];
+        foreach ($batch as $key => $message) {
+            $payload = [
+                'chat_id' => $message['chat_id'],
+                'text' => $message['text'],
+                'parse_mode' => 'HTML'
+            ];
+            if (!empty($message['reply_markup'])) {
+                $payload['reply_markup'] = json_encode($message['reply_markup']);
+            }
+            $curl = curl_init($url);
+            curl_setopt_array($curl, [
+                CURLOPT_POST => true,
+                CURLOPT_HTTPHEADER => ['Content-Type: application/json'],
+                CURLOPT_POSTFIELDS => json_encode($payload),
+                CURLOPT_RETURNTRANSFER => true,
+                CURLOPT_TIMEOUT => TELEGRAM_REQUEST_TIMEOUT,
+                CURLOPT_HTTP_VERSION => defined('CURL_HTTP_VERSION_2TLS') ? CURL_HTTP_VERSION_2TLS : CURL_HTTP_VERSION_1_1,
+            ]);
+            curl_multi_add_handle($multi, $curl);
+            $handles[$key] = $curl;
+        }
+
+        do {
+            $status = curl_multi_exec($multi, $active);
+            if ($active) {
+                curl_multi_select($multi);
+            }
+        } while ($active && $status === CURLM_OK);
+
+        foreach ($handles as $key => $curl) {
+            $response = json_decode((string)curl_multi_getcontent($curl), true);
+            if (is_array($response) && !empty($response['ok'])) {
+                $results[$key] = ['ok' => true, 'error' => null, 'error_code' => null];
+            } else {
+                $error = $response['description'] ?? (curl_error($curl) ?: 'Telegram request failed');
+                $results[$key] = ['ok' => false, 'error' => $error, 'error_code' => $response['error_code'] ?? null];
+            }
+            curl_multi_remove_handle($multi, $curl);
+            curl_close($curl);
+        }
+
+        // Следующая пачка - не раньше чем через секунду после начала текущей
+        $elapsed = microtime(true) - $batchStarted;
+        if ($batchIndex < ceil(count($messages) / TELEGRAM_MESSAGES_PER_SECOND) - 1 && $elapsed < 1) {
+            usleep((int)((1 - $elapsed) * 1000000));
+        }
+    }
+
+    curl_multi_close($multi);
+    return $results;
+}
+
+function sendTelegramMessage($token, $chatId, $text, $replyMarkup = null) {
+    $url = "https://api.telegram.org/bot{$token}/sendMessage";
+    $data = [
+        'chat_id' => $chatId,
+        'text' => $text,
+        'parse_mode' => 'HTML'
+    ];
+
+    if ($replyMarkup) {
+        $data['reply_markup'] = json_encode($replyMarkup);
+    }
+
+    $options = [
+        'http' => [
+            'method' => 'POST',
+            'header' => 'Content-Type: application/json',
+            'content' => json_encode($data),
+            'ignore_errors' => true,
+            'timeout' => TELEGRAM_REQUEST_TIMEOUT
+        ]
+    ];
+
+    $response = json_decode((string)@file_get_contents($url, false, stream_context_create($options)), true);
+    if (is_array($response) && !empty($response['ok'])) {
+        return ['ok' => true, 'error' => null, 'error_code' => null];
+    }
+    return [
+        'ok' => false,
+        'error' => $response['description'] ?? 'Telegram request failed',
+        'error_code' => $response['error_code'] ?? null
+    ];
+}
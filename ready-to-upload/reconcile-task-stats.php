@@ -0,0 +1,21 @@
+<?php
+// Сверка счетчиков user_task_stats с задачами. Запуск по cron, например:
+// 17 * * * * php /path/to/reconcile-task-stats.php
+if (PHP_SAPI !== 'cli') {
+    http_response_code(404);
+    exit();
+}
+
+require_once __DIR__ . '/config.php';
+require_once __DIR__ . '/task-stats.php';
+
+$db = getDB();
+
+// Один запуск за раз, если cron наложился на медленную сверку
+if (!(int)$db->query("SELECT GET_LOCK('taskflow_reconcile_task_stats', 0)")->fetchColumn()) {
+    echo "Сверка уже выполняется\n";
+    exit(0);
+}
+
+$repaired = reconcileTaskStats($db);
+echo "Исправлено счетчиков: $repaired\n";
@@ -0,0 +1,82 @@
+<?php
+// Счетчики задач по исполнителям в таблице user_task_stats.
+// Меняются в той же транзакции, что и задачи, - статистика читается
+// одной строкой по первичному ключу вместо группировки всех задач.
+// Расхождения исправляет reconcileTaskStats() (reconcile-task-stats.php по cron)
+
+const TASK_STATUSES = ['pending', 'in_progress', 'completed', 'cancelled'];
+
+// Новые задачи исполнителей: [user_id => число задач], все в статусе pending
+function addAssignedTaskStats(PDO $db, array $taskCounts) {
+    if (empty($taskCounts)) {
+        return;
+    }
+    $params = [];
+    foreach ($taskCounts as $userId => $count) {
+        array_push($params, $userId, $count, $count);
+    }
+    $stmt = $db->prepare(
+        "INSERT INTO user_task_stats (user_id, pending_tasks, total_tasks) VALUES " .
+        implode(',', array_fill(0, count($taskCounts), '(?, ?, ?)')) .
+        " ON DUPLICATE KEY UPDATE pending_tasks = pending_tasks + VALUES(pending_tasks)," .
+        " total_tasks = total_tasks + VALUES(total_tasks)"
+    );
+    $stmt->execute($params);
+}
+
+// Смена статуса задачи вместе со счетчиками ее исполнителей.
+// Вызывать внутри транзакции; возвращает задачу или null, если ее нет
+function setTaskStatus(PDO $db, int $taskId, string $status) {
+    if (!in_array($status, TASK_STATUSES, true)) {
+        throw new InvalidArgumentException("Unknown task status: $status");
+    }
+
+    // Блокировка строки: параллельная смена статуса ждет, и старый статус
+    // не будет вычтен из счетчиков дважды
+    $stmt = $db->prepare("SELECT id, title, status, is_deleted FROM tasks WHERE id = ? FOR UPDATE");
+    $stmt->execute([$taskId]);
+    $task = $stmt->fetch();
+    if (!$task || $task['status'] === $status) {
+        return $task ?: null;
+    }
+
+    $stmt = $db->prepare("UPDATE tasks SET status = ? WHERE id = ?");
+    $stmt->execute([$status, $taskId]);
+
+    if (!$task['is_deleted']) {
+        // Имена колонок - из TASK_STATUSES, не из запроса
+        $from = $task['status'] . '_tasks';
+        $to = $status . '_tasks';
+        $stmt = $db->prepare(
+            "UPDATE user_task_stats s JOIN task_assignments ta ON ta.user_id = s.user_id " .
+            "SET s.$from = s.$from - 1, s.$to = s.$to + 1 WHERE ta.task_id = ?"
+        );
+        $stmt->execute([$taskId]);
+    }
+
+    $task['status'] = $status;
+    return $task;
+}
+
+// Пересчет счетчиков по задачам; возвращает число исправленных пользователей
+function reconcileTaskStats(PDO $db) {
+    $stmt = $db->query(
+        "INSERT INTO user_task_stats " .
+        "(user_id, pending_tasks, in_progress_tasks, completed_tasks, cancelled_tasks, total_tasks) " .
+        "SELECT u.id, " .
+        "COUNT(CASE WHEN t.status = 'pending' THEN 1 END), " .
+        "COUNT(CASE WHEN t.status = 'in_progress' THEN 1 END), " .
+        "COUNT(CASE WHEN t.status = 'completed' THEN 1 END), " .
+        "COUNT(CASE WHEN t.status = 'cancelled' THEN 1 END), " .
+        "COUNT(t.id) " .
+        "FROM users u " .
+        "LEFT JOIN task_assignments ta ON ta.user_id = u.id " .
+        "LEFT JOIN tasks t ON t.id = ta.task_id AND t.is_deleted = 0 " .
+        "GROUP BY u.id " .
+        "ON DUPLICATE KEY UPDATE pending_tasks = VALUES(pending_tasks), " .
+        "in_progress_tasks = VALUES(in_progress_tasks), completed_tasks = VALUES(completed_tasks), " .
+        "cancelled_tasks = VALUES(cancelled_tasks), total_tasks = VALUES(total_tasks)"
+    );
+    // MySQL считает измененную строку за 2, неизменную - за 0, новую - за 1
+    return (int)ceil($stmt->rowCount() / 2);
+}
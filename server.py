@@ -5,14 +5,46 @@ TaskFlow Backend API Gateway
 
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import importlib.util
-import sys
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import hmac
 import json
 import os
-from typing import Dict, Any
+import time
+from typing import Awaitable, Callable, Dict, Any, Iterator, Optional
 import logging
 
+from gateway.codec import CODEC
+from gateway.db import DatabasePool, FunctionDatabase
+from gateway.deadline import Deadline, DeadlineExceeded
+from gateway.dispatch import Dispatcher, Overloaded
+from gateway.event import HttpEvent
+from gateway.idempotency import (
+    IN_PROGRESS, MISMATCH, REPLAY, IdempotencyStore, fingerprint as request_fingerprint, valid_key
+)
+from gateway.ingest import TelegramIngest
+from gateway.longpoll import TelegramPoller
+from gateway.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, FUNCTION_DURATION, REGISTRY as METRICS,
+    REQUEST_SIZE, RESPONSE_SIZE, RuntimeMonitor
+)
+from gateway.outbox import OutboxWorker, OutboxWriter
+from gateway.push import TaskEventHub, format_sse
+from gateway.recurrence import RecurrenceWorker
+from gateway.registry import FunctionRegistry
+from gateway.scheduler import ReminderScheduler
+from gateway.search import (
+    MAX_RANKED as SEARCH_MAX_RANKED_DEFAULT, PAGE_SIZE as SEARCH_PAGE_SIZE, search_tasks
+)
+from gateway.stats import StatsReconciler, all_stats, user_stats
+from gateway.tasks import PAGE_SIZE, TaskFilter, list_tasks, parse_bool
+from gateway.telegram import TelegramClient, TelegramFacade
+from gateway.tracing import TRACER, SpanExporter, new_request_id, request_id_from
+from gateway.transfer import FORMATS as TRANSFER_FORMATS, TaskImporter, export_tasks, read_records
+from gateway.users import UserCache
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -20,10 +52,178 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Пул потоков для синхронных handlers, чтобы не блокировать event loop
+dispatcher = Dispatcher.from_env()
+
+# Реестр backend функций: модули загружаются при первом вызове
+registry = FunctionRegistry(
+    os.environ.get("BACKEND_PATH", "/app/backend"),
+    rescan_interval=float(os.environ.get("FUNCTIONS_RESCAN_INTERVAL", 5)),
+)
+
+# Общий пул подключений к PostgreSQL (None, если DATABASE_URL не задан)
+db_pool = DatabasePool.from_env()
+
+# Кэш пользователей по имени, email и chat id (None без базы или при USER_CACHE_ENABLED=0)
+user_cache = UserCache.from_env(db_pool) \
+    if db_pool is not None and os.environ.get("USER_CACHE_ENABLED", "1") != "0" else None
+
+# Клиент Telegram Bot API с общим пулом соединений (None без TELEGRAM_BOT_TOKEN)
+telegram = TelegramClient.from_env()
+
+# Фоновая доставка уведомлений из notification_outbox (создается в lifespan)
+outbox_worker: Optional[OutboxWorker] = None
+
+# Напоминания о сроках задач (создается в lifespan, рассылает один worker-лидер)
+reminder_scheduler: Optional[ReminderScheduler] = None
+
+# Повторяющиеся задачи по правилам cron (создается в lifespan)
+recurrence_worker: Optional[RecurrenceWorker] = None
+
+# Push изменений задач в браузер через SSE (создается в lifespan)
+task_event_hub: Optional[TaskEventHub] = None
+
+# Прием обновлений Telegram с дедупликацией по update_id (создается в lifespan)
+telegram_ingest: Optional[TelegramIngest] = None
+
+# Получение обновлений через getUpdates вместо webhook (TELEGRAM_MODE=polling)
+telegram_poller: Optional[TelegramPoller] = None
+
+# Ответы по заголовку Idempotency-Key (создается в lifespan)
+idempotency: Optional[IdempotencyStore] = None
+
+# Сверка счетчиков user_task_stats с задачами (создается в lifespan)
+stats_reconciler: Optional[StatsReconciler] = None
+
+# Выгрузка трасс запросов (None, если TRACING_EXPORTER не задан)
+span_exporter = SpanExporter.from_env()
+
+# Задержка event loop и сохранение метрик для сложения по workers
+runtime_monitor = RuntimeMonitor.from_env()
+
+# Текущие значения для /metrics считаются при запросе, а не на каждом вызове
+METRICS.gauge(
+    "taskflow_function_in_flight", "Handler calls running or waiting for a slot",
+    ("function", "state"), source=dispatcher.in_flight
+)
+METRICS.gauge(
+    "taskflow_dispatcher_queue_depth", "Sync handler calls waiting for a thread",
+    source=lambda: [((), dispatcher.queue_depth)]
+)
+METRICS.gauge(
+    "taskflow_event_loop_lag_last_seconds", "Last measured event loop delay",
+    source=lambda: [((), runtime_monitor.lag)], aggregate="max"
+)
+
+def db_pool_connections():
+    if db_pool is None:
+        return []
+    snapshot = db_pool.snapshot()
+    return [(("in_use",), snapshot["size"] - snapshot["idle"]), (("idle",), snapshot["idle"])]
+
+METRICS.gauge(
+    "taskflow_db_pool_connections", "Database pool connections by state", ("state",),
+    source=db_pool_connections
+)
+METRICS.gauge(
+    "taskflow_sse_clients", "Connected /api/task-events clients",
+    source=lambda: [((), task_event_hub.snapshot()["clients"])] if task_event_hub else []
+)
+
+# Интервал комментария-пинга в SSE потоке, чтобы прокси не закрывали соединение
+SSE_HEARTBEAT = float(os.environ.get("SSE_HEARTBEAT", 15))
+
+# Сколько самых новых совпадений ранжирует поиск; 0 - все
+SEARCH_MAX_RANKED = int(os.environ.get("SEARCH_MAX_RANKED", SEARCH_MAX_RANKED_DEFAULT)) or None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка фоновых ресурсов gateway"""
+    logger.info(
+        f"Dispatcher started: threads={dispatcher.max_workers}, "
+        f"limits={dispatcher.limits or 'default'}"
+    )
+    functions = registry.discover()
+    logger.info(f"Discovered functions: {', '.join(functions) or 'none'}")
+    runtime_monitor.start()
+    if span_exporter is not None:
+        span_exporter.start()
+    if db_pool is not None:
+        try:
+            db_pool.open()
+        except Exception as e:
+            # Подключения будут создаваться по требованию
+            logger.error(f"Failed to open database pool: {e}")
+    if user_cache is not None:
+        user_cache.start()
+    if telegram is not None:
+        await telegram.start()
+    global outbox_worker
+    if db_pool is not None and telegram is not None and os.environ.get("OUTBOX_ENABLED", "1") != "0":
+        outbox_worker = OutboxWorker.from_env(db_pool, telegram)
+        outbox_worker.start()
+    global reminder_scheduler
+    if db_pool is not None and os.environ.get("REMINDERS_ENABLED", "1") != "0":
+        reminder_scheduler = ReminderScheduler.from_env(db_pool)
+        reminder_scheduler.start()
+    global recurrence_worker
+    if db_pool is not None:
+        recurrence_worker = RecurrenceWorker.from_env(db_pool, user_cache)
+        if os.environ.get("RECURRENCE_ENABLED", "1") != "0":
+            recurrence_worker.start()
+    global task_event_hub
+    if db_pool is not None:
+        task_event_hub = TaskEventHub(db_pool)
+        task_event_hub.start()
+    global telegram_ingest
+    if db_pool is not None and os.environ.get("TELEGRAM_INGEST_ENABLED", "1") != "0":
+        telegram_ingest = TelegramIngest.from_env(db_pool, telegram, invoke_telegram_bot)
+        telegram_ingest.start()
+    global idempotency
+    if db_pool is not None and os.environ.get("IDEMPOTENCY_ENABLED", "1") != "0":
+        idempotency = IdempotencyStore.from_env(db_pool)
+        idempotency.start()
+    global stats_reconciler
+    if db_pool is not None and os.environ.get("STATS_RECONCILE_ENABLED", "1") != "0":
+        stats_reconciler = StatsReconciler.from_env(db_pool)
+        stats_reconciler.start()
+    global telegram_poller
+    if telegram_ingest is not None and telegram is not None and os.environ.get("TELEGRAM_MODE") == "polling":
+        telegram_poller = TelegramPoller.from_env(db_pool, telegram, telegram_ingest)
+        telegram_poller.start()
+    yield
+    if telegram_poller is not None:
+        await telegram_poller.stop()
+    if stats_reconciler is not None:
+        await stats_reconciler.stop()
+    if idempotency is not None:
+        await idempotency.stop()
+    if telegram_ingest is not None:
+        await telegram_ingest.stop()
+    if task_event_hub is not None:
+        await task_event_hub.stop()
+    if recurrence_worker is not None:
+        await recurrence_worker.stop()
+    if reminder_scheduler is not None:
+        await reminder_scheduler.stop()
+    if outbox_worker is not None:
+        await outbox_worker.stop()
+    if user_cache is not None:
+        await user_cache.stop()
+    dispatcher.shutdown()
+    await runtime_monitor.stop()
+    if span_exporter is not None:
+        await span_exporter.stop()
+    if telegram is not None:
+        await telegram.close()
+    if db_pool is not None:
+        db_pool.close()
+
 app = FastAPI(
     title="TaskFlow Backend API",
     description="API Gateway для серверных функций TaskFlow",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -35,175 +235,583 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Функция для динамической загрузки Python модулей
-def load_function_handler(function_name: str):
-    """
-    Загружает handler функцию из backend модуля
-    
-    Args:
-        function_name: имя функции (telegram-bot, notify-task и т.д.)
-    
-    Returns:
-        Функция handler из модуля
-    """
-    module_path = f"/app/backend/{function_name}/index.py"
-    
-    if not os.path.exists(module_path):
-        logger.error(f"Module not found: {module_path}")
-        raise FileNotFoundError(f"Module {function_name} not found")
-    
-    spec = importlib.util.spec_from_file_location(function_name, module_path)
-    module = importlib.util.module_from_spec(spec)
-    sys.modules[function_name] = module
-    spec.loader.exec_module(module)
-    
-    logger.info(f"Loaded function handler: {function_name}")
-    return module.handler
-
-# Загрузка всех handlers при старте приложения
-try:
-    telegram_bot_handler = load_function_handler("telegram-bot")
-    notify_task_handler = load_function_handler("notify-task")
-    sync_task_handler = load_function_handler("sync-task")
-    save_task_handler = load_function_handler("save-task")
-    logger.info("All function handlers loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load function handlers: {e}")
-    raise
-
 # Mock context объект для имитации Cloud Function Context
 class MockContext:
     """Имитация контекста Cloud Function"""
-    def __init__(self):
-        self.request_id = "local-request"
-        self.function_name = "local-function"
+    def __init__(self, function_name: str = "local-function", request_id: Optional[str] = None,
+                 deadline: Optional[Deadline] = None):
+        self.request_id = request_id or new_request_id()
+        self.function_name = function_name
         self.function_version = "1.0.0"
         self.memory_limit_in_mb = 256
         self.function_folder_id = "local"
-        self.deadline_ms = None
+        # Срок запроса в миллисекундах Unix (GATEWAY_FUNCTION_TIMEOUT от поступления)
+        self.deadline = deadline
+        self.deadline_ms = deadline.epoch_ms if deadline else None
         self.token = None
+        # Общий пул подключений: with context.db.connection() as conn: ...
+        self.db = FunctionDatabase(db_pool, function_name, deadline) if db_pool else None
+        # Telegram Bot API: context.telegram.send_many([{"chat_id": ..., "text": ...}])
+        self.telegram = TelegramFacade(telegram, deadline) if telegram else None
+        # Отложенная доставка: context.outbox.enqueue(conn, messages, task_id)
+        self.outbox = OutboxWriter() if db_pool else None
+        # Пользователи без запроса к базе: context.users.get("email", email)
+        self.users = user_cache
+        # JSON (orjson, если установлен): handler может вернуть body dict или bytes
+        self.json = CODEC
 
-async def create_event(request: Request) -> Dict[str, Any]:
+    def get_remaining_time_in_millis(self) -> Optional[int]:
+        """Сколько миллисекунд осталось до срока запроса (None - срока нет)"""
+        if self.deadline is None:
+            return None
+        return max(int(self.deadline.remaining() * 1000), 0)
+
+async def create_event(request: Request, request_id: Optional[str] = None) -> HttpEvent:
     """
     Преобразует FastAPI Request в формат Cloud Function Event
     
+    Поля (заголовки, параметры, тело строкой) вычисляются при первом
+    обращении; тело в байтах доступно handler как event.raw_body.
+    
     Args:
         request: FastAPI Request объект
+        request_id: идентификатор запроса (по умолчанию X-Request-Id или новый)
     
     Returns:
-        Dict в формате Cloud Function Event
+        HttpEvent - Mapping с полями Cloud Function Event
     """
     body = await request.body()
-    
-    return {
-        "httpMethod": request.method,
-        "headers": dict(request.headers),
-        "url": str(request.url),
-        "params": {},
-        "queryStringParameters": dict(request.query_params) if request.query_params else {},
-        "multiValueParams": {},
-        "multiValueHeaders": {},
-        "multiValueQueryStringParameters": {},
-        "pathParams": {},
-        "body": body.decode('utf-8') if body else "",
-        "isBase64Encoded": False,
-        "requestContext": {
-            "requestId": request.headers.get("x-request-id", "unknown"),
-            "identity": {
-                "sourceIp": request.client.host if request.client else "unknown",
-                "userAgent": request.headers.get("user-agent", "")
-            },
-            "httpMethod": request.method,
-            "requestTime": "",
-            "requestTimeEpoch": 0
-        }
-    }
+    return HttpEvent(request.scope, body, request_id or request_id_from(request.headers))
 
-def create_response(result: Dict[str, Any]) -> Response:
+def create_response(result: Dict[str, Any], request: Optional[Request] = None) -> Response:
     """
     Преобразует Cloud Function Response в FastAPI Response
     
     Args:
         result: Dict с результатом от Cloud Function handler
+        request: исходный запрос - для ответа 304 на If-None-Match
     
     Returns:
         FastAPI Response объект
     """
     headers = result.get("headers", {})
+    status_code = result.get("statusCode", 200)
+    # body - строка, bytes или dict/list (кодируется один раз через CODEC)
+    body = CODEC.encode_body(result.get("body", ""))
     
     # Убедимся, что CORS заголовки присутствуют
     if "Access-Control-Allow-Origin" not in headers:
         headers["Access-Control-Allow-Origin"] = "*"
     
+    # Условный GET: для неизменившегося ответа отдаем 304 без тела
+    if request is not None and request.method == "GET" and status_code == 200:
+        etag = headers.get("ETag")
+        if etag is None:
+            etag = headers["ETag"] = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={
+                "ETag": etag,
+                "Access-Control-Allow-Origin": headers["Access-Control-Allow-Origin"]
+            })
+    
     return Response(
-        content=result.get("body", ""),
-        status_code=result.get("statusCode", 200),
+        content=body,
+        status_code=status_code,
         headers=headers,
         media_type=headers.get("Content-Type", "application/json")
     )
 
 # API Endpoints
 
-@app.api_route("/api/telegram-bot", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-async def telegram_bot(request: Request):
-    """Telegram webhook endpoint"""
+def list_recurring_tasks() -> Dict[str, Any]:
+    with db_pool.connection("recurring-tasks") as conn:
+        rows = conn.execute(
+            "SELECT id, title, priority, urgent, created_by, assignee_emails, rule, "
+            "deadline_offset_days, next_run_at, last_run_at FROM task_recurrences "
+            "WHERE active = TRUE ORDER BY next_run_at"
+        ).fetchall()
+    return {"recurrences": [
+        {
+            "id": row[0], "title": row[1], "priority": row[2], "urgent": row[3],
+            "createdBy": row[4], "assignedTo": row[5], "rule": row[6],
+            "deadlineOffsetDays": row[7],
+            "nextRunAt": row[8].isoformat(),
+            "lastRunAt": row[9].isoformat() if row[9] else None
+        }
+        for row in rows
+    ]}
+
+def create_recurring_task(data: Dict[str, Any]) -> Dict[str, Any]:
+    names = list(data.get("assignedTo") or [])
+    with db_pool.connection("recurring-tasks") as conn:
+        # Исполнители задаются именами, как в save-task; храним email
+        if names and user_cache is not None:
+            users = user_cache.get_many("name", names, conn)
+            users.update(user_cache.get_many("email", [name for name in names if name not in users], conn))
+            emails = list(dict.fromkeys(user["email"] for user in users.values()))
+        else:
+            emails = [row[0] for row in conn.execute(
+                "SELECT email FROM users WHERE name = ANY(%s) OR email = ANY(%s)", (names, names)
+            ).fetchall()] if names else []
+        return recurrence_worker.create_rule(
+            conn,
+            title=data["title"],
+            rule=data["rule"],
+            assignee_emails=emails,
+            priority=data.get("priority", "medium"),
+            urgent=bool(data.get("urgent", False)),
+            created_by=data.get("createdBy"),
+            deadline_offset_days=int(data.get("deadlineOffsetDays", 0))
+        )
+
+def delete_recurring_task(recurrence_id: int) -> bool:
+    with db_pool.connection("recurring-tasks") as conn:
+        cursor = conn.execute(
+            "UPDATE task_recurrences SET active = FALSE WHERE id = %s AND active = TRUE",
+            (recurrence_id,)
+        )
+        return cursor.rowcount > 0
+
+async def invoke_telegram_bot(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Вызов handler telegram-bot из фоновой обработки обновлений"""
+    request_id = event["requestContext"]["requestId"]
+    deadline = dispatcher.deadline_for("telegram-bot")
+    with TRACER.start_trace("telegram-update", request_id, kind="internal"):
+        handler = registry.loaded_handler("telegram-bot")
+        if handler is None:
+            handler = await asyncio.to_thread(registry.load, "telegram-bot")
+        context = MockContext("telegram-bot", request_id, deadline)
+        return await dispatcher.dispatch("telegram-bot", handler, event, context, deadline)
+
+@app.post("/api/telegram-bot")
+async def telegram_webhook(request: Request):
+    """
+    Webhook Telegram
+    
+    Обновление сохраняется в telegram_updates и сразу подтверждается;
+    повторная доставка того же update_id игнорируется, обработка идет фоном.
+    """
+    if telegram_ingest is None:
+        return await invoke_function("telegram-bot", request)
+    secret = os.environ.get("TELEGRAM_WEBHOOK_SECRET")
+    if secret and request.headers.get("x-telegram-bot-api-secret-token") != secret:
+        return JSONResponse(status_code=403, content={"error": "Invalid secret token"})
+    try:
+        update = json.loads(await request.body())
+    except ValueError:
+        update = None
+    if not isinstance(update, dict):
+        return JSONResponse(status_code=400, content={"error": "Invalid JSON"})
     try:
-        event = await create_event(request)
-        context = MockContext()
-        result = telegram_bot_handler(event, context)
-        return create_response(result)
+        await telegram_ingest.accept([update])
     except Exception as e:
-        logger.error(f"Error in telegram-bot: {e}", exc_info=True)
+        # Telegram повторит доставку
+        logger.error(f"Error in telegram-bot webhook: {e}", exc_info=True)
         return JSONResponse(
             status_code=500,
             content={"error": "Internal server error", "message": str(e)}
         )
+    return {"ok": True}
 
-@app.api_route("/api/notify-task", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-async def notify_task(request: Request):
-    """Task notification endpoint"""
+@app.get("/api/task-events")
+async def task_events(request: Request):
+    """
+    Поток изменений задач (Server-Sent Events)
+    
+    События "task": {"op": "upsert", "task": {...}} или {"op": "delete", "id": ...};
+    id события - номер изменения, но не больше границы видимых изменений (V0015),
+    чтобы не пропустить позже зафиксированную долгую транзакцию. После обрыва
+    браузер присылает Last-Event-ID и получает пропущенные изменения; если их
+    слишком много или задачи загружены пачкой (/api/import-tasks) - событие
+    "reset" с границей в id: клиент загружает задачи заново и продолжает с нее.
+    """
+    if task_event_hub is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("since")
+    since = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    # Подписываемся до догрузки, чтобы не потерять изменения между ними
+    subscriber = task_event_hub.subscribe()
     try:
-        event = await create_event(request)
-        context = MockContext()
-        result = notify_task_handler(event, context)
-        return create_response(result)
+        replayed, horizon = (
+            await asyncio.to_thread(task_event_hub.replay, since) if since is not None else ([], 0)
+        )
     except Exception as e:
-        logger.error(f"Error in notify-task: {e}", exc_info=True)
+        task_event_hub.unsubscribe(subscriber)
+        logger.error(f"Error in task-events replay: {e}", exc_info=True)
         return JSONResponse(
             status_code=500,
             content={"error": "Internal server error", "message": str(e)}
         )
 
-@app.api_route("/api/sync-task", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-async def sync_task(request: Request):
-    """Task synchronization endpoint"""
+    def event_task_id(event: Dict[str, Any]) -> int:
+        return event["task"]["id"] if event["op"] == "upsert" else event["id"]
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            cursor = min(since, horizon) if since is not None else 0
+            # События из очереди, прочитанные до догрузки, старше ее состояния задач
+            replayed_seq: Dict[int, int] = {}
+            reloaded_until = 0
+            if replayed is None:
+                cursor = reloaded_until = horizon
+                yield format_sse("reset", {}, cursor)
+            else:
+                for event in replayed:
+                    replayed_seq[event_task_id(event)] = event["seq"]
+                    cursor = max(cursor, event["cursor"])
+                    yield format_sse("task", event, cursor)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                if event["op"] == "reset":
+                    cursor = max(cursor, event["cursor"])
+                    yield format_sse("reset", {}, cursor)
+                    continue
+                if event["seq"] <= max(reloaded_until, replayed_seq.get(event_task_id(event), 0)):
+                    continue
+                cursor = max(cursor, event["cursor"])
+                yield format_sse("task", event, cursor)
+        finally:
+            task_event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+@app.api_route("/api/recurring-tasks", methods=["GET", "POST", "DELETE"])
+async def recurring_tasks(request: Request):
+    """
+    Повторяющиеся задачи
+    
+    GET - активные правила; POST {"title", "rule", "assignedTo", ...} - новое правило;
+    DELETE ?id= - отключить правило (созданные задачи остаются)
+    """
+    if recurrence_worker is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
+    try:
+        if request.method == "GET":
+            return await asyncio.to_thread(list_recurring_tasks)
+        if request.method == "DELETE":
+            recurrence_id = int(request.query_params.get("id", 0))
+            if not await asyncio.to_thread(delete_recurring_task, recurrence_id):
+                return JSONResponse(status_code=404, content={"error": "Recurrence not found"})
+            return {"success": True}
+        data = json.loads(await request.body() or b"{}")
+        if not data.get("title") or not data.get("rule"):
+            return JSONResponse(status_code=400, content={"error": "Title and rule are required"})
+        return {"success": True, **await asyncio.to_thread(create_recurring_task, data)}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.error(f"Error in recurring-tasks: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Internal server error", "message": str(e)}
+        )
+
+def read_task_list(params: Dict[str, str]) -> Dict[str, Any]:
+    task_filter = TaskFilter.from_query(params)
+    limit = int(params.get("limit") or PAGE_SIZE)
+    assignee = params.get("assignee")
+    with db_pool.connection("task-list") as conn:
+        if assignee:
+            # Исполнитель - email или имя, как в assignedTo задачи
+            if user_cache is not None:
+                user = user_cache.get("email", assignee, conn) or user_cache.get("name", assignee, conn)
+                task_filter.assignee_ids = [user["id"]] if user else []
+            else:
+                task_filter.assignee_ids = [row[0] for row in conn.execute(
+                    "SELECT resolve_user_id(%s)", (assignee,)
+                ).fetchall() if row[0] is not None]
+        return list_tasks(conn, task_filter, params.get("cursor"), limit)
+
+@app.get("/api/task-list")
+async def task_list(request: Request):
+    """
+    Список задач страницами от новых к старым
+
+    GET ?limit=&cursor=<nextCursor>&assignee=&completed=&priority=&urgent=&deadlineFrom=&deadlineTo=
+    """
+    if db_pool is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
     try:
-        event = await create_event(request)
-        context = MockContext()
-        result = sync_task_handler(event, context)
-        return create_response(result)
+        return await asyncio.to_thread(read_task_list, dict(request.query_params))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        logger.error(f"Error in sync-task: {e}", exc_info=True)
+        logger.error(f"Error in task-list: {e}", exc_info=True)
         return JSONResponse(
             status_code=500,
             content={"error": "Internal server error", "message": str(e)}
         )
 
-@app.api_route("/api/save-task", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-async def save_task(request: Request):
-    """Task saving endpoint"""
+def read_task_stats(email: Optional[str]) -> Dict[str, Any]:
+    with db_pool.connection("task-stats") as conn:
+        if email:
+            return {"stats": user_stats(conn, email)}
+        return {"stats": all_stats(conn)}
+
+@app.get("/api/task-stats")
+async def task_stats(request: Request):
+    """
+    Статистика задач по исполнителям из счетчиков user_task_stats
+
+    GET ?email= - один пользователь, без параметра - все
+    """
+    if db_pool is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
     try:
-        event = await create_event(request)
-        context = MockContext()
-        result = save_task_handler(event, context)
-        return create_response(result)
+        return await asyncio.to_thread(read_task_stats, request.query_params.get("email"))
     except Exception as e:
-        logger.error(f"Error in save-task: {e}", exc_info=True)
+        logger.error(f"Error in task-stats: {e}", exc_info=True)
         return JSONResponse(
             status_code=500,
             content={"error": "Internal server error", "message": str(e)}
         )
 
+def read_search(params: Dict[str, str]) -> Dict[str, Any]:
+    query = (params.get("q") or "").strip()
+    if not query:
+        raise ValueError("q is required")
+    limit = int(params.get("limit") or SEARCH_PAGE_SIZE)
+    with db_pool.connection("search-task") as conn:
+        return search_tasks(conn, query, params.get("cursor"), limit, SEARCH_MAX_RANKED)
+
+@app.get("/api/search-task")
+async def search_task(request: Request):
+    """
+    Поиск задач по названию: лучшие совпадения первыми, совпадения в <mark>
+
+    GET ?q=&limit=&cursor=<nextCursor>
+    Ранжируются SEARCH_MAX_RANKED самых новых совпадений; если совпадений
+    больше, ответ приходит с "truncated": true
+    """
+    if db_pool is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
+    try:
+        return await asyncio.to_thread(read_search, dict(request.query_params))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.error(f"Error in search-task: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Internal server error", "message": str(e)}
+        )
+
+def check_transfer_token(request: Request) -> Optional[JSONResponse]:
+    """Выгрузка и загрузка всех задач - только с TASK_TRANSFER_TOKEN, без него выключены"""
+    token = os.environ.get("TASK_TRANSFER_TOKEN")
+    if not token:
+        return JSONResponse(status_code=403, content={"error": "Task transfer is disabled"})
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        return JSONResponse(status_code=403, content={"error": "Invalid token"})
+    return None
+
+@app.get("/api/export-tasks")
+async def export_tasks_endpoint(request: Request):
+    """
+    Выгрузка всех задач потоком (NDJSON или CSV)
+
+    GET ?format=ndjson|csv, заголовок Authorization: Bearer <TASK_TRANSFER_TOKEN>
+    """
+    if db_pool is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
+    denied = check_transfer_token(request)
+    if denied is not None:
+        return denied
+    fmt = request.query_params.get("format") or "ndjson"
+    if fmt not in TRANSFER_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Unknown format: {fmt}"})
+    # Синхронный генератор Starlette читает в пуле потоков; при обрыве
+    # соединения генератор закрывается и COPY прерывается
+    return StreamingResponse(
+        export_tasks(db_pool.dsn, fmt),
+        media_type=TRANSFER_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{fmt}"'}
+    )
+
+def request_chunks(request: Request, loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    """Тело запроса кусками для загрузки в потоке: куски читает event loop"""
+    stream = request.stream().__aiter__()
+    while True:
+        try:
+            chunk = asyncio.run_coroutine_threadsafe(stream.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+        if chunk:
+            yield chunk
+
+@app.post("/api/import-tasks")
+async def import_tasks_endpoint(request: Request):
+    """
+    Загрузка задач потоком из тела запроса (NDJSON или CSV)
+
+    POST ?format=ndjson|csv&dryRun=true, заголовок Authorization: Bearer <TASK_TRANSFER_TOKEN>;
+    ответ - {"imported", "assignments", "unlinkedAssignees", "skipped", "errors": [{"line", "error"}]}
+    """
+    if db_pool is None:
+        return JSONResponse(status_code=503, content={"error": "Database is not configured"})
+    denied = check_transfer_token(request)
+    if denied is not None:
+        return denied
+    fmt = request.query_params.get("format") or "ndjson"
+    if fmt not in TRANSFER_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"Unknown format: {fmt}"})
+    try:
+        importer = TaskImporter(db_pool.dsn, dry_run=parse_bool(request.query_params.get("dryRun"), "dryRun") or False)
+        records = read_records(request_chunks(request, asyncio.get_running_loop()), fmt)
+        result = await asyncio.to_thread(importer.run, records)
+        return result.to_dict()
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.error(f"Error in import-tasks: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Internal server error", "message": str(e)}
+        )
+
+async def call_idempotent(function_name: str, key: str, event: HttpEvent, deadline: Deadline,
+                          call: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Вызов handler с заголовком Idempotency-Key
+
+    Первый запрос с ключом выполняет handler, и его ответ сохраняется;
+    повтор получает сохраненный ответ с заголовком Idempotent-Replayed,
+    пока первый еще выполняется - 409, с другим телом - 422.
+    """
+    if not valid_key(key):
+        return JSONResponse(status_code=400, content={"error": "Invalid Idempotency-Key"})
+    with TRACER.span("idempotency.claim"):
+        claim = await asyncio.to_thread(
+            idempotency.claim, function_name, key,
+            request_fingerprint(event.scope["method"], event.scope["path"], event.raw_body),
+            deadline.remaining()
+        )
+    if claim.state == REPLAY:
+        return Response(content=claim.body, status_code=claim.status_code,
+                        headers={**claim.headers, "Idempotent-Replayed": "true"})
+    if claim.state == IN_PROGRESS:
+        return JSONResponse(
+            status_code=409,
+            content={"error": "A request with this Idempotency-Key is in progress"},
+            headers={"Retry-After": "1"}
+        )
+    if claim.state == MISMATCH:
+        return JSONResponse(
+            status_code=422,
+            content={"error": "Idempotency-Key was already used with a different request"}
+        )
+    try:
+        response = await call()
+    except (DeadlineExceeded, asyncio.CancelledError):
+        # Handler мог успеть изменить данные - ключ освободится по locked_until
+        raise
+    except BaseException:
+        await release_idempotency_key(function_name, key, claim.owner)
+        raise
+    if response.status_code >= 500:
+        await release_idempotency_key(function_name, key, claim.owner)
+        return response
+    try:
+        await asyncio.to_thread(
+            idempotency.complete, function_name, key, claim.owner,
+            response.status_code, dict(response.headers), response.body
+        )
+    except Exception as e:
+        logger.error(f"Failed to store idempotent response for {function_name}: {e}")
+    return response
+
+async def release_idempotency_key(function_name: str, key: str, owner: str):
+    try:
+        await asyncio.to_thread(idempotency.release, function_name, key, owner)
+    except Exception as e:
+        logger.error(f"Failed to release Idempotency-Key for {function_name}: {e}")
+
+@app.api_route("/api/{function_name}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+async def invoke_function(function_name: str, request: Request):
+    """Вызов backend функции по имени"""
+    if not await registry.find(function_name):
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Function not found", "function": function_name}
+        )
+    started = time.perf_counter()
+    deadline = dispatcher.deadline_for(function_name)
+    response = None
+    request_id = request_id_from(request.headers)
+    span = TRACER.start_trace(
+        f"{request.method} /api/{function_name}", request_id,
+        request.headers.get("traceparent"), {"function": function_name}
+    )
+    try:
+        with span:
+            try:
+                handler = registry.loaded_handler(function_name)
+                if handler is None:
+                    with TRACER.span("load_function"):
+                        handler = await asyncio.to_thread(registry.load, function_name)
+                with TRACER.span("create_event"):
+                    event = await create_event(request, request_id)
+                REQUEST_SIZE.observe(len(event.raw_body), function_name)
+                context = MockContext(function_name, request_id, deadline)
+
+                async def call() -> Response:
+                    result = await dispatcher.dispatch(function_name, handler, event, context, deadline)
+                    return create_response(result, request)
+
+                idempotency_key = request.headers.get("idempotency-key")
+                if idempotency is not None and idempotency_key is not None \
+                        and request.method not in ("GET", "HEAD", "OPTIONS"):
+                    response = await call_idempotent(function_name, idempotency_key, event, deadline, call)
+                else:
+                    response = await call()
+            except Overloaded as e:
+                # Очередь не успеет до срока - быстрый отказ вместо ожидания
+                span.record_error(e)
+                logger.warning(f"Shedding {function_name} request {request_id}: {e}")
+                response = JSONResponse(
+                    status_code=503,
+                    content={"error": "Service overloaded", "message": str(e)},
+                    headers={"Retry-After": "1"}
+                )
+            except DeadlineExceeded as e:
+                span.record_error(e)
+                logger.warning(f"Deadline exceeded in {function_name} (request {request_id}): {e}")
+                response = JSONResponse(
+                    status_code=504,
+                    content={"error": "Deadline exceeded", "message": str(e)}
+                )
+            except Exception as e:
+                span.record_error(e)
+                logger.error(f"Error in {function_name} (request {request_id}): {e}", exc_info=True)
+                response = JSONResponse(
+                    status_code=500,
+                    content={"error": "Internal server error", "message": str(e)}
+                )
+            span.set_attribute("http.status_code", response.status_code)
+    finally:
+        # Отмена запроса (клиент отключился) учитывается как 499
+        status = str(response.status_code) if response is not None else "499"
+        FUNCTION_DURATION.observe(time.perf_counter() - started, function_name, status)
+    RESPONSE_SIZE.observe(len(response.body), function_name)
+    response.headers["X-Request-Id"] = request_id
+    return response
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
@@ -211,14 +819,28 @@ async def health():
         "status": "ok",
         "service": "taskflow-backend",
         "version": "1.0.0",
-        "functions": [
-            "telegram-bot",
-            "notify-task",
-            "sync-task",
-            "save-task"
-        ]
+        "functions": registry.names,
+        "json_codec": CODEC.name,
+        "dispatcher": dispatcher.snapshot(),
+        "database": db_pool.snapshot() if db_pool else None,
+        "outbox": outbox_worker.snapshot() if outbox_worker else None,
+        "reminders": reminder_scheduler.snapshot() if reminder_scheduler else None,
+        "recurrence": recurrence_worker.snapshot() if recurrence_worker else None,
+        "task_events": task_event_hub.snapshot() if task_event_hub else None,
+        "user_cache": user_cache.snapshot() if user_cache else None,
+        "telegram_ingest": telegram_ingest.snapshot() if telegram_ingest else None,
+        "telegram_polling": telegram_poller.snapshot() if telegram_poller else None,
+        "idempotency": idempotency.snapshot() if idempotency else None,
+        "task_stats": stats_reconciler.snapshot() if stats_reconciler else None,
+        "tracing": span_exporter.snapshot() if span_exporter else None
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Метрики в формате Prometheus"""
+    body = await asyncio.to_thread(METRICS.render)
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -226,11 +848,11 @@ async def root():
         "message": "TaskFlow Backend API",
         "version": "1.0.0",
         "endpoints": {
-            "telegram_bot": "/api/telegram-bot",
-            "notify_task": "/api/notify-task",
-            "sync_task": "/api/sync-task",
-            "save_task": "/api/save-task",
-            "health": "/health"
+            **{name.replace("-", "_"): f"/api/{name}" for name in registry.names},
+            "recurring_tasks": "/api/recurring-tasks",
+            "task_events": "/api/task-events",
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
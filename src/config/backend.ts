@@ -4,5 +4,6 @@ export const BACKEND_URLS = {
   TELEGRAM_BOT: `${API_BASE}/telegram-webhook.php`,
   NOTIFY_TASK: `${API_BASE}/notify-task.php`,
   SAVE_TASK: `${API_BASE}/save-task.php`,
-  SYNC_TASK: `${API_BASE}/sync-task.php`
+  SYNC_TASK: `${API_BASE}/sync-task.php`,
+  TASK_EVENTS: `${API_BASE}/task-events`
 } as const;
\ No newline at end of file
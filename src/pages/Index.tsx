@@ -16,6 +16,8 @@ interface Task {
   deadline?: string;
   createdBy?: string;
   createdAt?: string;
+  // Idempotency-Key уведомления о задаче: один на задачу, повтор запроса не разошлет его снова
+  notifyKey?: string;
 }
 
 interface User {
@@ -29,6 +31,19 @@ interface User {
   telegramChatId?: number;
 }
 
+// crypto.randomUUID() есть только в безопасном контексте (HTTPS или localhost),
+// на сайте по HTTP UUID v4 собирается из crypto.getRandomValues()
+const newIdempotencyKey = (): string => {
+  if (typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID();
+  }
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  bytes[6] = (bytes[6] & 0x0f) | 0x40;
+  bytes[8] = (bytes[8] & 0x3f) | 0x80;
+  const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+};
+
 const Index = () => {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [currentUser, setCurrentUser] = useState<User | null>(null);
@@ -97,6 +112,40 @@ const Index = () => {
     }
   }, []);
 
+  useEffect(() => {
+    if (!isAuthenticated || !('EventSource' in window)) return;
+
+    // Изменения других пользователей и из Telegram приходят с сервера без опроса
+    const source = new EventSource(BACKEND_URLS.TASK_EVENTS);
+    source.addEventListener('task', (event) => {
+      const change = JSON.parse((event as MessageEvent).data);
+      if (change.op === 'delete') {
+        setTasks(prev => prev.filter(t => t.id !== change.id));
+        return;
+      }
+      const incoming: Task = change.task;
+      setTasks(prev => prev.some(t => t.id === incoming.id)
+        ? prev.map(t => t.id === incoming.id ? { ...t, ...incoming } : t)
+        : [...prev, incoming]);
+    });
+    // Пропущено слишком много изменений или задачи загружены пачкой -
+    // статусы перечитываются целиком из sync-task
+    source.addEventListener('reset', async () => {
+      try {
+        const response = await fetch(BACKEND_URLS.SYNC_TASK);
+        if (!response.ok) return;
+        const statuses: Record<string, boolean> = await response.json();
+        setTasks(prev => prev.map(t => String(t.id) in statuses
+          ? { ...t, completed: statuses[String(t.id)] }
+          : t));
+      } catch (error) {
+        console.error('Error reloading tasks:', error);
+      }
+    });
+
+    return () => source.close();
+  }, [isAuthenticated]);
+
   const sendNotification = (title: string, body: string) => {
     if ('Notification' in window && Notification.permission === 'granted') {
       new Notification(title, {
@@ -160,11 +209,13 @@ const Index = () => {
   };
 
   const addTask = async (task: Omit<Task, 'id'>) => {
+    const notifyKey = newIdempotencyKey();
     const newTask: Task = {
       id: tasks.length + 1,
       ...task,
       createdBy: currentUser?.name,
-      createdAt: new Date().toISOString()
+      createdAt: new Date().toISOString(),
+      notifyKey
     };
     setTasks([newTask, ...tasks]);
     
@@ -183,6 +234,8 @@ const Index = () => {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            // Повтор того же запроса (ретрай прокси) не разошлет уведомления второй раз
+            'Idempotency-Key': notifyKey,
           },
           body: JSON.stringify({
             taskId: newTask.id,
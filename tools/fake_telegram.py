@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+TaskFlow - локальный заменитель Telegram Bot API для разработки
+
+Поддерживает getUpdates (long polling), setWebhook/deleteWebhook и методы
+отправки; обновления добавляются вручную через служебные адреса.
+
+Запуск:
+    python tools/fake_telegram.py --port 8081
+    TELEGRAM_BOT_TOKEN=test TELEGRAM_API_URL=http://localhost:8081 \\
+        TELEGRAM_MODE=polling uvicorn server:app
+
+Служебные адреса:
+    POST /_updates  {"chat_id": 1, "text": "/start user@company.ru"}
+                    {"chat_id": 1, "callback_data": "complete_5"}
+                    {"update": {...}}             - произвольный Update
+    GET  /_sent     - вызванные методы отправки (sendMessage и т.д.)
+    DELETE /_sent   - очистить список
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI(title="Fake Telegram Bot API")
+
+updates: List[Dict[str, Any]] = []
+sent: List[Dict[str, Any]] = []
+webhook_url: Optional[str] = None
+update_ids = itertools.count(1)
+message_ids = itertools.count(1)
+new_update = asyncio.Condition()
+
+
+def fail(code: int, description: str) -> Dict[str, Any]:
+    return {"ok": False, "error_code": code, "description": description}
+
+
+async def request_params(request: Request) -> Dict[str, Any]:
+    if request.headers.get("content-type", "").startswith("application/json"):
+        body = await request.body()
+        params = await request.json() if body else {}
+    else:
+        params = dict(await request.form())
+    params.update(request.query_params)
+    return params
+
+
+@app.post("/_updates")
+async def add_update(request: Request):
+    data = await request.json()
+    update_id = next(update_ids)
+    chat = {"id": data.get("chat_id", 1), "type": "private"}
+    user = {"id": chat["id"], "is_bot": False, "first_name": "Test"}
+    if "update" in data:
+        update = {**data["update"], "update_id": update_id}
+    elif "callback_data" in data:
+        update = {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": user,
+                "data": data["callback_data"],
+                "message": {
+                    "message_id": data.get("message_id", next(message_ids)),
+                    "chat": chat,
+                    "date": int(time.time()),
+                    "text": "",
+                },
+            },
+        }
+    else:
+        update = {
+            "update_id": update_id,
+            "message": {
+                "message_id": next(message_ids),
+                "from": user,
+                "chat": chat,
+                "date": int(time.time()),
+                "text": data.get("text", ""),
+            },
+        }
+    async with new_update:
+        updates.append(update)
+        new_update.notify_all()
+    return update
+
+
+@app.get("/_sent")
+async def list_sent():
+    return sent
+
+
+@app.delete("/_sent")
+async def clear_sent():
+    sent.clear()
+    return {"ok": True}
+
+
+@app.post("/bot{token}/{method}")
+@app.get("/bot{token}/{method}")
+async def bot_method(token: str, method: str, request: Request):
+    global webhook_url
+    params = await request_params(request)
+
+    if method == "getMe":
+        return {"ok": True, "result": {"id": 1, "is_bot": True, "username": "taskflow_fake_bot"}}
+    if method == "setWebhook":
+        webhook_url = params.get("url") or None
+        return {"ok": True, "result": True}
+    if method == "deleteWebhook":
+        webhook_url = None
+        if str(params.get("drop_pending_updates", "")).lower() in ("1", "true"):
+            updates.clear()
+        return {"ok": True, "result": True}
+    if method == "getUpdates":
+        if webhook_url:
+            return fail(409, "Conflict: can't use getUpdates method while webhook is active")
+        offset = int(params.get("offset") or 0)
+        limit = max(1, min(int(params.get("limit") or 100), 100))
+        timeout = float(params.get("timeout") or 0)
+        # Запрос со смещением подтверждает все обновления до него
+        if offset:
+            updates[:] = [update for update in updates if update["update_id"] >= offset]
+        async with new_update:
+            if not updates and timeout > 0:
+                try:
+                    await asyncio.wait_for(new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return {"ok": True, "result": updates[:limit]}
+
+    sent.append({"method": method, **params})
+    if method in ("sendMessage", "editMessageText"):
+        return {"ok": True, "result": {
+            "message_id": next(message_ids),
+            "chat": {"id": params.get("chat_id"), "type": "private"},
+            "date": int(time.time()),
+            "text": params.get("text", ""),
+        }}
+    return {"ok": True, "result": True}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
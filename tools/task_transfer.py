@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+TaskFlow - выгрузка и загрузка задач из командной строки
+
+Перенос задач между установками PostgreSQL (NDJSON или CSV, см.
+gateway/transfer.py). Файл читается и пишется потоком, поэтому размер
+не ограничен памятью. Нужен DATABASE_URL; формат по умолчанию - по
+расширению файла.
+
+Запуск из корня проекта:
+    DATABASE_URL=postgresql://... python tools/task_transfer.py export tasks.ndjson
+    DATABASE_URL=postgresql://... python tools/task_transfer.py export - --format csv | gzip > tasks.csv.gz
+    DATABASE_URL=postgresql://... python tools/task_transfer.py import tasks.ndjson --dry-run
+    gunzip -c tasks.csv.gz | DATABASE_URL=... python tools/task_transfer.py import - --format csv
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway.transfer import CHUNK_SIZE, FORMATS, TaskImporter, export_tasks, read_records  # noqa: E402
+
+READ_SIZE = 64 * 1024
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension in FORMATS:
+        return extension
+    sys.exit("Укажите --format ndjson или csv")
+
+
+def export(dsn: str, path: str, fmt: str):
+    started = time.perf_counter()
+    size = 0
+    output = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        for chunk in export_tasks(dsn, fmt):
+            output.write(chunk)
+            size += len(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f"Выгружено {size / 1024 / 1024:.1f} МБ за {time.perf_counter() - started:.1f} s",
+          file=sys.stderr)
+
+
+def load(dsn: str, path: str, fmt: str, chunk_size: int, dry_run: bool):
+    started = time.perf_counter()
+    source = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        chunks = iter(lambda: source.read(READ_SIZE), b"")
+        result = TaskImporter(dsn, chunk_size, dry_run).run(read_records(chunks, fmt))
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    print(json.dumps(result.to_dict(), ensure_ascii=False, indent=2))
+    print(f"{'Проверено' if dry_run else 'Загружено'} за {time.perf_counter() - started:.1f} s",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task export and import")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="выгрузить все задачи")
+    export_parser.add_argument("path", help="файл или - для stdout")
+    export_parser.add_argument("--format", choices=list(FORMATS))
+    import_parser = commands.add_parser("import", help="загрузить задачи")
+    import_parser.add_argument("path", help="файл или - для stdin")
+    import_parser.add_argument("--format", choices=list(FORMATS))
+    import_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                               help="записей в пачке (одна транзакция)")
+    import_parser.add_argument("--dry-run", action="store_true",
+                               help="только проверить записи и исполнителей")
+    args = parser.parse_args()
+
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        sys.exit("DATABASE_URL не задан")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stderr)
+    fmt = detect_format(args.path, args.format)
+    if args.command == "export":
+        export(dsn, args.path, fmt)
+        return
+    try:
+        load(dsn, args.path, fmt, args.chunk_size, args.dry_run)
+    except ValueError as e:
+        # Ошибка файла целиком (например, CSV без колонки title)
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()